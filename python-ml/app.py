@@ -1,259 +1,2618 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 import pandas as pd
-import pickle
 import os
+import json
+import shutil
 import numpy as np
+import scipy.sparse as sp
 from sklearn.decomposition import NMF
 import requests
 from datetime import datetime
 from functools import lru_cache
+from collections import OrderedDict
+from bisect import bisect_left
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, Future, TimeoutError as FutureTimeoutError
+)
+import multiprocessing
+import queue
+import tempfile
+import uuid
+
+try:
+    import fcntl  # Bloqueo entre procesos (no disponible en Windows)
+except ImportError:
+    fcntl = None
+try:
+    import pyarrow.parquet as pq  # Opcional: exportaciones en Parquet
+except ImportError:
+    pq = None
+try:
+    import orjson  # Opcional: JSON rápido que serializa arrays NumPy
+except ImportError:
+    orjson = None
+try:
+    import msgpack  # Opcional: respuestas en MessagePack
+except ImportError:
+    msgpack = None
+import threading
 import time
+from scipy.optimize import nnls
 
 app = Flask(__name__)
 CORS(app)
 
 # Configuración
-MODEL_PATH = 'models/recommendation_model.pkl'
-CACHE_PATH = 'models/predictions_cache.pkl'
+MODEL_DIR = 'models'
+# Archivo con el nombre de la versión publicada; se reemplaza atómicamente
+MODEL_POINTER = os.path.join(MODEL_DIR, 'CURRENT')
+LEGACY_MODEL_PATH = os.path.join(MODEL_DIR, 'recommendation_model.pkl')
+MODEL_FORMAT_VERSION = 1
+# Versiones anteriores que se conservan (otros procesos pueden tenerlas mapeadas)
+MODEL_VERSIONS_KEPT = 2
 LARAVEL_API_URL = os.getenv('LARAVEL_API_URL', 'http://localhost:8000')
 DATA_DIR = 'data'
+# Exportaciones CSV de Laravel (volumen compartido con storage/app/exports)
+EXPORTS_DIR = os.getenv('EXPORTS_DIR', os.path.join(DATA_DIR, 'exports'))
+INTERACTIONS_STORE_DIR = os.path.join(DATA_DIR, 'interactions')
 
 # Cache en memoria para evitar lecturas repetidas de disco
 _model_cache = None
-_model_cache_time = None
-MODEL_CACHE_TTL = 3600  # 1 hora
+_model_loaded_at = None
+
+# Detección de modelos nuevos: un stat del puntero CURRENT cada intervalo,
+# en un hilo aparte (nunca en el camino de una petición)
+MODEL_WATCH_INTERVAL = float(os.getenv('MODEL_WATCH_INTERVAL', 5))
+_model_pointer_signature = None
+_model_watcher = None
+
+# Caché de respuestas de /recommend por (versión, usuario, top_n, exclusiones)
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 10000))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+
+# Límites (segundos) de los histogramas de latencia de /metrics
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Serializa las escrituras del modelo (fold-in, guardado); las lecturas no bloquean
+_model_lock = threading.RLock()
+
+# Reentrenamiento en segundo plano: un solo trabajo a la vez (single-flight)
+_retrain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='retrain')
+_retrain_jobs = OrderedDict()
+_retrain_jobs_lock = threading.Lock()
+_active_retrain_job = None
+MAX_RETRAIN_JOBS_KEPT = 20
+# Estado de los trabajos en disco, visible para todos los workers del servidor
+RETRAIN_JOBS_DIR = os.path.join(MODEL_DIR, 'jobs')
+RETRAIN_LOCK_PATH = os.path.join(RETRAIN_JOBS_DIR, 'retrain.lock')
+RETRAIN_ACTIVE_PATH = os.path.join(RETRAIN_JOBS_DIR, 'ACTIVE')
+
+# Máximo de celdas usuarios x items para pre-calcular la matriz de predicciones;
+# por encima se puntúa al vuelo (W[u] @ H) para no pagar memoria O(usuarios x items)
+PREDICTIONS_MAX_CELLS = int(os.getenv('PREDICTIONS_MAX_CELLS', 5_000_000))
+
+# Máximo de usuarios por llamada a /update_users
+MAX_FOLD_IN_USERS = int(os.getenv('MAX_FOLD_IN_USERS', 1000))
+
+# /update_users deja los usuarios en FOLD_IN_PENDING_DIR y un solo modelo
+# nuevo los publica a todos cuando el más antiguo lleva
+# FOLD_IN_PUBLISH_INTERVAL segundos esperando (no una versión por llamada)
+FOLD_IN_PUBLISH_INTERVAL = float(os.getenv('FOLD_IN_PUBLISH_INTERVAL', 30))
+FOLD_IN_PENDING_DIR = os.path.join(MODEL_DIR, 'pending')
+
+# Los fold-in ya publicados pasan a FOLD_IN_PUBLISHED_DIR: un reentrenamiento
+# que leyó sus datos antes los vuelve a aplicar al publicar. Se conservan
+# FOLD_IN_JOURNAL_SECONDS (más que lo que dura un reentrenamiento)
+FOLD_IN_PUBLISHED_DIR = os.path.join(MODEL_DIR, 'published')
+FOLD_IN_JOURNAL_SECONDS = float(os.getenv('FOLD_IN_JOURNAL_SECONDS', 24 * 3600))
+
+# Bloqueo entre procesos para publicar versiones (fold-in y reentrenamiento):
+# sin él, un fold-in calculado sobre una versión vieja revertiría un
+# reentrenamiento y dos fold-ins simultáneos se pisarían
+PUBLISH_LOCK_PATH = os.path.join(RETRAIN_JOBS_DIR, 'publish.lock')
+
+# Recomendaciones por lote: usuarios por bloque de W[users] @ H (como máximo
+# BATCH_BLOCK_SIZE y BATCH_BLOCK_CELLS scores por bloque) y máximo por petición
+BATCH_BLOCK_SIZE = int(os.getenv('BATCH_BLOCK_SIZE', 1024))
+BATCH_BLOCK_CELLS = int(os.getenv('BATCH_BLOCK_CELLS', 4_000_000))
+MAX_BATCH_USERS = int(os.getenv('MAX_BATCH_USERS', 10000))
+
+# Micro-batching de /recommend (opcional): las peticiones que llegan dentro de
+# la ventana (o hasta MICROBATCH_MAX_USERS) se puntúan juntas con un solo
+# W[usuarios] @ H; la que no recibe su resultado en MICROBATCH_MAX_WAIT_MS se
+# puntúa sola
+MICROBATCH_ENABLED = os.getenv('MICROBATCH_ENABLED', '0') == '1'
+MICROBATCH_WINDOW_MS = float(os.getenv('MICROBATCH_WINDOW_MS', 2))
+MICROBATCH_MAX_USERS = int(os.getenv('MICROBATCH_MAX_USERS', 64))
+MICROBATCH_MAX_WAIT_MS = float(os.getenv('MICROBATCH_MAX_WAIT_MS', 20))
+
+# Serving particionado por items (opcional). Un shard (SHARD_INDEX de
+# SHARD_COUNT) atiende POST /shard/rank con su rango de columnas de H y su
+# parte del índice de vistos; un router (SHARD_URLS) reparte cada petición de
+# /recommend entre todos los shards y une sus top N
+SHARD_INDEX = int(os.environ['SHARD_INDEX']) if os.getenv('SHARD_INDEX') else None
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 1))
+SHARD_URLS = [url.strip().rstrip('/') for url in os.getenv('SHARD_URLS', '').split(',') if url.strip()]
+SHARD_TIMEOUT = float(os.getenv('SHARD_TIMEOUT', 2))
+
+# Vista del shard para la versión cargada y consultas del router a los shards
+_shard_view = None
+_shard_view_lock = threading.Lock()
+_shard_executor = ThreadPoolExecutor(max_workers=max(1, 4 * len(SHARD_URLS)),
+                                     thread_name_prefix='shard')
+_shard_session = None
+
+# Items similares: items por bloque del producto embeddings @ q, y modo aproximado
+# (índice IVF: listas por centroides, se recorren solo las SIMILAR_NPROBE más cercanas)
+SIMILAR_BLOCK_SIZE = int(os.getenv('SIMILAR_BLOCK_SIZE', 65536))
+SIMILAR_NPROBE = int(os.getenv('SIMILAR_NPROBE', 8))
+SIMILAR_APPROX_MIN_ITEMS = int(os.getenv('SIMILAR_APPROX_MIN_ITEMS', 50000))
+SIMILAR_KMEANS_SAMPLE = int(os.getenv('SIMILAR_KMEANS_SAMPLE', 100000))
+
+# Reentrenamiento en caliente: parte de W y H del modelo anterior y ajusta por
+# tramos de iteraciones hasta que el error relativo mejora menos que tol
+# (desactivado por defecto: "warm_start": true en /retrain o RETRAIN_WARM_START=1)
+RETRAIN_WARM_START = os.getenv('RETRAIN_WARM_START', '0') == '1'
+WARM_START_CHUNK_ITER = int(os.getenv('WARM_START_CHUNK_ITER', 5))
+
+# Filas por bloque al leer exportaciones CSV/Parquet
+FILE_CHUNK_ROWS = int(os.getenv('FILE_CHUNK_ROWS', 1_000_000))
+
+# Entrenamiento fuera de memoria: interacciones por bloque en disco y
+# directorio de checkpoints para reanudar un entrenamiento interrumpido
+TRAIN_BLOCK_NNZ = int(os.getenv('TRAIN_BLOCK_NNZ', 1_000_000))
+TRAINING_DIR = os.getenv('TRAINING_DIR', os.path.join(DATA_DIR, 'training'))
+
+# Cuantización de W y H al guardar el modelo: '' (float32), 'float16' o
+# 'uint8' (8 bits con una escala por usuario y por item). Se puntúa
+# descuantizando H por tramos de QUANTIZED_BLOCK_ITEMS items, y al guardar
+# se compara el top N contra float32 en QUANTIZATION_CHECK_USERS usuarios
+MODEL_QUANTIZATION = os.getenv('MODEL_QUANTIZATION', '')
+QUANTIZED_BLOCK_ITEMS = int(os.getenv('QUANTIZED_BLOCK_ITEMS', 16384))
+QUANTIZATION_CHECK_USERS = int(os.getenv('QUANTIZATION_CHECK_USERS', 1000))
+
+# Tabla materializada de top K por usuario, calculada al entrenar (0 = sin
+# tabla): cubre a los TOPK_TABLE_USERS usuarios con más interacciones y se
+# calcula por bloques de batch_block_users() en TOPK_TABLE_WORKERS procesos
+TOPK_TABLE_K = int(os.getenv('TOPK_TABLE_K', 20))
+TOPK_TABLE_USERS = int(os.getenv('TOPK_TABLE_USERS', 100_000))
+TOPK_TABLE_WORKERS = int(os.getenv('TOPK_TABLE_WORKERS', os.cpu_count() or 1))
+
+# Filas por página al descargar interacciones desde Laravel
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', 5000))
 
 # Crear directorios si no existen
-os.makedirs('models', exist_ok=True)
+os.makedirs(MODEL_DIR, exist_ok=True)
+os.makedirs(RETRAIN_JOBS_DIR, exist_ok=True)
+os.makedirs(FOLD_IN_PENDING_DIR, exist_ok=True)
+os.makedirs(FOLD_IN_PUBLISHED_DIR, exist_ok=True)
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Arrays del modelo que se guardan como .npy (los opcionales pueden faltar)
+MODEL_ARRAYS = (
+    'W', 'H', 'predictions', 'W_scale', 'H_scale',
+    'user_ids', 'user_order', 'item_ids',
+    'seen_indptr', 'seen_indices', 'topk_rows', 'topk_items', 'topk_scores', 'user_revision',
+    'item_embeddings', 'item_centroids', 'item_list_indptr', 'item_list_indices',
+)
+
+def current_model_path():
+    """Directorio de la versión publicada del modelo, o None"""
+    try:
+        with open(MODEL_POINTER) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(MODEL_DIR, name)
+    return path if os.path.isdir(path) else None
+
+def open_model(path):
+    """
+    Abre una versión del modelo sin copiarla a memoria.
+    
+    Los arrays se mapean con np.load(mmap_mode='r'): la carga es casi
+    instantánea y varios procesos comparten las mismas páginas físicas.
+    """
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != MODEL_FORMAT_VERSION:
+        raise ValueError(f"Formato de modelo no soportado: {manifest.get('format_version')}")
+    
+    model = {name: None for name in MODEL_ARRAYS}
+    for name in manifest['arrays']:
+        model[name] = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+    model['version'] = manifest['version']
+    model['metadata'] = manifest['metadata']
+    return model
+
+def write_model_files(model, path, version):
+    """Escribe los arrays del modelo y su manifiesto JSON en `path`"""
+    os.makedirs(path)
+    start = time.perf_counter()
+    arrays = {}
+    for name in MODEL_ARRAYS:
+        array = model.get(name)
+        if array is None:
+            continue
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(path, f'{name}.npy'), array)
+        arrays[name] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+    
+    # El tiempo de escritura queda junto a los de entrenamiento (visible en /metrics)
+    metadata = dict(model['metadata'])
+    metadata['timings'] = {
+        **metadata.get('timings', {}),
+        'serialization': time.perf_counter() - start
+    }
+    manifest = {
+        'format_version': MODEL_FORMAT_VERSION,
+        'version': version,
+        'arrays': arrays,
+        'metadata': metadata
+    }
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+def remove_old_model_versions(current_name):
+    """Borra versiones antiguas conservando las MODEL_VERSIONS_KEPT más recientes"""
+    versions = sorted(
+        name for name in os.listdir(MODEL_DIR)
+        if name.startswith('model-') and name != current_name
+    )
+    for name in versions[:max(0, len(versions) - (MODEL_VERSIONS_KEPT - 1))]:
+        shutil.rmtree(os.path.join(MODEL_DIR, name), ignore_errors=True)
+
+class ResponseCache:
+    """
+    Caché LRU acotada con TTL para respuestas de /recommend.
+    
+    La clave incluye la versión del modelo, así que una versión nueva nunca
+    sirve respuestas viejas; además se vacía al publicar o cargar una versión
+    para liberar memoria de inmediato.
+    """
+    
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key):
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+_response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+def format_labels(labelnames, labels):
+    """Etiquetas en formato de texto Prometheus: {a="1",b="2"}"""
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, labels):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+class Counter:
+    """Contador con etiquetas, exportable en formato de texto Prometheus"""
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+class Histogram:
+    """
+    Histograma con etiquetas y límites fijos.
+    
+    observe() es un bisect y dos sumas bajo un lock: barato para dejarlo
+    activo en /recommend. Los acumulados por límite se calculan al exportar.
+    """
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, labels, value):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            bucket_names = self.labelnames + ('le',)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{format_labels(bucket_names, labels + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+REQUEST_LATENCY = Histogram(
+    'recommender_request_duration_seconds', 'Latencia de las peticiones HTTP',
+    ('endpoint', 'method')
+)
+REQUEST_ERRORS = Counter(
+    'recommender_request_errors_total', 'Respuestas HTTP con estado >= 400',
+    ('endpoint', 'status')
+)
+MODEL_LOAD_DURATION = Histogram(
+    'recommender_model_load_duration_seconds', 'Tiempo de apertura de una versión del modelo',
+    ('source',)
+)
+MICROBATCH_SIZE = Histogram(
+    'recommender_microbatch_size', 'Peticiones de /recommend puntuadas en cada micro-lote',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+MICROBATCH_TIMEOUTS = Counter(
+    'recommender_microbatch_timeouts_total',
+    'Peticiones que superaron MICROBATCH_MAX_WAIT_MS y se puntuaron solas'
+)
+TOPK_TABLE_LOOKUPS = Counter(
+    'recommender_topk_table_lookups_total',
+    'Peticiones de /recommend servidas desde la tabla top K (hit) o puntuadas al vuelo (miss)',
+    ('result',)
+)
+
+def metric_line(name, value, labelnames=(), labels=(), kind='gauge', documentation=None):
+    """Líneas HELP/TYPE y valor de una métrica simple"""
+    return [
+        f'# HELP {name} {documentation or name}',
+        f'# TYPE {name} {kind}',
+        f'{name}{format_labels(labelnames, labels)} {value}'
+    ]
+
+def check_model_update():
+    """
+    Publica en memoria la versión de CURRENT si cambió desde la última vez.
+    
+    El costo normal es un os.stat del puntero; solo si su firma cambió se
+    lee el nombre de la versión y, si es distinta a la cargada, se abre.
+    
+    Returns:
+        True si se cargó una versión nueva
+    """
+    global _model_cache, _model_loaded_at, _model_pointer_signature
+    
+    try:
+        st = os.stat(MODEL_POINTER)
+    except FileNotFoundError:
+        return False
+    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if signature == _model_pointer_signature:
+        return False
+    
+    with _model_lock:
+        path = current_model_path()
+        if path is None:
+            return False
+        version = os.path.basename(path)[len('model-'):]
+        if _model_cache is not None and _model_cache.get('version') == version:
+            _model_pointer_signature = signature
+            return False
+        
+        start = time.perf_counter()
+        previous = _model_cache
+        _model_cache = open_model(path)
+        elapsed = time.perf_counter() - start
+        _model_loaded_at = time.time()
+        _model_pointer_signature = signature
+        clear_response_cache_on_retrain(previous, _model_cache)
+    MODEL_LOAD_DURATION.observe(('reload',), elapsed)
+    print(f"✓ Modelo {version} cargado en {elapsed * 1000:.1f} ms")
+    if SHARD_INDEX is not None:
+        shard_view(_model_cache)  # Antes de la primera petición del router
+    return True
+
+def watch_model(interval):
+    """
+    Bucle del hilo vigilante: detecta versiones publicadas por otros procesos
+    y publica los fold-in pendientes cuando toca (un solo worker a la vez).
+    """
+    while True:
+        try:
+            check_model_update()
+        except Exception as e:
+            print(f"✗ Error al verificar el modelo: {type(e).__name__}: {str(e)}")
+        try:
+            publish_fold_ins()
+        except Exception as e:
+            print(f"✗ Error al publicar fold-ins: {type(e).__name__}: {str(e)}")
+        time.sleep(interval)
+
+def start_model_watcher(interval=None):
+    """Carga el modelo actual e inicia el hilo vigilante (una vez por proceso)"""
+    global _model_watcher
+    
+    check_model_update()
+    if _model_watcher is None or not _model_watcher.is_alive():
+        _model_watcher = threading.Thread(
+            target=watch_model,
+            args=(interval or MODEL_WATCH_INTERVAL,),
+            name='model-watcher',
+            daemon=True
+        )
+        _model_watcher.start()
+
 def load_model():
-    """Carga el modelo desde caché en memoria o disco"""
-    global _model_cache, _model_cache_time
-    
-    # Verificar si tenemos caché válido en memoria
-    if _model_cache is not None and _model_cache_time is not None:
-        if time.time() - _model_cache_time < MODEL_CACHE_TTL:
-            return _model_cache
-    
-    # Cargar desde disco
-    if os.path.exists(MODEL_PATH):
-        with open(MODEL_PATH, 'rb') as f:
-            _model_cache = pickle.load(f)
-            _model_cache_time = time.time()
-            return _model_cache
-    return None
+    """
+    Devuelve el modelo en memoria.
+    
+    Las versiones nuevas las carga el hilo vigilante; aquí solo se intenta
+    una carga inicial si todavía no hay ninguno (p. ej. sin vigilante).
+    """
+    if _model_cache is None:
+        check_model_update()
+    return _model_cache
+
+def base_version(model_info):
+    """
+    Versión del entrenamiento del que viene el modelo: los fold-in publican
+    versiones nuevas pero no cambian H ni a los usuarios que no recalculan.
+    """
+    return model_info['metadata'].get('base_version', model_info.get('version'))
+
+def clear_response_cache_on_retrain(previous, current):
+    """
+    Vacía la caché de respuestas solo si cambió el entrenamiento: tras un
+    fold-in las entradas de los demás usuarios siguen siendo válidas y las
+    de los recalculados cambian de clave (user_revision).
+    """
+    if previous is None or base_version(previous) != base_version(current):
+        _response_cache.clear()
 
 def save_model(model):
-    """Guarda el modelo y actualiza caché"""
-    global _model_cache, _model_cache_time
+    """
+    Publica una versión nueva del modelo y actualiza caché
     
-    with open(MODEL_PATH, 'wb') as f:
-        pickle.dump(model, f)
+    Los archivos se escriben en un directorio temporal que se renombra a
+    models/model-<versión>; luego se reemplaza el puntero CURRENT con
+    os.replace, así ningún lector ve una versión a medio escribir. La caché
+    en memoria se reemplaza con una sola asignación de referencia.
+    """
+    global _model_cache, _model_loaded_at
     
-    # Actualizar caché en memoria
-    _model_cache = model
-    _model_cache_time = time.time()
+    with _model_lock:
+        version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        name = f'model-{version}'
+        tmp_path = os.path.join(MODEL_DIR, f'.{name}.tmp')
+        # Un modelo entrenado es su propia base; un fold-in conserva la de su modelo
+        model = {**model, 'metadata': {'base_version': version, **model['metadata']}}
+        write_model_files(model, tmp_path, version)
+        os.replace(tmp_path, os.path.join(MODEL_DIR, name))
+        
+        pointer_tmp = f'{MODEL_POINTER}.{os.getpid()}.tmp'
+        with open(pointer_tmp, 'w') as f:
+            f.write(name)
+        os.replace(pointer_tmp, MODEL_POINTER)
+        
+        # Actualizar caché en memoria con la versión mapeada desde disco
+        start = time.perf_counter()
+        previous = _model_cache
+        _model_cache = open_model(os.path.join(MODEL_DIR, name))
+        MODEL_LOAD_DURATION.observe(('save',), time.perf_counter() - start)
+        _model_loaded_at = time.time()
+        clear_response_cache_on_retrain(previous, _model_cache)
+        
+        remove_old_model_versions(name)
+        return _model_cache
 
-def fetch_interactions_from_laravel(batch_size=1000, max_batches=10):
+def user_indices(model_info, requested_ids):
+    """
+    Índices de fila de los usuarios pedidos (-1 si no están en el modelo).
+    
+    user_order ordena user_ids, así que la búsqueda es un searchsorted
+    vectorizado aunque el fold-in haya agregado usuarios al final.
     """
-    Obtiene interacciones desde Laravel con paginación para evitar sobrecarga
+    requested_ids = np.asarray(requested_ids, dtype=np.int64)
+    user_ids = model_info['user_ids']
+    user_order = model_info['user_order']
+    if len(user_ids) == 0:
+        return np.full(len(requested_ids), -1, dtype=np.int64)
+    
+    pos = np.minimum(np.searchsorted(user_ids, requested_ids, sorter=user_order),
+                     len(user_ids) - 1)
+    idx = user_order[pos].astype(np.int64)
+    return np.where(user_ids[idx] == requested_ids, idx, -1)
+
+# Sesión HTTP compartida (pool de conexiones keep-alive hacia Laravel)
+_http_session = None
+
+def get_http_session():
+    """Devuelve la sesión HTTP compartida, creándola la primera vez"""
+    global _http_session
+    
+    if _http_session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'Accept': 'application/json',
+            'User-Agent': 'Python-ML-Service/1.0'
+        })
+        _http_session = session
+    return _http_session
+
+def get_shard_session():
+    """Sesión HTTP del router hacia los shards (conexiones reutilizadas)"""
+    global _shard_session
+    
+    if _shard_session is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(SHARD_URLS) or 1,
+                                                pool_maxsize=32)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _shard_session = session
+    return _shard_session
+
+def parse_timestamps(values):
+    """Convierte fechas 'Y-m-d H:i:s' de Laravel a segundos desde epoch (None -> 0)"""
+    return np.array(
+        [value or '1970-01-01 00:00:00' for value in values], dtype='datetime64[s]'
+    ).astype(np.int64)
+
+def format_timestamp(seconds):
+    """Inverso de parse_timestamps, en el formato que acepta Laravel"""
+    return str(np.datetime64(int(seconds), 's')).replace('T', ' ')
+
+class InteractionColumns:
+    """
+    Columnas tipadas de interacciones que crecen por duplicación.
+
+    Cada página se copia directamente a arrays NumPy compactos, así que
+    solo una página vive como objetos Python a la vez.
+    """
+    DTYPES = {
+        'id': np.int64,
+        'user_id': np.int64,
+        'item_id': np.int64,
+        'rating': np.int8,
+        'updated_at': np.int64,  # Segundos desde epoch
+    }
+    
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype)
+                        for name, dtype in self.DTYPES.items()}
+    
+    def _reserve(self, extra):
+        capacity = len(self.columns['id'])
+        if self.size + extra <= capacity:
+            return
+        while capacity < self.size + extra:
+            capacity *= 2
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.columns[name] = grown
+    
+    def append_rows(self, rows):
+        """Agrega una página de filas (lista de dicts) a las columnas"""
+        n = len(rows)
+        self._reserve(n)
+        for name, column in self.columns.items():
+            if name == 'updated_at':
+                column[self.size:self.size + n] = parse_timestamps(
+                    [row.get('updated_at') for row in rows]
+                )
+                continue
+            column[self.size:self.size + n] = np.fromiter(
+                (row.get(name, 0) for row in rows), dtype=column.dtype, count=n
+            )
+        self.size += n
+    
+    def last_id(self):
+        return int(self.columns['id'][self.size - 1]) if self.size else 0
+    
+    def to_frame(self):
+        """DataFrame con las columnas recortadas al tamaño real"""
+        return pd.DataFrame({name: column[:self.size]
+                             for name, column in self.columns.items()})
+
+def fetch_interactions_from_laravel(batch_size=None, max_batches=None, updated_since=None):
+    """
+    Obtiene interacciones desde Laravel por páginas (keyset sobre el id)
+    
+    Cada petición pide `limit` filas con id mayor que el último recibido, de
+    modo que la memoria durante la descarga depende del tamaño de página y no
+    del tamaño de la tabla.
     
     Args:
-        batch_size: Tamaño de cada lote
-        max_batches: Número máximo de lotes a procesar
+        batch_size: Filas por página (None = EXPORT_PAGE_SIZE)
+        max_batches: Número máximo de páginas a procesar (None = sin límite)
+        updated_since: Segundos epoch; solo filas creadas/modificadas desde entonces
+    
+    Returns:
+        DataFrame con columnas tipadas (id, user_id, item_id, rating,
+        updated_at), o None si hubo un error (no se entrena con datos
+        parciales). Si Laravel informa el total de filas, queda en
+        df.attrs['remote_total']; el tiempo de parseo (JSON a columnas),
+        en df.attrs['parse_seconds'].
     """
+    batch_size = batch_size or EXPORT_PAGE_SIZE
     url = f"{LARAVEL_API_URL}/api/interactions/export-json"
-    print(f"Conectando a {url}...")
+    print(f"Conectando a {url} (páginas de {batch_size})...")
+    
+    session = get_http_session()
+    columns = InteractionColumns(capacity=batch_size)
+    pages = 0
+    remote_total = None
+    parse_seconds = 0.0
+    
+    params = {'limit': batch_size}
+    if updated_since is not None:
+        params['updated_since'] = format_timestamp(updated_since)
     
     try:
-        # Aumentar timeout y agregar parámetros de paginación si es posible
-        response = requests.get(
-            url,
-            timeout=(10, 60),  # Más tiempo para conexiones lentas
-            headers={
-                'Accept': 'application/json',
-                'User-Agent': 'Python-ML-Service/1.0'
-            },
-            stream=False
-        )
-        
-        print(f"✓ Respuesta recibida: Status {response.status_code}")
-        
-        if response.status_code == 200:
+        while max_batches is None or pages < max_batches:
+            after_id = columns.last_id()
+            response = session.get(
+                url,
+                params={**params, 'after_id': after_id},
+                timeout=(10, 60)  # Más tiempo para conexiones lentas
+            )
+            
+            if response.status_code != 200:
+                print(f"✗ Error HTTP {response.status_code}")
+                return None
+            if 'X-Total-Count' in response.headers:
+                remote_total = int(response.headers['X-Total-Count'])
+            
+            parse_start = time.perf_counter()
             try:
-                data = response.json()
-                total = len(data)
-                
-                # Limitar cantidad de datos procesados
-                max_interactions = batch_size * max_batches
-                if total > max_interactions:
-                    print(f"⚠ Limitando de {total} a {max_interactions} interacciones")
-                    # Tomar las más recientes si hay timestamp
-                    if data and 'created_at' in data[0]:
-                        data = sorted(data, key=lambda x: x.get('created_at', ''), reverse=True)
-                    data = data[:max_interactions]
-                
-                print(f"✓ Datos obtenidos: {len(data)} interacciones")
-                return data
+                rows = response.json()
             except ValueError as e:
                 print(f"✗ Error al parsear JSON: {str(e)}")
-                return []
-        else:
-            print(f"✗ Error HTTP {response.status_code}")
-            return []
+                return None
+            
+            pages += 1
+            if not rows:
+                break
+            
+            columns.append_rows(rows)
+            parse_seconds += time.perf_counter() - parse_start
+            
+            # Un Laravel sin paginación devuelve todo en la primera respuesta
+            if len(rows) > batch_size or 'id' not in rows[0]:
+                print("⚠ El endpoint no pagina; se recibió la tabla completa")
+                break
+            # Última página o cursor que no avanza
+            if len(rows) < batch_size or columns.last_id() <= after_id:
+                break
+        
+        print(f"✓ Datos obtenidos: {columns.size} interacciones en {pages} páginas")
+        df = columns.to_frame()
+        df.attrs['parse_seconds'] = parse_seconds
+        if remote_total is not None:
+            df.attrs['remote_total'] = remote_total
+        return df
             
     except requests.exceptions.Timeout as e:
         print(f"✗ Timeout: {str(e)}")
-        return []
+        return None
     except requests.exceptions.ConnectionError as e:
         print(f"✗ Error de conexión: {str(e)}")
-        return []
+        return None
     except Exception as e:
         print(f"✗ Error inesperado: {type(e).__name__}: {str(e)}")
-        return []
+        return None
+
+def fetch_interaction_ids_from_laravel():
+    """Ids vigentes de todas las interacciones (para detectar eliminaciones)"""
+    url = f"{LARAVEL_API_URL}/api/interactions/ids"
+    try:
+        response = get_http_session().get(url, timeout=(10, 60))
+        if response.status_code != 200:
+            print(f"✗ Error HTTP {response.status_code} al obtener ids")
+            return None
+        return np.asarray(response.json(), dtype=np.int64)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"✗ Error al obtener ids: {type(e).__name__}: {str(e)}")
+        return None
+
+def load_interaction_store():
+    """
+    Carga el almacén columnar local de interacciones (un .npy por columna)
+    
+    Returns:
+        (df, state) o (None, None) si todavía no existe
+    """
+    state_path = os.path.join(INTERACTIONS_STORE_DIR, 'state.json')
+    if not os.path.exists(state_path):
+        return None, None
+    
+    with open(state_path) as f:
+        state = json.load(f)
+    df = pd.DataFrame({
+        name: np.load(os.path.join(INTERACTIONS_STORE_DIR, f'{name}.npy'))
+        for name in InteractionColumns.DTYPES
+    })
+    return df, state
+
+def save_interaction_store(df):
+    """
+    Persiste el almacén columnar y su marca de agua (max updated_at / id)
+    
+    Se escribe en un directorio temporal y se intercambia con rename, para
+    que un fallo a mitad de escritura no deje columnas desalineadas.
+    """
+    tmp_dir = INTERACTIONS_STORE_DIR + '.tmp'
+    old_dir = INTERACTIONS_STORE_DIR + '.old'
+    for path in (tmp_dir, old_dir):
+        if os.path.exists(path):
+            shutil.rmtree(path)
+    os.makedirs(tmp_dir)
+    
+    for name, dtype in InteractionColumns.DTYPES.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), df[name].to_numpy(dtype=dtype))
+    
+    state = {
+        'watermark_updated_at': int(df['updated_at'].max()) if len(df) else 0,
+        'max_id': int(df['id'].max()) if len(df) else 0,
+        'count': int(len(df)),
+        'synced_at': datetime.now().isoformat()
+    }
+    with open(os.path.join(tmp_dir, 'state.json'), 'w') as f:
+        json.dump(state, f)
+    
+    if os.path.exists(INTERACTIONS_STORE_DIR):
+        os.replace(INTERACTIONS_STORE_DIR, old_dir)
+    os.replace(tmp_dir, INTERACTIONS_STORE_DIR)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    return state
+
+def merge_interactions(store_df, delta_df):
+    """
+    Aplica un delta sobre el almacén: las filas del delta reemplazan a las
+    existentes con el mismo id (actualizaciones) y las nuevas se agregan.
+    El resultado queda ordenado por id.
+    """
+    combined = pd.concat([store_df, delta_df], ignore_index=True)
+    ids = combined['id'].to_numpy()
+    
+    # np.unique se queda con la primera aparición: recorrer al revés deja la más reciente
+    _, last_pos = np.unique(ids[::-1], return_index=True)
+    keep = len(ids) - 1 - last_pos
+    return combined.iloc[keep].reset_index(drop=True)
+
+def sync_interactions(full=False):
+    """
+    Sincroniza el almacén local con Laravel y devuelve todas las interacciones.
+    
+    Con almacén existente solo se descargan las filas con updated_at desde
+    la marca de agua, así que el costo de red y parseo es proporcional al
+    delta. Si el total remoto no coincide tras la fusión, se descargan los
+    ids vigentes para descartar filas eliminadas.
+    
+    Returns:
+        DataFrame con todas las interacciones, o None si la descarga falló
+    """
+    store_df, state = (None, None) if full else load_interaction_store()
+    
+    if store_df is None:
+        print("Sincronización completa de interacciones...")
+        delta_df = fetch_interactions_from_laravel()
+        if delta_df is None:
+            return None
+        merged = delta_df
+    else:
+        watermark = state['watermark_updated_at']
+        print(f"Sincronización incremental desde {format_timestamp(watermark)} "
+              f"({state['count']} interacciones locales)...")
+        delta_df = fetch_interactions_from_laravel(updated_since=watermark)
+        if delta_df is None:
+            return None
+        merged = merge_interactions(store_df, delta_df)
+    
+    remote_total = delta_df.attrs.get('remote_total')
+    if remote_total is not None and remote_total != len(merged):
+        print(f"⚠ {len(merged)} locales vs {remote_total} remotas: revisando eliminaciones")
+        remote_ids = fetch_interaction_ids_from_laravel()
+        if remote_ids is None:
+            return None
+        merged = merged[np.isin(merged['id'].to_numpy(), remote_ids)].reset_index(drop=True)
+    
+    state = save_interaction_store(merged)
+    merged.attrs['parse_seconds'] = delta_df.attrs.get('parse_seconds', 0.0)
+    print(f"✓ Almacén sincronizado: {state['count']} interacciones "
+          f"({len(delta_df)} descargadas)")
+    return merged
+
+# Columnas y tipos compactos que se leen de las exportaciones (el resto se descarta)
+EXPORT_DTYPES = {
+    'user_id': np.int32,
+    'item_id': np.int32,
+    'rating': np.int8,
+}
+
+def latest_export_file(directory=None):
+    """Exportación más reciente (interactions_*.csv o .parquet) en EXPORTS_DIR"""
+    directory = directory or EXPORTS_DIR
+    try:
+        names = [name for name in os.listdir(directory)
+                 if name.startswith('interactions_') and name.endswith(('.csv', '.parquet'))]
+    except FileNotFoundError:
+        return None
+    if not names:
+        return None
+    return max((os.path.join(directory, name) for name in names), key=os.path.getmtime)
+
+def iter_interaction_chunks(path, chunk_rows=None):
+    """
+    Interacciones por bloques de chunk_rows filas, sin cargar la fuente entera.
+    
+    path es una exportación CSV/Parquet (columnas de EXPORT_DTYPES).
+    """
+    chunk_rows = chunk_rows or FILE_CHUNK_ROWS
+    columns = list(EXPORT_DTYPES)
+    
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise ValueError('Leer Parquet requiere pyarrow (pip install pyarrow)')
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas().astype(EXPORT_DTYPES, copy=False)
+    else:
+        for chunk in pd.read_csv(path, usecols=columns, dtype=EXPORT_DTYPES,
+                                 chunksize=chunk_rows, engine='c'):
+            yield chunk[columns]
+
+def read_interactions_file(path, chunk_rows=None):
+    """
+    Lee una exportación de interacciones desde disco, sin HTTP ni JSON.
+    
+    Solo se leen user_id, item_id y rating, ya con tipos compactos (ids
+    int32, rating int8), por bloques de FILE_CHUNK_ROWS filas: el parser de
+    pandas/pyarrow nunca crea un dict por fila.
+    
+    Returns:
+        DataFrame con las columnas de EXPORT_DTYPES; el tiempo de lectura
+        queda en df.attrs['parse_seconds']
+    """
+    columns = list(EXPORT_DTYPES)
+    start = time.perf_counter()
+    chunks = list(iter_interaction_chunks(path, chunk_rows))
+    
+    if chunks:
+        df = pd.concat(chunks, ignore_index=True)[columns]
+    else:
+        df = pd.DataFrame({name: np.empty(0, dtype=dtype) for name, dtype in EXPORT_DTYPES.items()})
+    df.attrs['parse_seconds'] = time.perf_counter() - start
+    print(f"✓ {len(df)} interacciones leídas de {os.path.basename(path)} "
+          f"en {df.attrs['parse_seconds']:.2f} s")
+    return df
+
+def convert_export_to_parquet(csv_path, parquet_path=None, chunk_rows=None):
+    """Convierte una exportación CSV a Parquet (columnas y tipos compactos)"""
+    if pq is None:
+        raise ValueError('Convertir a Parquet requiere pyarrow (pip install pyarrow)')
+    import pyarrow as pa
+    
+    parquet_path = parquet_path or os.path.splitext(csv_path)[0] + '.parquet'
+    tmp_path = f'{parquet_path}.tmp'
+    writer = None
+    try:
+        for chunk in pd.read_csv(csv_path, usecols=list(EXPORT_DTYPES), dtype=EXPORT_DTYPES,
+                                 chunksize=chunk_rows or FILE_CHUNK_ROWS, engine='c'):
+            table = pa.Table.from_pandas(chunk[list(EXPORT_DTYPES)], preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+def build_interaction_matrix(df):
+    """
+    Construye la matriz usuario-item dispersa (CSR) directamente desde las
+    interacciones, sin pasar por pivot_table.
+
+    Los ratings duplicados de un mismo par usuario-item se promedian (igual que
+    el antiguo aggfunc='mean') y se normalizan a [0,1]. La memoria depende del
+    número de interacciones, no de usuarios x items.
+
+    Returns:
+        (R, user_ids, item_ids) con R en formato CSR float32 y los ids ordenados
+    """
+    # Codificación vectorizada id -> índice
+    user_ids, user_codes = np.unique(df['user_id'].to_numpy(), return_inverse=True)
+    item_ids, item_codes = np.unique(df['item_id'].to_numpy(), return_inverse=True)
+    ratings = df['rating'].to_numpy(dtype=np.float32)
+    shape = (len(user_ids), len(item_ids))
+
+    return ratings_matrix(user_codes, item_codes, ratings, shape), user_ids, item_ids
+
+def ratings_matrix(rows, cols, ratings, shape):
+    """CSR float32 con los ratings duplicados promediados y normalizados a [0,1]"""
+    # COO -> CSR suma duplicados; con los conteos obtenemos la media
+    ratings = np.asarray(ratings, dtype=np.float32)
+    sums = sp.coo_matrix((ratings, (rows, cols)), shape=shape).tocsr()
+    counts = sp.coo_matrix((np.ones_like(ratings), (rows, cols)), shape=shape).tocsr()
+    sums.sum_duplicates()
+    counts.sum_duplicates()
+
+    R = sums
+    R.data = (sums.data / counts.data - 1) / 4.0
+    np.clip(R.data, 0, 1, out=R.data)
+    R.data = R.data.astype(np.float32)
+    return R
+
+def reconstruction_error(R, W, H):
+    """||R - W H||_F sin materializar W H (mismo valor que reconstruction_err_ de NMF)"""
+    # En float64: es una resta de términos grandes y parecidos
+    W = np.asarray(W, dtype=np.float64)
+    H = np.asarray(H, dtype=np.float64)
+    data = R.data.astype(np.float64)
+    rows = np.repeat(np.arange(R.shape[0]), np.diff(R.indptr))
+    cross = np.dot(data, np.einsum('ij,ji->i', W[rows], H[:, R.indices]))
+    squared = np.dot(data, data) - 2 * cross + np.sum((W.T @ W) * (H @ H.T))
+    return float(np.sqrt(max(squared, 0.0)))
+
+def warm_start_factors(previous_model, R, user_ids, item_ids, alpha):
+    """
+    W y H iniciales para la matriz nueva a partir del modelo anterior.
+    
+    Usuarios e items conocidos copian sus factores; los nuevos se estiman
+    por mínimos cuadrados regularizados contra los factores conocidos
+    (recortados a >= 0), igual que un fold-in.
+    
+    Returns:
+        (W0, H0, resumen) en float32
+    """
+    n_components = previous_model['H'].shape[0]
+    ridge = max(alpha, 1e-6) * np.eye(n_components, dtype=np.float32)
+    
+    H0 = np.zeros((n_components, len(item_ids)), dtype=np.float32)
+    old_items = np.searchsorted(previous_model['item_ids'], item_ids)
+    old_items = np.minimum(old_items, len(previous_model['item_ids']) - 1)
+    known_items = previous_model['item_ids'][old_items] == item_ids
+    H0[:, known_items] = item_factors(previous_model, old_items[known_items])
+    
+    W0 = np.zeros((len(user_ids), n_components), dtype=np.float32)
+    old_users = user_indices(previous_model, user_ids)
+    known_users = old_users >= 0
+    W0[known_users] = user_factors(previous_model, old_users[known_users])
+    
+    new_users = np.flatnonzero(~known_users)
+    if len(new_users):
+        gram = H0 @ H0.T + ridge
+        W0[new_users] = np.linalg.solve(gram, (R[new_users] @ H0.T).T).T
+    new_items = np.flatnonzero(~known_items)
+    if len(new_items):
+        gram = W0.T @ W0 + ridge
+        H0[:, new_items] = np.linalg.solve(gram, (R[:, new_items].T @ W0).T)
+    np.clip(W0, 0, None, out=W0)
+    np.clip(H0, 0, None, out=H0)
+    
+    return W0, H0, {
+        'known_users': int(known_users.sum()),
+        'new_users': int(len(new_users)),
+        'known_items': int(known_items.sum()),
+        'new_items': int(len(new_items))
+    }
+
+def train_model(interactions_data, max_components=10, max_iter=30, alpha=0.02,
+                tol=1e-4, previous_model=None):
+    """
+    Entrena modelo NMF sobre la matriz dispersa de interacciones
+    
+    Args:
+        max_components: Número máximo de componentes latentes (reducido a 10)
+        max_iter: Iteraciones máximas (reducido a 30)
+        alpha: Regularización de W y H
+        tol: Tolerancia de convergencia
+        previous_model: Modelo anterior para arrancar en caliente (None = en frío)
+    """
+    if interactions_data is None or len(interactions_data) == 0:
+        raise ValueError("No hay datos de interacciones para entrenar")
+    
+    print(f"Procesando {len(interactions_data)} interacciones...")
+    
+    # Convertir a DataFrame (acepta lista de dicts o DataFrame ya tipado)
+    if isinstance(interactions_data, pd.DataFrame):
+        df = interactions_data
+    else:
+        df = pd.DataFrame(interactions_data)
+    
+    # Validar columnas
+    required_columns = ['user_id', 'item_id', 'rating']
+    if not all(col in df.columns for col in required_columns):
+        raise ValueError(f"Faltan columnas requeridas: {required_columns}")
+    
+    # Matriz usuario-item dispersa
+    print("Construyendo matriz usuario-item (CSR)...")
+    start = time.perf_counter()
+    R, user_ids, item_ids = build_interaction_matrix(df)
+    timings = {'matrix_build': time.perf_counter() - start}
+    del df
+    
+    n_users, n_items = R.shape
+    
+    print(f"Matriz: {n_users} usuarios x {n_items} items ({R.nnz} valores)")
+    
+    # Componentes reducidos para laptops
+    n_components = min(max_components, min(n_users, n_items) - 1)
+    if n_components < 1:
+        n_components = 1
+    
+    if previous_model is not None and previous_model['H'].shape[0] != n_components:
+        print(f"⚠ El modelo anterior tiene {previous_model['H'].shape[0]} componentes: "
+              f"arranque en frío")
+        previous_model = None
+    
+    print(f"Entrenando NMF con {n_components} componentes, {max_iter} iteraciones "
+          f"({'en caliente' if previous_model is not None else 'en frío'})...")
+    
+    start = time.perf_counter()
+    warm_start = None
+    if previous_model is None:
+        # Modelo NMF optimizado
+        model = NMF(
+            n_components=n_components,
+            random_state=42,
+            max_iter=max_iter,  # Reducido
+            tol=tol,
+            alpha_W=alpha,  # Más regularización
+            alpha_H=alpha,
+            solver='cd',  # Más rápido
+            beta_loss='frobenius',
+            init='nndsvd',  # Mejor inicialización
+            verbose=0
+        )
+        W = model.fit_transform(R)
+        H = model.components_
+        n_iter = model.n_iter_
+        err = model.reconstruction_err_
+    else:
+        W, H, warm_start = warm_start_factors(previous_model, R, user_ids, item_ids, alpha)
+        print(f"  {warm_start['new_users']} usuarios y {warm_start['new_items']} items nuevos")
+        
+        # El criterio de parada de sklearn es relativo a la violación inicial,
+        # que en caliente ya es pequeña: se ajusta por tramos y se corta cuando
+        # el error de reconstrucción deja de mejorar más que tol. Con max_iter=0
+        # quedan los factores iniciales y su error
+        n_iter = 0
+        err = previous_err = reconstruction_error(R, W, H)
+        while n_iter < max_iter:
+            model = NMF(
+                n_components=n_components,
+                max_iter=min(WARM_START_CHUNK_ITER, max_iter - n_iter),
+                tol=0,
+                alpha_W=alpha,
+                alpha_H=alpha,
+                solver='cd',
+                beta_loss='frobenius',
+                init='custom',
+                verbose=0
+            )
+            W = model.fit_transform(R, W=W, H=H)
+            H = model.components_
+            n_iter += model.n_iter_
+            err = model.reconstruction_err_
+            if previous_err - err <= tol * previous_err:
+                break
+            previous_err = err
+    timings['nmf_fit'] = time.perf_counter() - start
+    print(f"  {n_iter} iteraciones en {timings['nmf_fit']:.2f} s")
+    
+    # Float32 para ahorrar memoria
+    W = W.astype(np.float32)
+    H = H.astype(np.float32)
+    
+    # Pre-calcular predicciones solo si la matriz densa es razonable
+    if n_users * n_items <= PREDICTIONS_MAX_CELLS:
+        print("Pre-calculando predicciones para caché...")
+        R_pred = np.dot(W, H)
+        R_pred = (R_pred * 4.0) + 1  # Escalar a [1,5]
+        R_pred = np.clip(R_pred, 1, 5).astype(np.float32)
+        scoring_mode = 'precomputed'
+    else:
+        print(f"⚠ {n_users * n_items} celdas > {PREDICTIONS_MAX_CELLS}: puntuación al vuelo")
+        R_pred = None
+        scoring_mode = 'on_the_fly'
+    
+    model_info = {
+        'W': W,
+        'H': H,
+        'predictions': R_pred,  # Caché de predicciones (None = al vuelo)
+        # Ids como arrays; np.unique ya los deja ordenados
+        'user_ids': user_ids.astype(np.int64),
+        'user_order': np.arange(n_users, dtype=np.int64),
+        'item_ids': item_ids.astype(np.int64),
+        # Items vistos como índice CSR: fila u = seen_indices[seen_indptr[u]:seen_indptr[u+1]]
+        'seen_indptr': R.indptr.astype(np.int64),
+        'seen_indices': R.indices.astype(np.int32),
+        'metadata': {
+            'n_components': n_components,
+            'n_users': n_users,
+            'n_items': n_items,
+            'nnz': int(R.nnz),
+            'scoring_mode': scoring_mode,
+            'n_iter': int(n_iter),
+            'reconstruction_err': float(err),
+            'warm_start': warm_start,
+            'trained_at': datetime.now().isoformat(),
+            'timings': timings
+        }
+    }
+    
+    # Índice de items similares (embeddings normalizados + listas IVF)
+    start = time.perf_counter()
+    model_info.update(build_item_index(H))
+    timings['item_index'] = time.perf_counter() - start
+    
+    # MSE sobre las interacciones observadas para logging
+    rows = np.repeat(np.arange(n_users), np.diff(R.indptr))
+    observed_pred = np.einsum('ij,ji->i', W[rows], H[:, R.indices])
+    mse = np.mean((R.data - observed_pred) ** 2)
+    print(f"✓ Modelo entrenado - MSE: {mse:.4f}, Componentes: {n_components}")
+    
+    # Limpiar memoria
+    del R, rows, observed_pred
+    
+    return model_info
+
+# Registro de una interacción repartida en un bloque en disco
+BLOCK_RECORD = np.dtype([('row', '<i4'), ('col', '<i4'), ('rating', '<f4')])
+
+def source_signature(path):
+    """Ruta, tamaño y mtime de la fuente: un checkpoint solo se reanuda sobre los mismos datos"""
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def merge_id_counts(ids, counts, chunk_ids):
+    """Suma las apariciones de chunk_ids al conteo acumulado (ids ordenados)"""
+    chunk_ids, chunk_counts = np.unique(chunk_ids, return_counts=True)
+    ids, inverse = np.unique(np.concatenate([ids, chunk_ids]), return_inverse=True)
+    merged = np.bincount(inverse, weights=np.concatenate([counts, chunk_counts]), minlength=len(ids))
+    return ids, merged.astype(np.int64)
+
+def block_starts(counts, block_nnz):
+    """
+    Primera fila de cada bloque (más el total al final), cortando cada
+    ~block_nnz interacciones. Una fila con más de block_nnz queda sola.
+    """
+    offsets = np.cumsum(counts) - counts
+    _, starts = np.unique(offsets // block_nnz, return_index=True)
+    return np.append(starts, len(counts)).astype(np.int64)
+
+def partition_interactions(source_path, workdir, block_nnz, chunk_rows=None):
+    """
+    Reparte las interacciones en bloques de filas en disco, en dos vistas:
+    por usuario (u<b>.npz, filas = usuarios) y por item (i<b>.npz, filas =
+    items), cada bloque una CSR con los ratings normalizados (ratings_matrix).
+    
+    Los bloques se cortan por número de interacciones y no de filas: con la
+    popularidad de items sesgada, unos pocos items concentran buena parte de
+    los valores. Dos pasadas por la fuente: ids únicos con sus conteos y
+    reparto de registros a archivos por bloque. La memoria depende de
+    chunk_rows, block_nnz y el número de ids, no del total de interacciones.
+    
+    Returns:
+        (user_ids, item_ids, {'u': inicios, 'i': inicios}, resumen con nnz y sumas)
+    """
+    ids = {'u': np.empty(0, dtype=np.int64), 'i': np.empty(0, dtype=np.int64)}
+    counts = {'u': np.empty(0, dtype=np.int64), 'i': np.empty(0, dtype=np.int64)}
+    for chunk in iter_interaction_chunks(source_path, chunk_rows):
+        for view, column in (('u', 'user_id'), ('i', 'item_id')):
+            ids[view], counts[view] = merge_id_counts(ids[view], counts[view], chunk[column].to_numpy())
+    if len(ids['u']) == 0:
+        raise ValueError("No hay datos de interacciones para entrenar")
+    
+    starts = {view: block_starts(counts[view], block_nnz) for view in ids}
+    n_cols = {'u': len(ids['i']), 'i': len(ids['u'])}
+    del counts
+    
+    raw_dir = os.path.join(workdir, 'raw')
+    os.makedirs(raw_dir, exist_ok=True)
+    for chunk in iter_interaction_chunks(source_path, chunk_rows):
+        user_idx = np.searchsorted(ids['u'], chunk['user_id'].to_numpy())
+        item_idx = np.searchsorted(ids['i'], chunk['item_id'].to_numpy())
+        records = np.empty(len(chunk), dtype=BLOCK_RECORD)
+        records['rating'] = chunk['rating'].to_numpy()
+        for view, rows, cols in (('u', user_idx, item_idx), ('i', item_idx, user_idx)):
+            records['row'] = rows
+            records['col'] = cols
+            blocks = np.searchsorted(starts[view], rows, side='right') - 1
+            order = np.argsort(blocks, kind='stable')
+            bounds = np.searchsorted(blocks[order], np.arange(len(starts[view])))
+            # Append por escritura: con muchos bloques no se agotan los descriptores
+            for block in np.flatnonzero(np.diff(bounds)):
+                with open(os.path.join(raw_dir, f'{view}{block}.bin'), 'ab') as f:
+                    records[order[bounds[block]:bounds[block + 1]]].tofile(f)
+    
+    summary = {'nnz': 0, 'sum': 0.0, 'sum_sq': 0.0}
+    for view, view_starts in starts.items():
+        for block in range(len(view_starts) - 1):
+            first, last = view_starts[block], view_starts[block + 1]
+            raw_path = os.path.join(raw_dir, f'{view}{block}.bin')
+            records = np.fromfile(raw_path, dtype=BLOCK_RECORD)
+            R = ratings_matrix(records['row'] - first, records['col'], records['rating'],
+                               (last - first, n_cols[view]))
+            del records
+            sp.save_npz(os.path.join(workdir, f'{view}{block}.npz'), R, compressed=False)
+            os.remove(raw_path)
+            if view == 'u':
+                data = R.data.astype(np.float64)
+                summary['nnz'] += int(R.nnz)
+                summary['sum'] += float(data.sum())
+                summary['sum_sq'] += float(np.dot(data, data))
+    os.rmdir(raw_dir)
+    return ids['u'], ids['i'], starts, summary
+
+def hals_sweep(F, A, G):
+    """
+    Una pasada de descenso por coordenadas sobre las columnas de F >= 0 (la
+    actualización del solver 'cd' de NMF), con A = R Q^T y G = Q Q^T + l2·I.
+    """
+    for t in range(F.shape[1]):
+        if G[t, t] <= 0:
+            continue
+        F[:, t] -= (F @ G[:, t] - A[:, t]) / G[t, t]
+        np.maximum(F[:, t], 0, out=F[:, t])
+
+def train_model_out_of_core(source_path, max_components=10, max_iter=30, alpha=0.02,
+                            tol=1e-4, chunk_rows=None, block_nnz=None, checkpoint_dir=None):
+    """
+    Entrena el mismo modelo NMF que train_model sin cargar las interacciones
+    en memoria.
+    
+    La exportación CSV/Parquet se lee por bloques de chunk_rows y se reparte
+    en disco en bloques de ~block_nnz interacciones, por usuario y por item. Cada época actualiza W recorriendo los bloques de
+    usuarios y H recorriendo los de items, con la misma función objetivo y
+    regularización que el solver 'cd' de NMF. W y H viven en .npy mapeados
+    dentro de checkpoint_dir; la memoria pico es un bloque más los factores
+    (usuarios + items) x componentes, sin importar cuántas interacciones haya.
+    
+    Al terminar cada época se guarda state.json. Si el proceso se cae, la
+    siguiente llamada con la misma fuente y parámetros reanuda desde la
+    última época completa (con los factores tal como quedaron, que siguen
+    siendo un punto de partida válido). checkpoint_dir queda en disco: el
+    llamador lo borra después de guardar el modelo.
+    """
+    block_nnz = block_nnz or TRAIN_BLOCK_NNZ
+    checkpoint_dir = checkpoint_dir or TRAINING_DIR
+    state_path = os.path.join(checkpoint_dir, 'state.json')
+    params = {
+        'source': source_signature(source_path),
+        'max_components': max_components,
+        'alpha': alpha,
+        'block_nnz': block_nnz,
+    }
+    
+    state = None
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get('params') != params:
+            print("⚠ El checkpoint es de otra fuente o parámetros: se descarta")
+            state = None
+    
+    timings = {}
+    start = time.perf_counter()
+    if state is None:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        os.makedirs(checkpoint_dir)
+        print(f"Repartiendo interacciones en bloques de ~{block_nnz} valores...")
+        user_ids, item_ids, starts, summary = partition_interactions(
+            source_path, checkpoint_dir, block_nnz, chunk_rows
+        )
+        np.save(os.path.join(checkpoint_dir, 'user_ids.npy'), user_ids)
+        np.save(os.path.join(checkpoint_dir, 'item_ids.npy'), item_ids)
+        np.save(os.path.join(checkpoint_dir, 'user_starts.npy'), starts['u'])
+        np.save(os.path.join(checkpoint_dir, 'item_starts.npy'), starts['i'])
+        n_users, n_items = len(user_ids), len(item_ids)
+        n_components = max(1, min(max_components, min(n_users, n_items) - 1))
+        
+        # Como init='random' de NMF: nndsvd necesitaría la matriz entera
+        rng = np.random.default_rng(42)
+        scale = np.sqrt(summary['sum'] / (n_users * n_items) / n_components)
+        W = np.lib.format.open_memmap(os.path.join(checkpoint_dir, 'W.npy'), mode='w+',
+                                      dtype=np.float32, shape=(n_users, n_components))
+        for first, last in zip(starts['u'][:-1], starts['u'][1:]):
+            W[first:last] = scale * np.abs(rng.standard_normal((last - first, n_components)))
+        H = np.lib.format.open_memmap(os.path.join(checkpoint_dir, 'H.npy'), mode='w+',
+                                      dtype=np.float32, shape=(n_components, n_items))
+        H[:] = scale * np.abs(rng.standard_normal((n_components, n_items)))
+        W.flush()
+        H.flush()
+        del W, H
+        
+        state = {'params': params, 'epoch': 0, 'errors': [], 'converged': False,
+                 'n_components': n_components, **summary}
+        write_json_atomic(state_path, state)
+        resumed_from = None
+    else:
+        resumed_from = state['epoch']
+        print(f"↻ Reanudando entrenamiento desde la época {resumed_from}")
+    timings['matrix_build'] = time.perf_counter() - start
+    
+    user_ids = np.load(os.path.join(checkpoint_dir, 'user_ids.npy'))
+    item_ids = np.load(os.path.join(checkpoint_dir, 'item_ids.npy'))
+    user_starts = np.load(os.path.join(checkpoint_dir, 'user_starts.npy'))
+    item_starts = np.load(os.path.join(checkpoint_dir, 'item_starts.npy'))
+    W = np.load(os.path.join(checkpoint_dir, 'W.npy'), mmap_mode='r+')
+    H = np.load(os.path.join(checkpoint_dir, 'H.npy'), mmap_mode='r+')
+    n_users, n_items = len(user_ids), len(item_ids)
+    n_components = state['n_components']
+    identity = np.eye(n_components)
+    
+    def blocks(view, starts):
+        """(filas del bloque, CSR del bloque) recorriendo una vista en orden"""
+        for block in range(len(starts) - 1):
+            R_block = sp.load_npz(os.path.join(checkpoint_dir, f'{view}{block}.npz'))
+            yield slice(starts[block], starts[block + 1]), R_block
+    
+    # Regularización L2 escalada como alpha_W/alpha_H en NMF
+    l2_W = alpha * n_items
+    l2_H = alpha * n_users
+    
+    print(f"Entrenando NMF fuera de memoria: {n_users} usuarios x {n_items} items "
+          f"({state['nnz']} valores), {n_components} componentes, {max_iter} épocas...")
+    start = time.perf_counter()
+    while state['epoch'] < max_iter and not state['converged']:
+        # W por bloques de usuarios; el error sale de los mismos productos
+        H_mem = np.asarray(H, dtype=np.float64)
+        HHt = H_mem @ H_mem.T
+        gram = HHt + l2_W * identity
+        WtW = np.zeros((n_components, n_components))
+        cross = 0.0
+        for rows, R_block in blocks('u', user_starts):
+            A = R_block @ H_mem.T
+            W_block = np.asarray(W[rows], dtype=np.float64)
+            hals_sweep(W_block, A, gram)
+            W[rows] = W_block
+            cross += float(np.sum(W_block * A))
+            WtW += W_block.T @ W_block
+        err = float(np.sqrt(max(state['sum_sq'] - 2 * cross + np.sum(WtW * HHt), 0.0)))
+        del H_mem
+        
+        # H por bloques de items
+        W_mem = np.asarray(W)
+        gram = WtW + l2_H * identity
+        for cols, R_block in blocks('i', item_starts):
+            B = np.asarray(R_block @ W_mem, dtype=np.float64)
+            H_block = np.array(H[:, cols].T, dtype=np.float64)
+            hals_sweep(H_block, B, gram)
+            H[:, cols] = H_block.T
+        del W_mem
+        
+        W.flush()
+        H.flush()
+        errors = state['errors']
+        state['converged'] = bool(errors) and errors[-1] - err <= tol * errors[-1]
+        errors.append(err)
+        state['epoch'] += 1
+        write_json_atomic(state_path, state)
+        print(f"  época {state['epoch']}: error {err:.4f}")
+    timings['nmf_fit'] = time.perf_counter() - start
+    n_iter = state['epoch']
+    print(f"  {n_iter} épocas en {timings['nmf_fit']:.2f} s")
+    
+    # Pasada final: error con los factores finales, MSE observado e índice de vistos
+    W = np.load(os.path.join(checkpoint_dir, 'W.npy'), mmap_mode='r')
+    H = np.array(np.load(os.path.join(checkpoint_dir, 'H.npy')), dtype=np.float32)
+    seen_indptr = np.zeros(n_users + 1, dtype=np.int64)
+    seen_indices = np.lib.format.open_memmap(os.path.join(checkpoint_dir, 'seen_indices.npy'),
+                                             mode='w+', dtype=np.int32, shape=(state['nnz'],))
+    WtW = np.zeros((n_components, n_components))
+    cross = 0.0
+    observed_sq = 0.0
+    offset = 0
+    for rows, R_block in blocks('u', user_starts):
+        W_block = np.asarray(W[rows], dtype=np.float64)
+        cross += float(np.sum(W_block * (R_block @ H.T)))
+        WtW += W_block.T @ W_block
+        
+        # Predicción observada por tramos: nnz x componentes a la vez sería otro bloque entero
+        local_rows = np.repeat(np.arange(R_block.shape[0]), np.diff(R_block.indptr))
+        for part in range(0, R_block.nnz, 131072):
+            span = slice(part, part + 131072)
+            observed_pred = np.einsum('ij,ji->i', W_block[local_rows[span]],
+                                      H[:, R_block.indices[span]])
+            observed_sq += float(np.sum((R_block.data[span] - observed_pred) ** 2))
+        
+        seen_indptr[rows.start + 1:rows.stop + 1] = offset + R_block.indptr[1:]
+        seen_indices[offset:offset + R_block.nnz] = R_block.indices
+        offset += R_block.nnz
+    seen_indices.flush()
+    reconstruction_err = float(np.sqrt(max(
+        state['sum_sq'] - 2 * cross + np.sum(WtW * (H.astype(np.float64) @ H.T)), 0.0
+    )))
+    
+    if n_users * n_items <= PREDICTIONS_MAX_CELLS:
+        R_pred = np.clip(np.asarray(W) @ H * 4.0 + 1, 1, 5).astype(np.float32)
+        scoring_mode = 'precomputed'
+    else:
+        R_pred = None
+        scoring_mode = 'on_the_fly'
+    
+    model_info = {
+        'W': W,
+        'H': H,
+        'predictions': R_pred,
+        'user_ids': user_ids.astype(np.int64),
+        'user_order': np.arange(n_users, dtype=np.int64),
+        'item_ids': item_ids.astype(np.int64),
+        'seen_indptr': seen_indptr,
+        'seen_indices': seen_indices,
+        'metadata': {
+            'n_components': n_components,
+            'n_users': n_users,
+            'n_items': n_items,
+            'nnz': state['nnz'],
+            'scoring_mode': scoring_mode,
+            'n_iter': int(n_iter),
+            'reconstruction_err': reconstruction_err,
+            'warm_start': None,
+            'training_mode': 'out_of_core',
+            'block_nnz': block_nnz,
+            'resumed_from_epoch': resumed_from,
+            'trained_at': datetime.now().isoformat(),
+            'timings': timings
+        }
+    }
+    
+    start = time.perf_counter()
+    model_info.update(build_item_index(H))
+    timings['item_index'] = time.perf_counter() - start
+    
+    mse = observed_sq / max(state['nnz'], 1)
+    print(f"✓ Modelo entrenado - MSE: {mse:.4f}, Componentes: {n_components}")
+    return model_info
+
+def nearest_centroids(vectors, centroids):
+    """
+    Centroide más parecido a cada vector, por bloques de hasta
+    SIMILAR_BLOCK_SIZE vectores y BATCH_BLOCK_CELLS productos: vectores x
+    centroides de una vez serían ~400 MB con 1M items (muestra de 100k x
+    1000 listas).
+    """
+    block_rows = max(1, min(SIMILAR_BLOCK_SIZE, BATCH_BLOCK_CELLS // max(len(centroids), 1)))
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_rows):
+        block = vectors[start:start + block_rows]
+        assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+def build_item_index(H, n_lists=None, n_iter=10, seed=42):
+    """
+    Índice de similitud item-item a partir de H.
+    
+    Los embeddings son las columnas de H normalizadas (coseno = producto
+    punto). Para el modo aproximado se agrupan con k-means esférico en
+    ~sqrt(n_items) listas, guardadas como CSR (lista -> items).
+    """
+    # Copia explícita: si H viene en orden Fortran, H.T ya es contigua y
+    # ascontiguousarray devolvería una vista que se normalizaría sobre H
+    embeddings = np.array(H.T, dtype=np.float32, order='C', copy=True)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+    
+    n_items = len(embeddings)
+    if n_lists is None:
+        n_lists = int(np.sqrt(n_items))
+    n_lists = max(1, min(n_lists, n_items))
+    
+    # Centroides entrenados sobre una muestra; luego se asignan todos los items
+    rng = np.random.default_rng(seed)
+    sample = embeddings
+    if n_items > SIMILAR_KMEANS_SAMPLE:
+        sample = embeddings[rng.choice(n_items, SIMILAR_KMEANS_SAMPLE, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Listas vacías conservan su centroide anterior
+        np.divide(sums, norms, out=centroids, where=norms > 0)
+    
+    assign = nearest_centroids(embeddings, centroids)
+    
+    return {
+        'item_embeddings': embeddings,
+        'item_centroids': centroids,
+        'item_list_indptr': np.concatenate(
+            [[0], np.cumsum(np.bincount(assign, minlength=n_lists))]
+        ).astype(np.int64),
+        'item_list_indices': np.argsort(assign, kind='stable').astype(np.int32)
+    }
+
+def quantize_rows(F, mode):
+    """
+    Cuantiza las filas de F (factores >= 0) según mode.
+    
+    Returns:
+        (valores float16 o uint8, escala float32 por fila)
+    """
+    peak = F.max(axis=1)
+    if mode == 'float16':
+        # Filas normalizadas a [0, 1]: los factores chicos de NMF quedarían
+        # subnormales en float16, con menos precisión
+        scale = np.where(peak > 0, peak, 1).astype(np.float32)
+        return (F / scale[:, None]).astype(np.float16), scale
+    # NMF no tiene factores negativos: 8 bits sin signo, 0..255 hasta el máximo de la fila
+    scale = np.where(peak > 0, peak / 255, 1).astype(np.float32)
+    return np.rint(F / scale[:, None]).astype(np.uint8), scale
+
+def user_factors(model_info, rows):
+    """Filas de W en float32, descuantizadas si el modelo guarda W cuantizado"""
+    W = np.asarray(model_info['W'][rows], dtype=np.float32)
+    scale = model_info.get('W_scale')
+    return W if scale is None else W * scale[rows][..., None]
+
+def item_factors(model_info, cols=slice(None)):
+    """Columnas de H en float32, descuantizadas si el modelo guarda H cuantizado"""
+    H = np.asarray(model_info['H'][:, cols], dtype=np.float32)
+    scale = model_info.get('H_scale')
+    return H if scale is None else H * scale[cols]
+
+# float16 -> float32 por tabla de sus 65536 patrones de bits: NumPy convierte
+# float16 elemento a elemento, varias veces más lento (sobre todo con ceros)
+FLOAT16_TABLE = np.arange(65536, dtype=np.uint16).view(np.float16).astype(np.float32)
+
+def score_users(model_info, rows):
+    """
+    W[rows] @ H escalado a [1,5], para un usuario (fila) o varios (matriz).
+    
+    Con H cuantizado el producto se hace por tramos de QUANTIZED_BLOCK_ITEMS
+    items pasados a float32: nunca se materializa H completo y cada tramo
+    cabe en caché mientras se multiplica. La escala por item se aplica al
+    resultado (filas x tramo), no al tramo de H.
+    """
+    W_rows = user_factors(model_info, rows)
+    H = model_info['H']
+    if H.dtype in (np.float32, np.float64):
+        scores = W_rows @ H
+    else:
+        scale = model_info.get('H_scale')
+        scores = np.empty(W_rows.shape[:-1] + (H.shape[1],), dtype=np.float32)
+        for lo in range(0, H.shape[1], QUANTIZED_BLOCK_ITEMS):
+            cols = slice(lo, lo + QUANTIZED_BLOCK_ITEMS)
+            block = H[:, cols]
+            if block.dtype == np.float16:
+                block = np.take(FLOAT16_TABLE, block.view(np.uint16))
+            scores[..., cols] = W_rows @ block.astype(np.float32, copy=False)
+            if scale is not None:
+                scores[..., cols] *= scale[cols]
+    scores = scores * 4.0 + 1  # Escalar a [1,5]
+    return np.clip(scores, 1, 5, out=scores)
+
+def score_user(model_info, user_idx):
+    """
+    Ratings predichos [1,5] de un usuario para todos los items.
+
+    Usa la fila pre-calculada si existe; si no, calcula W[u] @ H al vuelo.
+    Siempre devuelve un array nuevo que el llamador puede modificar.
+    """
+    predictions = model_info.get('predictions')
+    if predictions is not None:
+        return np.array(predictions[user_idx], dtype=np.float32)
+    return score_users(model_info, user_idx)
+
+def top_n_indices(scores, n):
+    """Índices de los n mayores scores, de mayor a menor, con selección parcial"""
+    n = min(n, len(scores))
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+    
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+def seen_item_indices(model_info, user_idx):
+    """Índices (columnas) de los items ya vistos por el usuario"""
+    indptr = model_info['seen_indptr']
+    return model_info['seen_indices'][indptr[user_idx]:indptr[user_idx + 1]]
+
+def rank_items(model_info, user_idx, top_n, exclude_idx=None):
+    """
+    Ranking vectorizado de items no vistos (ni excluidos) para un usuario.
+
+    Returns:
+        (top_idx, scores, total_available, seen_count)
+    """
+    scores = score_user(model_info, user_idx)
+    seen_idx = seen_item_indices(model_info, user_idx)
+    scores[seen_idx] = -np.inf
+    if exclude_idx is not None and len(exclude_idx):
+        scores[exclude_idx] = -np.inf
+        total_available = int(np.count_nonzero(scores > -np.inf))
+    else:
+        total_available = len(scores) - len(seen_idx)
+    
+    top_idx = top_n_indices(scores, min(top_n, total_available))
+    return top_idx, scores, total_available, len(seen_idx)
+
+def gather_csr_rows(indptr, indices, rows):
+    """
+    Concatena las filas CSR indicadas sin bucles de Python.
+
+    Returns:
+        (row_pos, cols): posición de fila (0..len(rows)-1) y columna de cada valor
+    """
+    starts = indptr[rows]
+    lengths = indptr[np.asarray(rows) + 1] - starts
+    row_pos = np.repeat(np.arange(len(rows)), lengths)
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return row_pos, indices[offsets + np.arange(len(row_pos))]
+
+def known_item_indices(item_ids, requested_ids):
+    """Índices de los ids pedidos que existen en item_ids (ordenado); ignora el resto"""
+    requested_ids = np.asarray(requested_ids, dtype=np.int64)
+    idx = np.searchsorted(item_ids, requested_ids)
+    idx = np.minimum(idx, len(item_ids) - 1)
+    return idx[item_ids[idx] == requested_ids]
+
+def batch_block_users(n_items):
+    """
+    Usuarios por bloque de scoring: el bloque es usuarios x n_items scores
+    (más su copia negada y los índices de argpartition), así que se limita
+    por celdas además de por usuarios.
+    """
+    return max(1, min(BATCH_BLOCK_SIZE, BATCH_BLOCK_CELLS // max(n_items, 1)))
+
+def rank_items_batch(model_info, user_idxs, top_n, exclude_idx=None):
+    """
+    Ranking vectorizado de varios usuarios, por bloques de batch_block_users().
+
+    Cada bloque se puntúa con un solo producto W[users] @ H (o filas de la
+    matriz pre-calculada) y el top N se elige por fila con argpartition.
+
+    Returns:
+        (top_idx, top_scores, total_available, seen_counts); las posiciones sin
+        item disponible quedan con score -inf
+    """
+    user_idxs = np.asarray(user_idxs, dtype=np.int64)
+    n_users = len(user_idxs)
+    n_items = model_info['H'].shape[1]
+    k = min(top_n, n_items)
+    
+    indptr = model_info['seen_indptr']
+    top_idx = np.zeros((n_users, k), dtype=np.int64)
+    top_scores = np.full((n_users, k), -np.inf, dtype=np.float32)
+    total_available = np.zeros(n_users, dtype=np.int64)
+    seen_counts = indptr[user_idxs + 1] - indptr[user_idxs]
+    
+    block_size = batch_block_users(n_items)
+    for start in range(0, n_users, block_size):
+        block = user_idxs[start:start + block_size]
+        
+        predictions = model_info.get('predictions')
+        if predictions is not None:
+            scores = predictions[block]
+        else:
+            scores = score_users(model_info, block)
+        
+        # Excluir vistos y la lista explícita de exclusión
+        row_pos, cols = gather_csr_rows(indptr, model_info['seen_indices'], block)
+        scores[row_pos, cols] = -np.inf
+        if exclude_idx is not None and len(exclude_idx):
+            scores[:, exclude_idx] = -np.inf
+        
+        block_slice = slice(start, start + len(block))
+        if exclude_idx is not None and len(exclude_idx):
+            total_available[block_slice] = np.count_nonzero(scores > -np.inf, axis=1)
+        else:
+            # Los vistos de cada fila son únicos: no hace falta recorrer la matriz
+            total_available[block_slice] = n_items - seen_counts[block_slice]
+        
+        if k == 0:
+            continue
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(scores, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind='stable')
+        top_idx[block_slice] = np.take_along_axis(part, order, axis=1)
+        top_scores[block_slice] = np.take_along_axis(part_scores, order, axis=1)
+    
+    return top_idx, top_scores, total_available, seen_counts
+
+def top_n_overlap(reference, candidate, user_idxs, top_n=10):
+    """Fracción del top N de `reference` que también aparece en el de `candidate`"""
+    ref_idx, ref_scores, _, _ = rank_items_batch(reference, user_idxs, top_n)
+    cand_idx, _, _, _ = rank_items_batch(candidate, user_idxs, top_n)
+    valid = np.isfinite(ref_scores)
+    hits = (ref_idx[:, :, None] == cand_idx[:, None, :]).any(axis=2) & valid
+    return float(hits.sum() / max(valid.sum(), 1))
+
+def quantize_model(model, mode, check_users=None):
+    """
+    Variante cuantizada de un modelo para guardar.
+    
+    W se cuantiza por usuario y H por item (quantize_rows); la matriz de
+    predicciones se descarta y se puntúa al vuelo desde los factores. El top
+    10 de una muestra de usuarios se compara contra los factores float32 y
+    el solapamiento queda en metadata['quantization'].
+    """
+    if mode not in ('float16', 'uint8'):
+        raise ValueError(f"Cuantización no soportada: {mode}")
+    check_users = QUANTIZATION_CHECK_USERS if check_users is None else check_users
+    
+    W = user_factors(model, slice(None))
+    H = item_factors(model)
+    W_q, W_scale = quantize_rows(W, mode)
+    H_q, H_scale = quantize_rows(H.T, mode)
+    reference = {**model, 'W': W, 'H': H, 'W_scale': None, 'H_scale': None, 'predictions': None}
+    quantized = {**model, 'W': W_q, 'H': np.ascontiguousarray(H_q.T), 'W_scale': W_scale,
+                 'H_scale': H_scale, 'predictions': None}
+    
+    rng = np.random.default_rng(42)
+    sample = rng.choice(len(W), min(check_users, len(W)), replace=False)
+    overlap = top_n_overlap(reference, quantized, sample)
+    
+    predictions = model.get('predictions')
+    full_bytes = W.nbytes + H.nbytes + (0 if predictions is None else predictions.nbytes)
+    quantized_bytes = sum(a.nbytes for a in (W_q, H_q, W_scale, H_scale) if a is not None)
+    quantized['metadata'] = {
+        **model['metadata'],
+        'scoring_mode': 'on_the_fly',
+        'quantization': {
+            'mode': mode,
+            'top10_overlap': overlap,
+            'check_users': int(len(sample)),
+            'bytes': int(quantized_bytes),
+            'float32_bytes': int(full_bytes),
+        }
+    }
+    print(f"✓ Factores cuantizados a {mode}: {full_bytes / 1e6:.1f} MB -> "
+          f"{quantized_bytes / 1e6:.1f} MB, top 10 coincide en {overlap:.1%}")
+    return quantized
+
+def top_k_table_block(workdir, user_idxs, k):
+    """Tarea del pool: top K de un bloque de usuarios con los factores mapeados desde workdir"""
+    model_info = {
+        name: np.load(os.path.join(workdir, f'{name}.npy'), mmap_mode='r')
+        for name in ('W', 'H', 'seen_indptr', 'seen_indices')
+    }
+    model_info['predictions'] = None
+    top_idx, top_scores, _, _ = rank_items_batch(model_info, user_idxs, k)
+    return top_idx.astype(np.int32), top_scores
+
+def materialize_top_k(model_info, k=None, max_users=None, workers=None):
+    """
+    Tabla de top K (items no vistos) de los usuarios con más interacciones.
+    
+    Los bloques de batch_block_users() usuarios se reparten en un pool de
+    procesos ('spawn': el entrenamiento corre en un hilo del worker web),
+    que leen W, H y el índice de vistos de un directorio temporal mapeado en
+    lugar de recibirlos serializados. Con un solo proceso, o pocos usuarios,
+    se calcula aquí mismo.
+    
+    Returns:
+        {'topk_rows', 'topk_items', 'topk_scores'}: topk_rows[u] es la fila
+        de la tabla del usuario u, o -1 si no está; las posiciones sin item
+        disponible quedan con score -inf. Vacío si TOPK_TABLE_K es 0.
+    """
+    k = TOPK_TABLE_K if k is None else k
+    max_users = TOPK_TABLE_USERS if max_users is None else max_users
+    workers = TOPK_TABLE_WORKERS if workers is None else workers
+    k = min(k, model_info['H'].shape[1])
+    if k <= 0 or max_users <= 0:
+        return {}
+    
+    start = time.perf_counter()
+    indptr = model_info['seen_indptr']
+    n_users = len(indptr) - 1
+    if max_users >= n_users:
+        users = np.arange(n_users)
+    else:
+        users = np.sort(np.argsort(-np.diff(indptr), kind='stable')[:max_users])
+    block_size = batch_block_users(model_info['H'].shape[1])
+    blocks = [users[lo:lo + block_size] for lo in range(0, len(users), block_size)]
+    
+    top_items = np.empty((len(users), k), dtype=np.int32)
+    top_scores = np.empty((len(users), k), dtype=np.float32)
+    offsets = np.cumsum([0] + [len(block) for block in blocks])
+    workers = max(1, min(workers, len(blocks)))
+    if workers == 1:
+        for offset, block in zip(offsets, blocks):
+            block_slice = slice(offset, offset + len(block))
+            top_items[block_slice], top_scores[block_slice], _, _ = rank_items_batch(model_info, block, k)
+    else:
+        workdir = tempfile.mkdtemp(prefix='.topk-', dir=DATA_DIR)
+        try:
+            np.save(os.path.join(workdir, 'W.npy'), user_factors(model_info, slice(None)))
+            np.save(os.path.join(workdir, 'H.npy'), item_factors(model_info))
+            np.save(os.path.join(workdir, 'seen_indptr.npy'), np.asarray(indptr))
+            np.save(os.path.join(workdir, 'seen_indices.npy'), np.asarray(model_info['seen_indices']))
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [pool.submit(top_k_table_block, workdir, block, k) for block in blocks]
+                for offset, block, future in zip(offsets, blocks, futures):
+                    block_slice = slice(offset, offset + len(block))
+                    top_items[block_slice], top_scores[block_slice] = future.result()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    rows = np.full(n_users, -1, dtype=np.int32)
+    rows[users] = np.arange(len(users), dtype=np.int32)
+    print(f"✓ Tabla top {k}: {len(users)} usuarios en {time.perf_counter() - start:.2f} s "
+          f"({workers} procesos)")
+    return {'topk_rows': rows, 'topk_items': top_items, 'topk_scores': top_scores}
+
+def materialized_top_n(model_info, user_idx, top_n):
+    """
+    Top N de un usuario desde la tabla materializada: (top_idx, scores), o
+    None si no hay tabla, el usuario no está en ella o top_n supera K.
+    """
+    rows = model_info.get('topk_rows')
+    if rows is None or top_n > model_info['topk_items'].shape[1] or user_idx >= len(rows):
+        return None
+    row = rows[user_idx]
+    if row < 0:
+        return None
+    return (model_info['topk_items'][row, :top_n].astype(np.int64),
+            np.array(model_info['topk_scores'][row, :top_n]))
+
+class MicroBatcher:
+    """
+    Agrupa peticiones concurrentes de /recommend en un solo rank_items_batch.
+    
+    Un hilo despachador toma la primera petición de la cola, junta las que
+    llegan durante `window` segundos (hasta `max_users`) y las puntúa juntas;
+    cada petición recibe su fila por un Future. Si el grupo no empezó a
+    puntuarse tras `max_wait` segundos, la petición se cancela y se puntúa
+    sola: la latencia agregada queda acotada aunque el despachador se atrase.
+    """
+    
+    def __init__(self, window, max_users, max_wait):
+        self.window = window
+        self.max_users = max_users
+        self.max_wait = max_wait
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def _ensure_dispatcher(self):
+        # Los hilos no sobreviven al fork de Gunicorn: se inicia en el primer uso
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='recommend-batcher', daemon=True
+                )
+                self._thread.start()
+    
+    def rank(self, model_info, user_idx, top_n):
+        """
+        Top N de un usuario (sin exclusiones) puntuado junto a otras peticiones.
+        
+        Returns:
+            (top_idx, top_scores, total_available, seen_count)
+        """
+        self._ensure_dispatcher()
+        future = Future()
+        self._queue.put((model_info, user_idx, top_n, future))
+        try:
+            return future.result(timeout=self.max_wait)
+        except FutureTimeoutError:
+            if not future.cancel():
+                return future.result()  # Ya se está puntuando: termina enseguida
+        
+        MICROBATCH_TIMEOUTS.inc()
+        top_idx, scores, total_available, seen_count = rank_items(model_info, user_idx, top_n)
+        return top_idx, scores[top_idx], total_available, seen_count
+    
+    def _collect(self):
+        """La primera petición en cola más las que lleguen dentro de la ventana"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_users:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while True:
+            # Las canceladas por max_wait ya se puntuaron solas
+            batch = [entry for entry in self._collect() if entry[3].set_running_or_notify_cancel()]
+            
+            # Un grupo por modelo: una versión nueva puede publicarse dentro de la ventana
+            groups = {}
+            for entry in batch:
+                groups.setdefault(id(entry[0]), []).append(entry)
+            for entries in groups.values():
+                self._score(entries)
+    
+    def _score(self, entries):
+        futures = [entry[3] for entry in entries]
+        try:
+            user_idxs = np.array([entry[1] for entry in entries], dtype=np.int64)
+            top_n = max(entry[2] for entry in entries)
+            top_idx, top_scores, total_available, seen_counts = rank_items_batch(
+                entries[0][0], user_idxs, top_n
+            )
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        
+        MICROBATCH_SIZE.observe((), len(entries))
+        for row, (entry, future) in enumerate(zip(entries, futures)):
+            # Los items disponibles van primero; el resto de la fila es -inf
+            available = int(total_available[row])
+            n = min(entry[2], available)
+            future.set_result((top_idx[row, :n], top_scores[row, :n], available, int(seen_counts[row])))
+
+_recommend_batcher = MicroBatcher(
+    MICROBATCH_WINDOW_MS / 1000, MICROBATCH_MAX_USERS, MICROBATCH_MAX_WAIT_MS / 1000
+) if MICROBATCH_ENABLED else None
+
+def shard_item_range(n_items, shard_index, shard_count):
+    """Rango [lo, hi) de índices de items de un shard (particiones contiguas y parejas)"""
+    bounds = np.linspace(0, n_items, shard_count + 1).astype(np.int64)
+    return int(bounds[shard_index]), int(bounds[shard_index + 1])
+
+def build_shard_view(model_info, shard_index, shard_count):
+    """
+    Parte del modelo que usa un shard.
+    
+    Las columnas [lo, hi) de H se copian a un array propio (el resto del H
+    mapeado nunca se lee) y el índice de vistos se restringe a ese rango, con
+    columnas locales. W no hace falta: el router envía las filas de usuario.
+    """
+    lo, hi = shard_item_range(len(model_info['item_ids']), shard_index, shard_count)
+    indices = model_info['seen_indices']
+    in_range = (indices >= lo) & (indices < hi)
+    # Vistos en rango acumulados: evaluados en indptr dan el indptr del shard
+    cumulative = np.concatenate([[0], np.cumsum(in_range)])
+    return {
+        'version': model_info.get('version'),
+        'lo': lo,
+        'hi': hi,
+        'H': np.ascontiguousarray(model_info['H'][:, lo:hi]),
+        'H_scale': None if model_info.get('H_scale') is None else np.array(model_info['H_scale'][lo:hi]),
+        'seen_indptr': cumulative[model_info['seen_indptr']],
+        'seen_indices': (indices[in_range] - lo).astype(np.int32),
+    }
+
+def shard_view(model_info):
+    """Vista de este shard (SHARD_INDEX) para el modelo dado; se rehace al cambiar de versión"""
+    global _shard_view
+    
+    view = _shard_view
+    if view is None or view['version'] != model_info.get('version'):
+        with _shard_view_lock:
+            view = _shard_view
+            if view is None or view['version'] != model_info.get('version'):
+                view = _shard_view = build_shard_view(model_info, SHARD_INDEX, SHARD_COUNT)
+    return view
+
+def rank_shard(view, factors, user_idxs, top_n, exclude_idx=None):
+    """
+    Top N de varios usuarios dentro del rango de items de un shard.
+    
+    factors son las filas de W de los usuarios (las envía el router).
+    
+    Returns:
+        lo mismo que rank_items_batch, con índices de items globales
+    """
+    user_idxs = np.asarray(user_idxs, dtype=np.int64)
+    row_pos, cols = gather_csr_rows(view['seen_indptr'], view['seen_indices'], user_idxs)
+    counts = np.bincount(row_pos, minlength=len(user_idxs))
+    local = {
+        'W': np.asarray(factors, dtype=np.float32).reshape(len(user_idxs), -1),
+        'H': view['H'],
+        'H_scale': view['H_scale'],
+        'predictions': None,
+        'seen_indptr': np.concatenate([[0], np.cumsum(counts)]),
+        'seen_indices': cols,
+    }
+    if exclude_idx is not None and len(exclude_idx):
+        exclude_idx = np.asarray(exclude_idx, dtype=np.int64)
+        exclude_idx = exclude_idx[(exclude_idx >= view['lo']) & (exclude_idx < view['hi'])] - view['lo']
+    
+    top_idx, top_scores, total_available, seen_counts = rank_items_batch(
+        local, np.arange(len(user_idxs)), top_n, exclude_idx
+    )
+    return top_idx + view['lo'], top_scores, total_available, seen_counts
+
+def merge_shard_results(results, top_n):
+    """Une los top N de cada shard en el top N global (formato de rank_items_batch)"""
+    top_idx = np.concatenate([result[0] for result in results], axis=1)
+    top_scores = np.concatenate([result[1] for result in results], axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')[:, :top_n]
+    return (
+        np.take_along_axis(top_idx, order, axis=1),
+        np.take_along_axis(top_scores, order, axis=1),
+        sum(result[2] for result in results),
+        sum(result[3] for result in results),
+    )
 
-def train_model(interactions_data, max_components=10, max_iter=30):
+def request_shard(url, body):
+    """POST /shard/rank a un shard y decodifica su respuesta binaria"""
+    response = get_shard_session().post(f'{url}/shard/rank', json=body, timeout=SHARD_TIMEOUT)
+    response.raise_for_status()
+    rows, cols = int(response.headers['X-Rows']), int(response.headers['X-Cols'])
+    data = response.content
+    offset = 0
+    arrays = []
+    for dtype, shape in (('<i8', (rows, cols)), ('<f4', (rows, cols)), ('<i8', (rows,)), ('<i8', (rows,))):
+        count = int(np.prod(shape))
+        arrays.append(np.frombuffer(data, dtype, count, offset).reshape(shape))
+        offset += count * np.dtype(dtype).itemsize
+    return arrays
+
+def rank_items_sharded(model_info, user_idxs, top_n, exclude_idx=None):
     """
-    Entrena modelo optimizado para laptops con recursos limitados
+    Modo router: envía las filas de W a todos los shards en paralelo y une
+    sus top N. Mismo resultado que rank_items_batch; el router no lee H.
     
-    Args:
-        max_components: Número máximo de componentes latentes (reducido a 10)
-        max_iter: Iteraciones máximas (reducido a 30)
+    Un shard caído o con otra versión del modelo lanza RequestException
+    (HTTPError 409 en el segundo caso; ver retry_on_shard_conflict).
     """
-    if not interactions_data or len(interactions_data) == 0:
-        raise ValueError("No hay datos de interacciones para entrenar")
+    user_idxs = np.asarray(user_idxs, dtype=np.int64)
+    if len(user_idxs) == 0:
+        # Sin usuarios conocidos no hay nada que pedir a los shards
+        return (np.zeros((0, top_n), dtype=np.int64), np.full((0, top_n), -np.inf, dtype=np.float32),
+                np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    body = {
+        'version': model_info.get('version'),
+        'user_idx': user_idxs.tolist(),
+        'factors': user_factors(model_info, user_idxs).tolist(),
+        'top_n': int(top_n),
+        'exclude_idx': [] if exclude_idx is None else np.asarray(exclude_idx).tolist(),
+    }
+    futures = [_shard_executor.submit(request_shard, url, body) for url in SHARD_URLS]
+    return merge_shard_results([future.result() for future in futures], top_n)
+
+def item_embeddings(model_info):
+    """Embeddings normalizados de items (calculados desde H si el modelo no los trae)"""
+    embeddings = model_info.get('item_embeddings')
+    if embeddings is None:
+        embeddings = build_item_index(item_factors(model_info), n_lists=1)['item_embeddings']
+    return embeddings
+
+def similar_items_exact(model_info, item_idx, top_n):
+    """
+    Búsqueda exacta por coseno, por bloques de SIMILAR_BLOCK_SIZE items.
     
-    print(f"Procesando {len(interactions_data)} interacciones...")
+    Cada bloque aporta sus top N (argpartition); el resultado final se elige
+    entre esos candidatos, sin materializar todos los scores a la vez.
     
-    # Convertir a DataFrame
-    df = pd.DataFrame(interactions_data)
+    Returns:
+        (top_idx, top_scores)
+    """
+    embeddings = item_embeddings(model_info)
+    query = np.asarray(embeddings[item_idx], dtype=np.float32)
+    candidates, candidate_scores = [], []
+    for start in range(0, len(embeddings), SIMILAR_BLOCK_SIZE):
+        scores = embeddings[start:start + SIMILAR_BLOCK_SIZE] @ query
+        if start <= item_idx < start + len(scores):
+            scores[item_idx - start] = -np.inf  # El propio item no cuenta
+        top = top_n_indices(scores, top_n)
+        candidates.append(top + start)
+        candidate_scores.append(scores[top])
     
-    # Validar columnas
-    required_columns = ['user_id', 'item_id', 'rating']
-    if not all(col in df.columns for col in required_columns):
-        raise ValueError(f"Faltan columnas requeridas: {required_columns}")
+    candidates = np.concatenate(candidates)
+    candidate_scores = np.concatenate(candidate_scores)
+    best = top_n_indices(candidate_scores, top_n)
+    best = best[candidate_scores[best] > -np.inf]
+    return candidates[best], candidate_scores[best]
+
+def similar_items_approx(model_info, item_idx, top_n, nprobe=None):
+    """
+    Búsqueda aproximada: solo se puntúan los items de las `nprobe` listas
+    cuyos centroides son más parecidos al item consultado.
+    
+    Returns:
+        (top_idx, top_scores)
+    """
+    centroids = model_info.get('item_centroids')
+    if centroids is None:
+        return similar_items_exact(model_info, item_idx, top_n)
     
-    # Limitar tamaño para laptops (reducido a 5000)
-    MAX_INTERACTIONS = 5000
-    if len(df) > MAX_INTERACTIONS:
-        print(f"⚠ Limitando a {MAX_INTERACTIONS} interacciones para optimizar")
-        df = df.sample(n=MAX_INTERACTIONS, random_state=42).reset_index(drop=True)
-    
-    # Matriz usuario-item
-    print("Construyendo matriz usuario-item...")
-    R = df.pivot_table(
-        index='user_id',
-        columns='item_id',
-        values='rating',
-        fill_value=0,
-        aggfunc='mean'
+    embeddings = model_info['item_embeddings']
+    query = np.asarray(embeddings[item_idx], dtype=np.float32)
+    lists = top_n_indices(centroids @ query, nprobe or SIMILAR_NPROBE)
+    _, candidates = gather_csr_rows(
+        model_info['item_list_indptr'], model_info['item_list_indices'], lists
     )
+    candidates = candidates[candidates != item_idx]
     
-    # IDs y mapeos
-    user_ids = R.index.values
-    item_ids = R.columns.values
+    scores = embeddings[candidates] @ query
+    best = top_n_indices(scores, top_n)
+    return candidates[best].astype(np.int64), scores[best]
+
+def fold_in_users(model_info, interactions_df):
+    """
+    Calcula los vectores latentes de un conjunto de usuarios contra H fijo
+    (NNLS por usuario) y devuelve un modelo nuevo con W, mapeos, índice de
+    vistos y predicciones parcheados. El modelo original no se modifica.
     
-    user_to_idx = {user_id: idx for idx, user_id in enumerate(user_ids)}
-    item_to_idx = {item_id: idx for idx, item_id in enumerate(item_ids)}
-    idx_to_user = {idx: user_id for user_id, idx in user_to_idx.items()}
-    idx_to_item = {idx: item_id for item_id, idx in item_to_idx.items()}
+    Las interacciones de cada usuario se toman como su historial completo;
+    los items que no están en el modelo se ignoran.
     
-    # Convertir a float32 para ahorrar memoria
-    R_array = R.values.astype(np.float32)
-    n_users, n_items = R_array.shape
+    Returns:
+        (nuevo_model_info, resumen)
+    """
+    item_ids = model_info['item_ids']
+    H = item_factors(model_info)
+    n_items = H.shape[1]
     
-    print(f"Matriz: {n_users} usuarios x {n_items} items")
+    # Solo items conocidos: H no tiene columna para los nuevos
+    item_idx = np.searchsorted(item_ids, interactions_df['item_id'].to_numpy())
+    item_idx = np.minimum(item_idx, n_items - 1)
+    known = item_ids[item_idx] == interactions_df['item_id'].to_numpy()
+    df = interactions_df[known]
     
-    # Normalizar a [0,1]
-    R_normalized = (R_array - 1) / 4.0
-    R_normalized = np.clip(R_normalized, 0, 1)
+    R, fold_user_ids, fold_item_ids = build_interaction_matrix(df)
+    R_full = sp.csr_matrix(
+        (R.data, known_item_indices(item_ids, fold_item_ids)[R.indices], R.indptr),
+        shape=(R.shape[0], n_items)
+    )
     
-    # Componentes reducidos para laptops
-    n_components = min(max_components, min(n_users, n_items) - 1)
-    if n_components < 1:
-        n_components = 1
+    # Fold-in: min ||H^T w - r||, w >= 0, una fila por usuario
+    W_fold = np.empty((len(fold_user_ids), H.shape[0]), dtype=np.float32)
+    H_T = H.T.astype(np.float64)
+    for row in range(len(fold_user_ids)):
+        W_fold[row], _ = nnls(H_T, R_full[row].toarray().ravel())
     
-    print(f"Entrenando NMF con {n_components} componentes, {max_iter} iteraciones...")
-    
-    # Modelo NMF optimizado
-    model = NMF(
-        n_components=n_components,
-        random_state=42,
-        max_iter=max_iter,  # Reducido
-        alpha_W=0.02,  # Más regularización
-        alpha_H=0.02,
-        solver='cd',  # Más rápido
-        beta_loss='frobenius',
-        init='nndsvd',  # Mejor inicialización
-        verbose=0
-    )
+    # Filas existentes se reemplazan, usuarios nuevos se agregan al final
+    n_existing = len(model_info['user_ids'])
+    rows = user_indices(model_info, fold_user_ids)
+    is_new = rows < 0
+    n_new = int(is_new.sum())
+    rows[is_new] = np.arange(n_existing, n_existing + n_new)
+    user_ids = np.concatenate([model_info['user_ids'], fold_user_ids[is_new].astype(np.int64)])
     
-    W = model.fit_transform(R_normalized)
-    H = model.components_
+    # En un modelo cuantizado solo se cuantizan las filas nuevas; el resto de W
+    # y metadata['quantization'] (medida al entrenar) se conservan
+    W = np.concatenate([model_info['W'], np.zeros((n_new, H.shape[0]), dtype=model_info['W'].dtype)])
+    W_scale = model_info.get('W_scale')
+    if W_scale is None:
+        W[rows] = W_fold
+    else:
+        W_scale = np.concatenate([W_scale, np.ones(n_new, dtype=np.float32)])
+        W[rows], W_scale[rows] = quantize_rows(W_fold, model_info['metadata']['quantization']['mode'])
     
-    # Float32 para ahorrar memoria
-    W = W.astype(np.float32)
-    H = H.astype(np.float32)
+    # Índice de vistos: quitar las filas reemplazadas y agregar las nuevas
+    indptr = model_info['seen_indptr']
+    old_rows = np.repeat(np.arange(n_existing), np.diff(indptr))
+    keep = ~np.isin(old_rows, rows)
+    new_rows = rows[np.repeat(np.arange(len(rows)), np.diff(R_full.indptr))]
+    entry_rows = np.concatenate([old_rows[keep], new_rows])
+    entry_cols = np.concatenate([model_info['seen_indices'][keep], R_full.indices])
+    order = np.argsort(entry_rows, kind='stable')
+    seen_indptr = np.concatenate(
+        [[0], np.cumsum(np.bincount(entry_rows, minlength=len(user_ids)))]
+    ).astype(np.int64)
     
-    # Pre-calcular predicciones para caché
-    print("Pre-calculando predicciones para caché...")
-    R_pred = np.dot(W, H)
-    R_pred = (R_pred * 4.0) + 1  # Escalar a [1,5]
-    R_pred = np.clip(R_pred, 1, 5)
+    predictions = model_info.get('predictions')
+    if predictions is not None:
+        predictions = np.vstack([predictions, np.zeros((n_new, n_items), dtype=np.float32)])
+        predictions[rows] = np.clip(W_fold @ H * 4.0 + 1, 1, 5)
     
-    # Guardar items vistos por usuario para filtrado rápido
-    user_seen_items = {}
-    for user_id in user_ids:
-        user_items = df[df['user_id'] == user_id]['item_id'].tolist()
-        user_seen_items[int(user_id)] = set(int(i) for i in user_items)
+    # Los usuarios recalculados salen de la tabla top K hasta el próximo entrenamiento
+    topk_rows = model_info.get('topk_rows')
+    if topk_rows is not None:
+        topk_rows = np.concatenate([topk_rows, np.full(n_new, -1, dtype=np.int32)])
+        topk_rows[rows] = -1
     
-    model_info = {
+    # Revisión del fold-in por usuario: cambia el ETag y la clave de caché
+    # solo de los usuarios recalculados
+    revision = model_info['metadata'].get('fold_in_revision', 0) + 1
+    user_revision = model_info.get('user_revision')
+    if user_revision is None:
+        user_revision = np.zeros(n_existing, dtype=np.int32)
+    user_revision = np.concatenate([user_revision, np.zeros(n_new, dtype=np.int32)])
+    user_revision[rows] = revision
+    
+    new_model = {
+        **model_info,
         'W': W,
-        'H': H,
-        'predictions': R_pred.astype(np.float32),  # Caché de predicciones
-        'user_to_idx': user_to_idx,
-        'item_to_idx': item_to_idx,
-        'idx_to_user': idx_to_user,
-        'idx_to_item': idx_to_item,
-        'user_ids': [int(uid) for uid in user_ids],
-        'item_ids': [int(iid) for iid in item_ids],
-        'user_seen_items': user_seen_items,  # Caché de items vistos
+        'W_scale': W_scale,
+        'predictions': predictions,
+        'topk_rows': topk_rows,
+        'user_revision': user_revision,
+        'user_ids': user_ids,
+        'user_order': np.argsort(user_ids, kind='stable'),
+        'seen_indptr': seen_indptr,
+        'seen_indices': entry_cols[order].astype(np.int32),
         'metadata': {
-            'n_components': n_components,
-            'n_users': n_users,
-            'n_items': n_items,
-            'trained_at': datetime.now().isoformat()
+            **model_info['metadata'],
+            'n_users': len(user_ids),
+            'folded_in_users': model_info['metadata'].get('folded_in_users', 0) + len(rows),
+            'fold_in_revision': revision,
+            'updated_at': datetime.now().isoformat()
         }
     }
+    summary = {
+        'updated_users': int(len(rows) - n_new),
+        'new_users': int(n_new),
+        'ignored_interactions': int((~known).sum())
+    }
+    return new_model, summary
+
+def build_recommendation(model_info, user_id, top_n, exclude):
+    """
+    Calcula la respuesta de /recommend para un usuario.
     
-    # MSE para logging
-    mse = np.mean((R_normalized - (R_pred - 1) / 4.0) ** 2)
-    print(f"✓ Modelo entrenado - MSE: {mse:.4f}, Componentes: {n_components}")
+    item_ids y scores quedan como arrays NumPy; cada formato de respuesta
+    los serializa a su manera (ver render_recommendation).
     
-    # Limpiar memoria
-    del R_array, R_normalized, R, R_pred
+    Returns:
+        (payload, status_code)
+    """
+    # Verificar usuario y obtener su índice
+    user_idx = int(user_indices(model_info, [user_id])[0])
+    if user_idx < 0:
+        return {
+            'error': f'Usuario {user_id} no encontrado en el modelo',
+            'available_users': model_info['user_ids'][:10].tolist()  # Primeros 10
+        }, 404
     
-    return model_info
+    # Tabla materializada: sin exclusiones y top_n <= K es solo un corte
+    table = None if exclude else materialized_top_n(model_info, user_idx, top_n)
+    if model_info.get('topk_rows') is not None:
+        TOPK_TABLE_LOOKUPS.inc(('miss',) if table is None else ('hit',))
+    
+    # Ranking vectorizado: máscara de vistos + selección parcial del top N
+    if table is not None:
+        indptr = model_info['seen_indptr']
+        seen_count = int(indptr[user_idx + 1] - indptr[user_idx])
+        total_available = len(model_info['item_ids']) - seen_count
+        n = min(top_n, total_available)
+        top_idx, top_scores = table[0][:n], table[1][:n]
+    elif SHARD_URLS:
+        # Modo router: cada shard puntúa su rango de items
+        exclude_idx = known_item_indices(model_info['item_ids'], exclude) if exclude else None
+        top_idx, top_scores, total_available, seen_count = rank_items_sharded(
+            model_info, [user_idx], top_n, exclude_idx
+        )
+        total_available, seen_count = int(total_available[0]), int(seen_count[0])
+        n = min(top_n, total_available)
+        top_idx, top_scores = top_idx[0, :n], top_scores[0, :n]
+    # Sin exclusiones la petición puede compartir un micro-lote con otras
+    elif _recommend_batcher is not None and not exclude:
+        top_idx, top_scores, total_available, seen_count = _recommend_batcher.rank(
+            model_info, user_idx, top_n
+        )
+    else:
+        exclude_idx = known_item_indices(model_info['item_ids'], exclude) if exclude else None
+        top_idx, scores, total_available, seen_count = rank_items(
+            model_info, user_idx, top_n, exclude_idx
+        )
+        top_scores = scores[top_idx]
+    
+    if total_available == 0:
+        return {
+            'message': 'No hay items nuevos para recomendar',
+            'user_id': int(user_id),
+            'item_ids': np.empty(0, dtype=np.int64),
+            'scores': np.empty(0, dtype=np.float32),
+            'seen_items_count': seen_count
+        }, 200
+    
+    return {
+        'user_id': int(user_id),
+        'item_ids': model_info['item_ids'][top_idx],
+        'scores': top_scores,
+        'total_available': total_available,
+        'seen_items_count': seen_count
+    }, 200
+
+def negotiate_format():
+    """
+    Formato de respuesta según ?format= (json, msgpack, binary) o Accept.
+    
+    Returns:
+        mimetype, o None si se pidió un formato no disponible
+    """
+    formats = {'json': 'application/json', 'binary': 'application/octet-stream'}
+    if msgpack is not None:
+        formats['msgpack'] = 'application/msgpack'
+    requested = request.args.get('format')
+    if requested:
+        return formats.get(requested)
+    return request.accept_mimetypes.best_match(list(formats.values()), default='application/json')
+
+def wants_scores(data=None):
+    """False con ?scores=0 (o include_scores: false en el JSON): se omite el mapa de scores"""
+    if data is not None and 'include_scores' in data:
+        return bool(data['include_scores'])
+    return request.args.get('scores', '1') not in ('0', 'false')
+
+def to_builtin(value):
+    """Arrays NumPy a listas, recorriendo dicts y listas (para json/msgpack estándar)"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {key: to_builtin(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_builtin(item) for item in value]
+    return value
+
+def render_recommendation(payload, include_scores):
+    """Payload de un usuario para JSON/MessagePack: scores como mapa item -> rating"""
+    body = {key: value for key, value in payload.items() if key != 'scores'}
+    if include_scores and 'message' not in payload:
+        body['predictions'] = dict(zip(
+            map(str, payload['item_ids'].tolist()), payload['scores'].tolist()
+        ))
+    return body
+
+def serialize_response(body, mimetype, status=200):
+    """
+    Respuesta en JSON o MessagePack.
+    
+    Con orjson instalado los arrays NumPy se serializan directamente, sin
+    pasar por listas de int/float de Python.
+    """
+    if mimetype == 'application/msgpack':
+        return app.response_class(msgpack.packb(to_builtin(body)), status=status,
+                                  mimetype=mimetype)
+    if orjson is not None:
+        return app.response_class(orjson.dumps(body, option=orjson.OPT_SERIALIZE_NUMPY),
+                                  status=status, mimetype='application/json')
+    response = jsonify(to_builtin(body))
+    response.status_code = status
+    return response
+
+def pack_arrays(*arrays):
+    """Arrays como bytes little-endian concatenados (formato binary)"""
+    return b''.join(np.ascontiguousarray(array).tobytes() for array in arrays)
+
+def parse_int(value):
+    """Entero de JSON o de la query string; None si no lo es (1.5, "x", null, true)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return None
+    return None
+
+def parse_ids(values):
+    """Lista de ids enteros (user_ids, exclude); None si no es lista o algún id no es entero"""
+    if not isinstance(values, list):
+        return None
+    ids = [parse_int(value) for value in values]
+    return None if None in ids else ids
+
+def shard_version_conflict(error):
+    """True si un shard respondió 409: su versión del modelo no es la del router"""
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code == 409
+
+def retry_on_shard_conflict(respond):
+    """
+    Llama a respond(model_info). En modo router, si un shard tiene otra
+    versión del modelo (409), recarga la del router y reintenta una vez.
+    """
+    try:
+        return respond(load_model())
+    except requests.exceptions.HTTPError as e:
+        if not shard_version_conflict(e):
+            raise
+        check_model_update()
+        return respond(load_model())
+
+def recommendation_etag(model_info, user_idx):
+    """
+    ETag de /recommend: versión base del modelo y, si el usuario se recalculó
+    con un fold-in, su revisión. Publicar un fold-in no invalida el ETag ni
+    la caché de los demás usuarios.
+    """
+    version = base_version(model_info)
+    user_revision = model_info.get('user_revision')
+    revision = 0 if user_revision is None else int(user_revision[user_idx])
+    return version if not version or revision == 0 else f'{version}.{revision}'
+
+def recommendation_response(model_info, user_id, top_n, exclude, include_scores, mimetype):
+    """Respuesta de /recommend con un modelo dado (ETag, caché y formato)"""
+    # La respuesta de un usuario es inmutable por ETag: si el cliente ya la
+    # tiene, 304. Solo para usuarios del modelo; uno desconocido recibe su 404
+    user_idx = int(user_indices(model_info, [int(user_id)])[0])
+    version = recommendation_etag(model_info, user_idx) if user_idx >= 0 else None
+    if version and request.if_none_match.contains(version):
+        response = app.response_class(status=304)
+        response.set_etag(version)
+        return response
+    
+    cache_key = (version, int(user_id), top_n, tuple(sorted(set(exclude))))
+    cached = _response_cache.get(cache_key)
+    if cached is None:
+        payload, status = build_recommendation(model_info, user_id, top_n, exclude)
+        if status == 200:
+            _response_cache.put(cache_key, payload)
+    else:
+        payload, status = cached, 200
+    
+    if status != 200:
+        return jsonify(payload), status
+    
+    if mimetype == 'application/octet-stream':
+        arrays = [payload['item_ids'].astype('<i8')]
+        if include_scores:
+            arrays.append(payload['scores'].astype('<f4'))
+        response = app.response_class(pack_arrays(*arrays), mimetype=mimetype)
+        response.headers['X-Item-Count'] = str(len(payload['item_ids']))
+    else:
+        response = serialize_response(render_recommendation(payload, include_scores), mimetype)
+    
+    response.vary.add('Accept')
+    if version:
+        response.set_etag(version)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def batch_recommendation_response(model_info, user_ids, top_n, exclude, include_scores, mimetype):
+    """Respuesta de /recommend/batch con un modelo dado"""
+    # Separar usuarios conocidos (se puntúan juntos) de los desconocidos
+    all_idx = user_indices(model_info, user_ids)
+    known_pos = np.flatnonzero(all_idx >= 0)
+    known_idx = all_idx[known_pos]
+    
+    item_ids = model_info['item_ids']
+    exclude_idx = known_item_indices(item_ids, exclude)
+    
+    rank = rank_items_sharded if SHARD_URLS else rank_items_batch
+    top_idx, top_scores, total_available, seen_counts = rank(
+        model_info, known_idx, top_n, exclude_idx
+    )
+    top_item_ids = item_ids[top_idx]
+    valid = top_scores > -np.inf
+    
+    if mimetype == 'application/octet-stream':
+        # Todo vectorizado: conteos por usuario + ids y scores aplanados
+        counts = np.full(len(user_ids), -1, dtype='<i4')
+        counts[known_pos] = valid.sum(axis=1)
+        arrays = [counts, top_item_ids[valid].astype('<i8')]
+        if include_scores:
+            arrays.append(top_scores[valid].astype('<f4'))
+        response = app.response_class(pack_arrays(*arrays), mimetype=mimetype)
+        response.headers['X-User-Count'] = str(len(user_ids))
+        response.vary.add('Accept')
+        return response
+    
+    # Resultados en el orden de la petición
+    results = [
+        {'user_id': uid, 'error': f'Usuario {uid} no encontrado en el modelo'}
+        for uid in user_ids
+    ]
+    for row, pos in enumerate(known_pos.tolist()):
+        row_valid = valid[row]
+        results[pos] = render_recommendation({
+            'user_id': int(user_ids[pos]),
+            'item_ids': top_item_ids[row][row_valid],
+            'scores': top_scores[row][row_valid],
+            'total_available': int(total_available[row]),
+            'seen_items_count': int(seen_counts[row])
+        }, include_scores)
+    
+    response = serialize_response({
+        'results': results,
+        'users_found': len(known_pos),
+        'users_not_found': len(user_ids) - len(known_pos)
+    }, mimetype)
+    response.vary.add('Accept')
+    return response
 
 @app.route('/recommend', methods=['GET', 'POST'])
 def recommend():
-    """Endpoint optimizado para obtener recomendaciones"""
+    """
+    Endpoint optimizado para obtener recomendaciones
+    
+    Formatos (Accept o ?format=): JSON, MessagePack (application/msgpack) o
+    binary (application/octet-stream): item_ids int64 seguidos de scores
+    float32, little-endian; X-Item-Count indica cuántos.
+    """
     try:
         # Obtener user_id
         if request.method == 'GET':
-            user_id = request.args.get('user_id', type=int)
-            top_n = request.args.get('top_n', default=5, type=int)
+            user_id = request.args.get('user_id')
+            top_n = request.args.get('top_n', 5)
+            exclude = [i for i in request.args.get('exclude', '').split(',') if i.strip()]
+            include_scores = wants_scores()
         else:
-            data = request.get_json()
+            data = request.get_json(silent=True) or {}
             user_id = data.get('user_id')
             top_n = data.get('top_n', 5)
+            exclude = data.get('exclude') or []
+            include_scores = wants_scores(data)
         
         if user_id is None:
             return jsonify({'error': 'user_id es requerido'}), 400
+        user_id, top_n = parse_int(user_id), parse_int(top_n)
+        if user_id is None:
+            return jsonify({'error': 'user_id debe ser un entero'}), 400
+        if top_n is None:
+            return jsonify({'error': 'top_n debe ser un entero'}), 400
+        exclude = parse_ids(exclude)
+        if exclude is None:
+            return jsonify({'error': 'exclude debe ser una lista de ids de items enteros'}), 400
         
-        top_n = min(top_n, 20)  # Máximo 20 recomendaciones
+        mimetype = negotiate_format()
+        if mimetype is None:
+            return jsonify({'error': 'Formato no disponible'}), 406
+        
+        top_n = max(1, min(top_n, 20))  # Entre 1 y 20 recomendaciones
         
         # Cargar modelo (usa caché en memoria)
         model_info = load_model()
@@ -262,97 +2621,611 @@ def recommend():
                 'error': 'Modelo no entrenado. Ejecute /retrain primero.'
             }), 404
         
-        # Verificar usuario
-        if user_id not in model_info['user_to_idx']:
+        return retry_on_shard_conflict(lambda model_info: recommendation_response(
+            model_info, user_id, top_n, exclude, include_scores, mimetype
+        ))
+    
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': f'Shard no disponible: {str(e)}'}), 503
+    
+    except Exception as e:
+        import traceback
+        print(f"Error en /recommend: {traceback.format_exc()}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """
+    Recomendaciones para muchos usuarios en una sola llamada
+    
+    En formato binary la respuesta es: cantidad de items por usuario (int32,
+    -1 = no encontrado, en el orden de la petición), todos los item_ids
+    (int64) y, si se piden, todos los scores (float32), little-endian.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        user_ids = data.get('user_ids')
+        top_n = parse_int(data.get('top_n', 5))
+        exclude = data.get('exclude') or []
+        include_scores = wants_scores(data)
+        
+        if not isinstance(user_ids, list) or len(user_ids) == 0:
+            return jsonify({'error': 'user_ids (lista) es requerido'}), 400
+        user_ids = parse_ids(user_ids)
+        if user_ids is None:
+            return jsonify({'error': 'user_ids debe ser una lista de ids enteros'}), 400
+        if top_n is None:
+            return jsonify({'error': 'top_n debe ser un entero'}), 400
+        top_n = max(1, min(top_n, 20))  # Entre 1 y 20 recomendaciones
+        exclude = parse_ids(exclude)
+        if exclude is None:
+            return jsonify({'error': 'exclude debe ser una lista de ids de items enteros'}), 400
+        if len(user_ids) > MAX_BATCH_USERS:
+            return jsonify({
+                'error': f'Máximo {MAX_BATCH_USERS} usuarios por petición'
+            }), 400
+        
+        mimetype = negotiate_format()
+        if mimetype is None:
+            return jsonify({'error': 'Formato no disponible'}), 406
+        
+        model_info = load_model()
+        if model_info is None:
+            return jsonify({
+                'error': 'Modelo no entrenado. Ejecute /retrain primero.'
+            }), 404
+        
+        return retry_on_shard_conflict(lambda model_info: batch_recommendation_response(
+            model_info, user_ids, top_n, exclude, include_scores, mimetype
+        ))
+    
+    except requests.exceptions.RequestException as e:
+        return jsonify({'error': f'Shard no disponible: {str(e)}'}), 503
+    
+    except Exception as e:
+        import traceback
+        print(f"Error en /recommend/batch: {traceback.format_exc()}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/shard/rank', methods=['POST'])
+def shard_rank():
+    """
+    Top N de este shard para los usuarios que envía el router (requiere SHARD_INDEX)
+    
+    Recibe JSON con version, user_idx, factors (filas de W), top_n y
+    exclude_idx. Responde en binario little-endian: top_idx int64 (filas x
+    columnas), top_scores float32, total_available int64 y seen_counts int64;
+    X-Rows y X-Cols indican la forma.
+    """
+    if SHARD_INDEX is None:
+        return jsonify({'error': 'Este proceso no es un shard (SHARD_INDEX)'}), 404
+    try:
+        data = request.get_json() or {}
+        model_info = load_model()
+        if model_info is not None and data.get('version') != model_info.get('version'):
+            check_model_update()  # El router pudo ver la versión nueva antes
+            model_info = load_model()
+        if model_info is None:
+            return jsonify({'error': 'Modelo no entrenado. Ejecute /retrain primero.'}), 404
+        if data.get('version') != model_info.get('version'):
+            return jsonify({
+                'error': f"Versión del modelo distinta: shard {model_info.get('version')}, "
+                         f"router {data.get('version')}"
+            }), 409
+        
+        top_idx, top_scores, total_available, seen_counts = rank_shard(
+            shard_view(model_info), data['factors'], data['user_idx'],
+            max(1, min(int(data.get('top_n', 5)), 20)), data.get('exclude_idx') or None
+        )
+        response = app.response_class(pack_arrays(
+            top_idx.astype('<i8'), top_scores.astype('<f4'),
+            total_available.astype('<i8'), seen_counts.astype('<i8')
+        ), mimetype='application/octet-stream')
+        response.headers['X-Rows'] = str(top_idx.shape[0])
+        response.headers['X-Cols'] = str(top_idx.shape[1])
+        return response
+    
+    except Exception as e:
+        import traceback
+        print(f"Error en /shard/rank: {traceback.format_exc()}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/similar', methods=['GET'])
+def similar():
+    """Items similares a uno dado (coseno entre embeddings de H)"""
+    try:
+        item_id = request.args.get('item_id', type=int)
+        top_n = max(1, min(request.args.get('top_n', default=5, type=int), 50))  # Entre 1 y 50
+        mode = request.args.get('mode', 'auto')
+        
+        if item_id is None:
+            return jsonify({'error': 'item_id es requerido'}), 400
+        if mode not in ('auto', 'exact', 'approx'):
+            return jsonify({'error': 'mode debe ser auto, exact o approx'}), 400
+        
+        model_info = load_model()
+        if model_info is None:
             return jsonify({
-                'error': f'Usuario {user_id} no encontrado en el modelo',
-                'available_users': model_info['user_ids'][:10]  # Primeros 10
+                'error': 'Modelo no entrenado. Ejecute /retrain primero.'
             }), 404
         
-        # Obtener índice del usuario
-        user_idx = model_info['user_to_idx'][user_id]
+        item_idx = known_item_indices(model_info['item_ids'], [item_id])
+        if len(item_idx) == 0:
+            return jsonify({'error': f'Item {item_id} no encontrado en el modelo'}), 404
+        item_idx = int(item_idx[0])
+        
+        # 304 solo para items del modelo; uno desconocido recibe su 404. Los
+        # fold-in no cambian H: el ETag es la versión base
+        version = base_version(model_info)
+        if version and request.if_none_match.contains(version):
+            response = app.response_class(status=304)
+            response.set_etag(version)
+            return response
+        
+        if mode == 'auto':
+            n_items = len(model_info['item_ids'])
+            mode = 'approx' if n_items >= SIMILAR_APPROX_MIN_ITEMS else 'exact'
+        if mode == 'approx':
+            top_idx, top_scores = similar_items_approx(model_info, item_idx, top_n)
+        else:
+            top_idx, top_scores = similar_items_exact(model_info, item_idx, top_n)
+        
+        similar_ids = model_info['item_ids'][top_idx].tolist()
+        response = jsonify({
+            'item_id': item_id,
+            'item_ids': similar_ids,
+            'similarities': {str(i): s for i, s in zip(similar_ids, top_scores.tolist())},
+            'mode': mode
+        })
+        if version:
+            response.set_etag(version)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    except Exception as e:
+        import traceback
+        print(f"Error en /similar: {traceback.format_exc()}")
+        return jsonify({'error': str(e)}), 500
+
+def queue_fold_in(df):
+    """Deja las interacciones de /update_users en disco para el próximo publish_fold_ins"""
+    name = f'{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex}.json'
+    records = df[['user_id', 'item_id', 'rating']].to_dict('records')
+    write_json_atomic(os.path.join(FOLD_IN_PENDING_DIR, name), records)
+
+def pending_fold_in_files(directory=None, since_ns=0):
+    """
+    Archivos de fold-in pendientes (o de directory), del más antiguo al más
+    reciente; since_ns deja solo los encolados desde ese instante.
+    """
+    directory = directory or FOLD_IN_PENDING_DIR
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(os.path.join(directory, name) for name in names
+                  if name.endswith('.json') and fold_in_queued_ns(name) >= since_ns)
+
+def fold_in_queued_ns(path):
+    """Instante (time_ns) en que /update_users encoló el archivo de fold-in"""
+    return int(os.path.basename(path).split('-', 1)[0])
+
+def read_fold_in_files(files):
+    """Interacciones de los archivos de fold-in; por usuario vale el archivo más reciente"""
+    frames = []
+    for seq, path in enumerate(files):
+        with open(path) as f:
+            frames.append(pd.DataFrame(json.load(f)).assign(seq=seq))
+    df = pd.concat(frames, ignore_index=True)
+    return df[df['seq'] == df.groupby('user_id')['seq'].transform('max')].drop(columns='seq')
+
+def prune_fold_in_journal(before_ns):
+    """Borra los fold-in publicados encolados antes de before_ns"""
+    for path in pending_fold_in_files(FOLD_IN_PUBLISHED_DIR):
+        if fold_in_queued_ns(path) < before_ns:
+            os.remove(path)
+
+def replay_fold_ins(model, since_ns):
+    """
+    Vuelve a aplicar sobre un modelo recién entrenado los fold-in publicados
+    desde since_ns (encolados después de que se leyeron sus datos).
+    """
+    files = pending_fold_in_files(FOLD_IN_PUBLISHED_DIR, since_ns)
+    if not files:
+        return model
+    df = read_fold_in_files(files)
+    model, _ = fold_in_users(model, df)
+    print(f"↻ Fold-in reaplicado: {df['user_id'].nunique()} usuarios de {len(files)} peticiones")
+    return model
+
+def lock_publish(blocking):
+    """
+    Toma el bloqueo de publicación de versiones entre procesos.
+    
+    Returns:
+        (adquirido, archivo): archivo es None si no hay fcntl (un solo proceso)
+    """
+    if fcntl is None:
+        return True, None
+    lock_file = open(PUBLISH_LOCK_PATH, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False, None
+    return True, lock_file
+
+def publish_fold_ins(force=False):
+    """
+    Publica en una sola versión nueva los fold-in pendientes de todos los workers.
+    
+    Sin force solo publica cuando el pendiente más antiguo lleva
+    FOLD_IN_PUBLISH_INTERVAL segundos, y si otro proceso está publicando no
+    espera. Cada petición trae el historial completo de sus usuarios: si un
+    usuario aparece en varias, vale la más reciente.
+    
+    Returns:
+        resumen del fold-in, o None si no se publicó nada
+    """
+    files = pending_fold_in_files()
+    if not files or (not force and time.time() - os.path.getmtime(files[0]) < FOLD_IN_PUBLISH_INTERVAL):
+        return None
+    
+    acquired, lock_file = lock_publish(blocking=force)
+    if not acquired:
+        return None
+    try:
+        # Otro proceso pudo publicarlos mientras se esperaba el bloqueo, o
+        # publicar un reentrenamiento: el fold-in debe partir de esa versión
+        files = pending_fold_in_files()
+        check_model_update()
+        if not files or load_model() is None:
+            return None
+        
+        start = time.perf_counter()
+        df = read_fold_in_files(files)
         
-        # Usar predicciones pre-calculadas (MUCHO más rápido)
-        user_predictions = model_info['predictions'][user_idx]
+        with _model_lock:
+            new_model, summary = fold_in_users(load_model(), df)
+            fold_in_ms = (time.perf_counter() - start) * 1000
+            save_model(new_model)
+        # Quedan en el diario por si un reentrenamiento en curso leyó sus datos antes
+        for path in files:
+            os.replace(path, os.path.join(FOLD_IN_PUBLISHED_DIR, os.path.basename(path)))
+        prune_fold_in_journal(time.time_ns() - int(FOLD_IN_JOURNAL_SECONDS * 1e9))
+        
+        print(f"✓ Fold-in publicado: {df['user_id'].nunique()} usuarios de {len(files)} peticiones")
+        return {
+            **summary,
+            'requests': len(files),
+            'fold_in_ms': round(fold_in_ms, 2),
+            'publish_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
+    finally:
+        if lock_file is not None:
+            lock_file.close()  # Libera el flock
+
+@app.route('/update_users', methods=['POST'])
+def update_users():
+    """
+    Actualiza usuarios nuevos o modificados sin reentrenar (fold-in sobre H).
+    
+    Las interacciones quedan pendientes y se publican junto con las de otras
+    llamadas (publish_fold_ins); con "publish": true se publican ya.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        interactions = data.get('interactions')
         
-        # Obtener items ya vistos desde caché
-        seen_items = model_info['user_seen_items'].get(user_id, set())
+        if not isinstance(interactions, list) or len(interactions) == 0:
+            return jsonify({'error': 'interactions (lista) es requerido'}), 400
         
-        # Crear lista de predicciones (solo items no vistos)
-        predictions = []
-        for item_idx, item_id in model_info['idx_to_item'].items():
-            if item_id not in seen_items:
-                predictions.append((int(item_id), float(user_predictions[item_idx])))
+        df = pd.DataFrame(interactions)
+        required_columns = ['user_id', 'item_id', 'rating']
+        if not all(col in df.columns for col in required_columns):
+            return jsonify({'error': f'Faltan columnas requeridas: {required_columns}'}), 400
+        if df['user_id'].nunique() > MAX_FOLD_IN_USERS:
+            return jsonify({
+                'error': f'Máximo {MAX_FOLD_IN_USERS} usuarios por petición'
+            }), 400
         
-        if len(predictions) == 0:
+        start = time.perf_counter()
+        if load_model() is None:
             return jsonify({
-                'message': 'No hay items nuevos para recomendar',
-                'user_id': int(user_id),
-                'item_ids': [],
-                'seen_items_count': len(seen_items)
-            })
+                'error': 'Modelo no entrenado. Ejecute /retrain primero.'
+            }), 404
+        queue_fold_in(df)
         
-        # Ordenar y tomar top N
-        predictions.sort(key=lambda x: x[1], reverse=True)
-        top_items = predictions[:top_n]
+        if not data.get('publish'):
+            return jsonify({
+                'queued_users': int(df['user_id'].nunique()),
+                'pending_requests': len(pending_fold_in_files()),
+                'publish_interval_seconds': FOLD_IN_PUBLISH_INTERVAL
+            }), 202
         
+        # Publicación inmediata; si otro worker ya las publicó, summary es None
+        summary = publish_fold_ins(force=True) or {}
         return jsonify({
-            'user_id': int(user_id),
-            'item_ids': [item_id for item_id, _ in top_items],
-            'predictions': {str(item_id): rating for item_id, rating in top_items},
-            'total_available': len(predictions),
-            'seen_items_count': len(seen_items)
+            **summary,
+            'total_ms': round((time.perf_counter() - start) * 1000, 2),
+            'model_metadata': load_model()['metadata']
         })
     
     except Exception as e:
         import traceback
-        print(f"Error en /recommend: {traceback.format_exc()}")
+        print(f"Error en /update_users: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
+def write_json_atomic(path, data):
+    """Escribe un JSON en un temporal y lo renombra sobre `path`"""
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def persist_job(job):
+    """Publica el estado del trabajo para que cualquier worker pueda consultarlo"""
+    write_json_atomic(os.path.join(RETRAIN_JOBS_DIR, f"{job['job_id']}.json"), job)
+
+def read_job(job_id):
+    """Estado de un trabajo: memoria de este proceso o archivo de otro worker"""
+    job = _retrain_jobs.get(job_id)
+    if job is not None:
+        # Copia en una sola operación: el hilo de entrenamiento sigue modificando el job
+        return dict(job)
+    if not all(c in '0123456789abcdef' for c in job_id):
+        return None
+    try:
+        with open(os.path.join(RETRAIN_JOBS_DIR, f'{job_id}.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def try_lock_retrain():
+    """
+    Intenta tomar el bloqueo de reentrenamiento entre procesos.
+    
+    Returns:
+        (adquirido, archivo): archivo es None si no hay fcntl (un solo proceso)
+    """
+    if fcntl is None:
+        return True, None
+    lock_file = open(RETRAIN_LOCK_PATH, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False, None
+    return True, lock_file
+
+def prune_job_files():
+    """Conserva solo los MAX_RETRAIN_JOBS_KEPT archivos de trabajos más recientes"""
+    paths = [os.path.join(RETRAIN_JOBS_DIR, name)
+             for name in os.listdir(RETRAIN_JOBS_DIR) if name.endswith('.json')]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - MAX_RETRAIN_JOBS_KEPT)]:
+        os.remove(path)
+
+def run_retrain_job(job, lock_file, max_components, max_iter, full_sync, alpha=0.02,
+                    warm_start=False, source_path=None, out_of_core=False):
+    """Ejecuta un reentrenamiento completo registrando fase y tiempos en el job"""
+    global _active_retrain_job
+    
+    def phase(name):
+        job['phase'] = name
+        job['phase_started'] = time.time()
+        persist_job(job)
+    
+    def end_phase():
+        job['timings'][job['phase']] = round(time.time() - job['phase_started'], 3)
+    
+    try:
+        job['status'] = 'running'
+        job['started_at'] = datetime.now().isoformat()
+        print(f"[{datetime.now()}] Iniciando reentrenamiento {job['job_id']}...")
+        
+        # Exportación en disco o, si no, sincronizar el almacén local (solo el delta).
+        # Los fold-in encolados desde data_since pueden no estar en estos datos
+        phase('fetch')
+        data_since = os.stat(source_path).st_mtime_ns if source_path is not None else time.time_ns()
+        if source_path is not None and out_of_core:
+            interactions_data = None  # Se lee por bloques al entrenar
+        elif source_path is not None:
+            interactions_data = read_interactions_file(source_path)
+        else:
+            interactions_data = sync_interactions(full=full_sync)
+        end_phase()
+        
+        if interactions_data is not None:
+            if len(interactions_data) == 0:
+                raise ValueError('No hay datos disponibles. Verifique que Laravel esté '
+                                 'corriendo y tenga interacciones')
+            # Separar el parseo (JSON a columnas) del tiempo de red
+            parse_seconds = interactions_data.attrs.get('parse_seconds', 0.0)
+            interactions_count = len(interactions_data)
+        else:
+            parse_seconds = 0.0
+        job['timings']['parse'] = round(parse_seconds, 3)
+        job['timings']['fetch'] = round(max(job['timings']['fetch'] - parse_seconds, 0.0), 3)
+        
+        phase('train')
+        if out_of_core:
+            # Desde la exportación, por bloques y sin copia en memoria
+            del interactions_data
+            model = train_model_out_of_core(
+                source_path,
+                max_components=max_components,
+                max_iter=max_iter,
+                alpha=alpha
+            )
+        else:
+            model = train_model(
+                interactions_data,
+                max_components=max_components,
+                max_iter=max_iter,
+                alpha=alpha,
+                previous_model=_model_cache if warm_start else None
+            )
+            del interactions_data
+        end_phase()
+        model['metadata']['timings'].update(
+            fetch=job['timings']['fetch'], parse=job['timings']['parse']
+        )
+        
+        # Top K de los usuarios más activos, ya sin vistos: fuera de train_model
+        # para que evaluate.py y los benchmarks midan solo el entrenamiento
+        phase('top_k_table')
+        model.update(materialize_top_k(model))
+        end_phase()
+        model['metadata']['timings']['top_k_table'] = job['timings']['top_k_table']
+        
+        # Una sola vez por entrenamiento: los fold-in cuantizan solo sus filas
+        if MODEL_QUANTIZATION:
+            phase('quantize')
+            model = quantize_model(model, MODEL_QUANTIZATION)
+            end_phase()
+        
+        # Directorio temporal + rename y cambio atómico del modelo en memoria;
+        # los demás workers lo detectan con su vigilante
+        phase('save')
+        _, publish_lock = lock_publish(blocking=True)
+        try:
+            saved = save_model(replay_fold_ins(model, data_since))
+            prune_fold_in_journal(data_since)
+        finally:
+            if publish_lock is not None:
+                publish_lock.close()  # Libera el flock
+        end_phase()
+        if out_of_core:
+            # El checkpoint solo sirve para reanudar un entrenamiento que falló
+            del model['W'], model['seen_indices']
+            shutil.rmtree(TRAINING_DIR, ignore_errors=True)
+        
+        # Sub-fases del entrenamiento y la serialización, medidas dentro de cada paso
+        job['timings'].update({
+            phase_name: round(seconds, 3)
+            for phase_name, seconds in saved['metadata']['timings'].items()
+            if phase_name not in ('fetch', 'parse')
+        })
+        job['status'] = 'completed'
+        job['result'] = {
+            'interactions_count': model['metadata']['nnz'] if out_of_core else interactions_count,
+            'model_metadata': model['metadata']
+        }
+        print(f"[{datetime.now()}] ✓ Reentrenamiento {job['job_id']} completado")
+    
+    except Exception as e:
+        import traceback
+        print(f"Error en reentrenamiento {job['job_id']}: {traceback.format_exc()}")
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    
+    finally:
+        job['phase'] = None
+        job.pop('phase_started', None)
+        job['finished_at'] = datetime.now().isoformat()
+        persist_job(job)
+        with _retrain_jobs_lock:
+            _active_retrain_job = None
+            if lock_file is not None:
+                lock_file.close()  # Libera el flock
+        prune_job_files()
+
 @app.route('/retrain', methods=['POST'])
 def retrain():
-    """Endpoint optimizado para reentrenar el modelo"""
+    """Inicia un reentrenamiento en segundo plano y devuelve su job_id"""
+    global _active_retrain_job
+    
     try:
-        print(f"[{datetime.now()}] Iniciando reentrenamiento...")
-        
         # Parámetros opcionales
-        data = request.get_json() or {}
-        max_components = data.get('max_components', 10)
-        max_iter = data.get('max_iter', 30)
-        
-        # Obtener datos con límites
-        print("Obteniendo datos desde Laravel...")
-        interactions_data = fetch_interactions_from_laravel(
-            batch_size=1000,
-            max_batches=5  # Máximo 5000 interacciones
-        )
+        data = request.get_json(silent=True) or {}
+        max_components = parse_int(data.get('max_components', 10))
+        max_iter = parse_int(data.get('max_iter', 30))
+        # Se valida antes de encolar: el trabajo corre en segundo plano
+        if max_components is None or max_components < 1:
+            return jsonify({'error': 'max_components debe ser un entero positivo'}), 400
+        if max_iter is None or max_iter < 1:
+            return jsonify({'error': 'max_iter debe ser un entero positivo'}), 400
+        alpha = float(data.get('alpha', 0.02))
+        warm_start = bool(data.get('warm_start', RETRAIN_WARM_START))
         
-        if not interactions_data:
+        # Fuente: API de Laravel (por defecto) o exportación en EXPORTS_DIR
+        source = data.get('source', 'api')
+        source_path = None
+        if source == 'file':
+            file_name = data.get('file')
+            if file_name:
+                # Solo nombres dentro de EXPORTS_DIR
+                source_path = os.path.join(EXPORTS_DIR, os.path.basename(file_name))
+            else:
+                source_path = latest_export_file()
+            if source_path is None or not os.path.isfile(source_path):
+                return jsonify({
+                    'error': f'No hay exportación de interacciones en {EXPORTS_DIR}'
+                }), 404
+        elif source != 'api':
+            return jsonify({'error': 'source debe ser api o file'}), 400
+        full_sync = bool(data.get('full_sync', False))
+        # Entrenamiento por bloques desde disco (sin arranque en caliente)
+        out_of_core = bool(data.get('out_of_core', False))
+        warm_start = warm_start and not out_of_core
+        if out_of_core and source_path is None:
+            # sync_interactions fusiona el delta con el almacén completo en memoria
             return jsonify({
-                'error': 'No hay datos disponibles',
-                'message': 'Verifique que Laravel esté corriendo y tenga interacciones'
+                'error': 'out_of_core requiere source=file (exportación en disco)'
             }), 400
         
-        print(f"Entrenando con {len(interactions_data)} interacciones...")
+        with _retrain_jobs_lock:
+            # Single-flight en este proceso y, con flock, entre workers
+            acquired, lock_file = (False, None) if _active_retrain_job else try_lock_retrain()
+            if not acquired:
+                active_id = _active_retrain_job
+                if active_id is None and os.path.exists(RETRAIN_ACTIVE_PATH):
+                    with open(RETRAIN_ACTIVE_PATH) as f:
+                        active_id = json.load(f)
+                active = read_job(active_id) if active_id else None
+                return jsonify({
+                    'message': 'Ya hay un reentrenamiento en curso',
+                    'job_id': active_id,
+                    'status': active['status'] if active else 'running',
+                    'status_url': f"/retrain/{active_id}"
+                }), 409
+            
+            job = {
+                'job_id': uuid.uuid4().hex,
+                'status': 'queued',
+                'phase': None,
+                'timings': {},
+                'params': {
+                    'max_components': max_components,
+                    'max_iter': max_iter,
+                    'alpha': alpha,
+                    'warm_start': warm_start,
+                    'full_sync': full_sync,
+                    'out_of_core': out_of_core,
+                    'source': source,
+                    'file': os.path.basename(source_path) if source_path else None
+                },
+                'created_at': datetime.now().isoformat()
+            }
+            _retrain_jobs[job['job_id']] = job
+            while len(_retrain_jobs) > MAX_RETRAIN_JOBS_KEPT:
+                _retrain_jobs.popitem(last=False)
+            _active_retrain_job = job['job_id']
+            persist_job(job)
+            write_json_atomic(RETRAIN_ACTIVE_PATH, job['job_id'])
         
-        # Entrenar modelo optimizado
-        model = train_model(
-            interactions_data,
-            max_components=max_components,
-            max_iter=max_iter
+        _retrain_executor.submit(
+            run_retrain_job, job, lock_file, max_components, max_iter, full_sync, alpha,
+            warm_start, source_path, out_of_core
         )
         
-        # Guardar modelo
-        save_model(model)
-        
-        print(f"[{datetime.now()}] ✓ Reentrenamiento completado")
-        
         return jsonify({
-            'message': 'Modelo reentrenado exitosamente',
-            'interactions_count': len(interactions_data),
-            'model_metadata': model['metadata'],
-            'timestamp': datetime.now().isoformat()
-        })
+            'message': 'Reentrenamiento iniciado en segundo plano',
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'status_url': f"/retrain/{job['job_id']}"
+        }), 202
     
     except Exception as e:
         import traceback
@@ -363,35 +3236,123 @@ def retrain():
             'details': str(e)
         }), 500
 
+@app.route('/retrain/<job_id>', methods=['GET'])
+def retrain_status(job_id):
+    """Estado, fase actual y tiempos por fase de un reentrenamiento"""
+    status = read_job(job_id)
+    if status is None:
+        return jsonify({'error': f'Trabajo {job_id} no encontrado'}), 404
+    
+    phase_started = status.pop('phase_started', None)
+    if status.get('phase') and phase_started is not None:
+        status['phase_elapsed'] = round(time.time() - phase_started, 3)
+    return jsonify(status)
+
+def model_status(model_info):
+    """Resumen del modelo cargado; no toca el disco"""
+    return {
+        'version': model_info.get('version'),
+        'loaded_at': datetime.fromtimestamp(_model_loaded_at).isoformat() if _model_loaded_at else None,
+        'metadata': model_info.get('metadata', {})
+    }
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Latencia por endpoint (la regla de la ruta, no la URL) y errores"""
+    start = g.get('request_start')
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe((endpoint, request.method), time.perf_counter() - start)
+        if response.status_code >= 400:
+            REQUEST_ERRORS.inc((endpoint, str(response.status_code)))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Métricas en formato de texto Prometheus (solo memoria, sin disco).
+    
+    Con varios workers cada proceso expone sus propios contadores; los
+    datos del modelo y del último entrenamiento son iguales en todos.
+    """
+    lines = REQUEST_LATENCY.render() + REQUEST_ERRORS.render() + MODEL_LOAD_DURATION.render()
+    if _recommend_batcher is not None:
+        lines += MICROBATCH_SIZE.render() + MICROBATCH_TIMEOUTS.render()
+    lines += TOPK_TABLE_LOOKUPS.render()
+    
+    cache = _response_cache.stats()
+    lines += metric_line('recommender_response_cache_hits_total', cache['hits'],
+                         kind='counter', documentation='Aciertos de la caché de respuestas')
+    lines += metric_line('recommender_response_cache_misses_total', cache['misses'],
+                         kind='counter', documentation='Fallos de la caché de respuestas')
+    lines += metric_line('recommender_response_cache_entries', cache['size'],
+                         documentation='Respuestas en caché')
+    
+    model_info = _model_cache
+    lines += metric_line('recommender_model_loaded', int(model_info is not None),
+                         documentation='1 si hay un modelo cargado')
+    if model_info is not None:
+        model_bytes = sum(
+            model_info[name].nbytes for name in MODEL_ARRAYS if model_info.get(name) is not None
+        )
+        lines += metric_line('recommender_model_info', 1, ('version',), (model_info.get('version'),),
+                             documentation='Versión del modelo cargado')
+        lines += metric_line('recommender_model_users', len(model_info['user_ids']),
+                             documentation='Usuarios en el modelo')
+        lines += metric_line('recommender_model_items', len(model_info['item_ids']),
+                             documentation='Items en el modelo')
+        lines += metric_line('recommender_model_bytes', model_bytes,
+                             documentation='Tamaño de los arrays del modelo')
+        
+        # Fases del entrenamiento que produjo el modelo (guardadas en su manifiesto)
+        timings = model_info.get('metadata', {}).get('timings', {})
+        lines += ['# HELP recommender_training_phase_seconds Duración por fase del último entrenamiento',
+                  '# TYPE recommender_training_phase_seconds gauge']
+        for phase_name, seconds in sorted(timings.items()):
+            lines.append(f'recommender_training_phase_seconds{format_labels(("phase",), (phase_name,))} {seconds}')
+    
+    return app.response_class('\n'.join(lines) + '\n',
+                              mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/health', methods=['GET'])
 def health():
-    """Endpoint de salud con información del modelo"""
-    model_exists = os.path.exists(MODEL_PATH)
-    model_info = load_model() if model_exists else None
+    """Endpoint de salud con información del modelo (solo memoria, sin disco)"""
+    model_info = _model_cache
     
     health_data = {
         'status': 'healthy',
-        'model_loaded': model_exists,
+        'model_loaded': model_info is not None,
         'timestamp': datetime.now().isoformat()
     }
     
-    if model_info and 'metadata' in model_info:
-        health_data['model_metadata'] = model_info['metadata']
+    if model_info is not None:
+        status = model_status(model_info)
+        health_data['model_version'] = status['version']
+        health_data['model_metadata'] = status['metadata']
+    if SHARD_INDEX is not None:
+        health_data['shard'] = {'index': SHARD_INDEX, 'count': SHARD_COUNT}
+    if SHARD_URLS:
+        health_data['shards'] = SHARD_URLS
     
     return jsonify(health_data)
 
 @app.route('/stats', methods=['GET'])
 def stats():
-    """Endpoint para ver estadísticas del modelo"""
-    model_info = load_model()
-    if not model_info:
+    """Endpoint para ver estadísticas del modelo (solo memoria, sin disco)"""
+    model_info = _model_cache
+    if model_info is None:
         return jsonify({'error': 'Modelo no cargado'}), 404
     
     return jsonify({
         'users': len(model_info['user_ids']),
         'items': len(model_info['item_ids']),
-        'metadata': model_info.get('metadata', {}),
-        'cache_status': 'active' if _model_cache else 'inactive'
+        **model_status(model_info),
+        'cache_status': 'active',
+        'response_cache': _response_cache.stats()
     })
 
 @app.route('/', methods=['GET'])
@@ -401,26 +3362,44 @@ def index():
         'service': 'ML Recommendation Service (Optimizado)',
         'version': '2.0.0',
         'endpoints': {
-            '/recommend': 'GET/POST - Obtener recomendaciones (user_id, top_n)',
-            '/retrain': 'POST - Reentrenar modelo (max_components, max_iter)',
+            '/recommend': 'GET/POST - Obtener recomendaciones (user_id, top_n, exclude)',
+            '/recommend/batch': 'POST - Recomendaciones por lote (user_ids, top_n, exclude)',
+            '/similar': 'GET - Items similares (item_id, top_n, mode=auto|exact|approx)',
+            '/shard/rank': 'POST - Top N de un shard de items (uso interno del router)',
+            '/update_users': 'POST - Fold-in de usuarios nuevos/actualizados (interactions)',
+            '/retrain': 'POST - Reentrenar modelo en segundo plano (max_components, max_iter, alpha, warm_start, full_sync, source, file, out_of_core)',
+            '/retrain/<job_id>': 'GET - Estado y tiempos de un reentrenamiento',
+            '/metrics': 'GET - Métricas en formato Prometheus',
             '/health': 'GET - Estado del servicio',
             '/stats': 'GET - Estadísticas del modelo'
         },
         'optimizations': [
-            'Caché de predicciones pre-calculadas',
-            'Caché de modelo en memoria',
-            'Items vistos cacheados',
+            'Predicciones pre-calculadas o al vuelo según tamaño (PREDICTIONS_MAX_CELLS)',
+            'Modelo versionado mapeado en memoria (np.load mmap_mode)',
+            'Recarga por detección de versión nueva (sin TTL)',
+            'Caché LRU de respuestas por versión + ETag (304)',
+            'Items vistos como índice CSR (filtrado vectorizado)',
+            'Índice de items similares: embeddings normalizados + listas IVF',
+            'Micro-batching opcional de /recommend (MICROBATCH_ENABLED)',
+            'Serving particionado por items con router scatter-gather (SHARD_URLS)',
+            'Tabla top K por usuario materializada al entrenar (TOPK_TABLE_K)',
+            'Respuestas en JSON (orjson), MessagePack o binary; scores opcionales',
             'Componentes reducidos (10)',
             'Iteraciones reducidas (30)',
-            'Límite de 5000 interacciones'
+            'Matriz dispersa CSR (sin límite de interacciones)'
         ]
     })
 
 if __name__ == '__main__':
-    if not os.path.exists(MODEL_PATH):
+    if current_model_path() is None:
+        if os.path.exists(LEGACY_MODEL_PATH):
+            print("⚠ Modelo en formato pickle anterior. Ejecute /retrain para regenerarlo.")
         print("⚠ No hay modelo. Ejecute POST /retrain para crear uno.")
     else:
         print("✓ Modelo encontrado. Listo para recomendar.")
     
+    # Carga inicial y vigilante de versiones nuevas fuera del camino de las peticiones
+    start_model_watcher()
+    
     # Producción optimizada
     app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
\ No newline at end of file
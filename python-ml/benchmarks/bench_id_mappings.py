@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Memoria y tiempo de construcción de los mapeos de ids y el índice de items
+vistos: estructuras anteriores (4 dicts, listas de ids y un set por usuario
+construido filtrando el DataFrame por usuario) contra arrays NumPy
+ordenados + índice CSR construidos en una pasada.
+
+Uso:
+    python benchmarks/bench_id_mappings.py [--sizes 10k,100k,1m] [--legacy-users 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import app  # noqa: E402
+from run import parse_size  # noqa: E402
+from synthetic import generate_interactions  # noqa: E402
+
+def deep_size(obj):
+    """Bytes de un contenedor de Python con todo su contenido"""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+    return total
+
+def build_legacy(df, max_users):
+    """
+    Construcción original de train_model. El bucle de vistos es cuadrático:
+    se mide con los primeros `max_users` usuarios y se extrapola.
+    """
+    start = time.perf_counter()
+    user_ids = np.unique(df['user_id'].to_numpy())
+    item_ids = np.unique(df['item_id'].to_numpy())
+    user_to_idx = {user_id: idx for idx, user_id in enumerate(user_ids)}
+    item_to_idx = {item_id: idx for idx, item_id in enumerate(item_ids)}
+    idx_to_user = {idx: user_id for user_id, idx in user_to_idx.items()}
+    idx_to_item = {idx: item_id for item_id, idx in item_to_idx.items()}
+    mappings = {
+        'user_to_idx': user_to_idx, 'item_to_idx': item_to_idx,
+        'idx_to_user': idx_to_user, 'idx_to_item': idx_to_item,
+        'user_ids': [int(uid) for uid in user_ids],
+        'item_ids': [int(iid) for iid in item_ids],
+    }
+    mapping_seconds = time.perf_counter() - start
+
+    sample = user_ids[:max_users]
+    start = time.perf_counter()
+    user_seen_items = {}
+    for user_id in sample:
+        user_items = df[df['user_id'] == user_id]['item_id'].tolist()
+        user_seen_items[int(user_id)] = set(int(i) for i in user_items)
+    seen_seconds = (time.perf_counter() - start) * len(user_ids) / len(sample)
+
+    # Memoria de los sets: se mide la muestra y se escala al total de usuarios
+    seen_bytes = deep_size(user_seen_items) * len(user_ids) / len(sample)
+    return {
+        'build_seconds': mapping_seconds + seen_seconds,
+        'bytes': deep_size(mappings) + seen_bytes,
+        'estimated': len(sample) < len(user_ids),
+    }, mappings
+
+def build_arrays(df):
+    start = time.perf_counter()
+    R, user_ids, item_ids = app.build_interaction_matrix(df)
+    arrays = {
+        'user_ids': user_ids.astype(np.int64),
+        'user_order': np.arange(len(user_ids), dtype=np.int64),
+        'item_ids': item_ids.astype(np.int64),
+        'seen_indptr': R.indptr.astype(np.int64),
+        'seen_indices': R.indices.astype(np.int32),
+    }
+    seconds = time.perf_counter() - start
+    return {
+        'build_seconds': seconds,
+        'bytes': sum(array.nbytes for array in arrays.values()),
+    }, arrays
+
+def lookup_latency(legacy, arrays, rng, n=1000, batch=1000):
+    """Microsegundos por búsqueda de usuario: individual y por lote"""
+    user_ids = arrays['user_ids']
+    queries = rng.choice(user_ids, n)
+
+    start = time.perf_counter()
+    for user_id in queries:
+        legacy['user_to_idx'][user_id]
+    dict_single = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    for user_id in queries:
+        app.user_indices(arrays, [user_id])
+    array_single = (time.perf_counter() - start) / n
+
+    queries = rng.choice(user_ids, batch)
+    start = time.perf_counter()
+    [legacy['user_to_idx'][user_id] for user_id in queries]
+    dict_batch = (time.perf_counter() - start) / batch
+
+    start = time.perf_counter()
+    app.user_indices(arrays, queries)
+    array_batch = (time.perf_counter() - start) / batch
+    return dict_single * 1e6, array_single * 1e6, dict_batch * 1e6, array_batch * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10k,100k,1m')
+    parser.add_argument('--legacy-users', type=int, default=2000,
+                        help='Usuarios medidos en el bucle cuadrático anterior (el resto se extrapola)')
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+
+    print(f"{'interacciones':>14}{'usuarios':>10}{'antes MB':>10}{'ahora MB':>10}"
+          f"{'antes s':>10}{'ahora s':>10}")
+    latencies = None
+    for size in args.sizes.split(','):
+        df = generate_interactions(parse_size(size))
+        legacy, mappings = build_legacy(df, args.legacy_users)
+        current, arrays = build_arrays(df)
+        mark = '*' if legacy['estimated'] else ' '
+        print(f"{len(df):>14}{len(arrays['user_ids']):>10}"
+              f"{legacy['bytes'] / 1e6:>10.1f}{current['bytes'] / 1e6:>10.1f}"
+              f"{legacy['build_seconds']:>9.2f}{mark}{current['build_seconds']:>10.3f}")
+        latencies = lookup_latency(mappings, arrays, rng)
+
+    print("* extrapolado desde los primeros --legacy-users usuarios")
+    print("\nBúsqueda de usuario (último tamaño), µs por id:")
+    print(f"  individual: dict {latencies[0]:.2f}, searchsorted {latencies[1]:.2f}")
+    print(f"  lote:       dict {latencies[2]:.2f}, searchsorted {latencies[3]:.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Throughput de ingestión: páginas JSON de export-json (json.loads + columnas,
+sin contar la red) contra la exportación CSV leída desde disco con tipos
+compactos y, si pyarrow está instalado, su conversión a Parquet.
+
+Uso:
+    python benchmarks/bench_ingestion.py [--interactions 2000000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import app  # noqa: E402
+from synthetic import export_pages, generate_interactions  # noqa: E402
+
+def write_laravel_csv(df, path):
+    """Mismo formato que `php artisan interactions:export`"""
+    created_at = app.pd.to_datetime(df['updated_at'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
+    df[['user_id', 'item_id', 'rating']].assign(
+        interaction_type='rating', created_at=created_at
+    ).to_csv(path, index=False)
+
+def bench_json(df, page_size):
+    pages = list(export_pages(df, page_size))
+    columns = app.InteractionColumns(capacity=page_size)
+    start = time.perf_counter()
+    for page in pages:
+        columns.append_rows(json.loads(page))
+    seconds = time.perf_counter() - start
+    frame = columns.to_frame()
+    return seconds, sum(len(page) for page in pages), frame.memory_usage(index=False).sum()
+
+def bench_file(path):
+    start = time.perf_counter()
+    frame = app.read_interactions_file(path)
+    seconds = time.perf_counter() - start
+    return seconds, os.path.getsize(path), frame.memory_usage(index=False).sum()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interactions', type=int, default=2_000_000)
+    parser.add_argument('--page-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    df = generate_interactions(args.interactions)
+    workdir = tempfile.mkdtemp(prefix='ingestion-')
+    csv_path = os.path.join(workdir, 'interactions_bench.csv')
+    write_laravel_csv(df, csv_path)
+
+    results = [('JSON (export-json)', *bench_json(df, args.page_size))]
+    results.append(('CSV (disco)', *bench_file(csv_path)))
+    if app.pq is not None:
+        parquet_path = app.convert_export_to_parquet(csv_path)
+        results.append(('Parquet (disco)', *bench_file(parquet_path)))
+    else:
+        print("⚠ pyarrow no instalado: se omite Parquet")
+
+    n = len(df)
+    print(f"\n{n} interacciones")
+    print(f"{'fuente':<22}{'s':>8}{'filas/s':>12}{'MB entrada':>12}{'MB columnas':>13}")
+    for name, seconds, input_bytes, frame_bytes in results:
+        print(f"{name:<22}{seconds:>8.2f}{n / seconds:>12,.0f}"
+              f"{input_bytes / 1e6:>12.1f}{frame_bytes / 1e6:>13.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Micro-batching de /recommend sin HTTP: varios hilos llaman a
+build_recommendation a la vez (como los hilos de un worker gthread) con y
+sin MicroBatcher, para cada ventana indicada. Reporta throughput, p50/p99 y
+el tamaño medio de los lotes.
+
+Se fuerza el scoring al vuelo (sin matriz de predicciones) y alpha bajo, para
+que los scores no colapsen a un valor constante.
+
+Uso:
+    python benchmarks/bench_microbatch.py [--interactions 1000000] [--items 20000]
+    python benchmarks/bench_microbatch.py --threads 64 --windows 0.5,2,5
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from synthetic import generate_interactions  # noqa: E402
+
+def run(app, model, threads, duration, top_n):
+    """Cada hilo pide recomendaciones de usuarios al azar durante `duration` segundos"""
+    user_ids = model['user_ids']
+    latencies = [[] for _ in range(threads)]
+
+    def worker(seed):
+        rng = np.random.default_rng(seed)
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            user_id = int(user_ids[rng.integers(len(user_ids))])
+            start = time.perf_counter()
+            app.build_recommendation(model, user_id, top_n, [])
+            latencies[seed].append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    latencies = np.concatenate([np.array(values) for values in latencies]) * 1000
+    return len(latencies) / duration, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, help='Items del catálogo sintético')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--windows', default='0.5,2', help='Ventanas en ms a comparar')
+    parser.add_argument('--max-users', type=int, default=64)
+    parser.add_argument('--max-wait', type=float, default=20, help='Espera máxima en ms')
+    args = parser.parse_args()
+
+    os.environ['PREDICTIONS_MAX_CELLS'] = '0'
+    os.chdir(tempfile.mkdtemp(prefix='microbatch-'))
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        model = app.train_model(generate_interactions(args.interactions, n_items=args.items),
+                                alpha=0.0001)
+    n_users, n_items = len(model['user_ids']), len(model['item_ids'])
+    print(f"{n_users} usuarios, {n_items} items, {args.threads} hilos, {args.duration:.0f} s por prueba")
+    print(f"{'ventana ms':>10}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'lote medio':>12}")
+
+    for window in [None] + [float(value) for value in args.windows.split(',')]:
+        app._recommend_batcher = None if window is None else app.MicroBatcher(
+            window / 1000, args.max_users, args.max_wait / 1000
+        )
+        app.MICROBATCH_SIZE._series.clear()
+        rps, p50, p99 = run(app, model, args.threads, args.duration, args.top_n)
+        counts, total = app.MICROBATCH_SIZE._series.get((), ([0], 0.0))
+        mean_batch = f'{total / sum(counts):.1f}' if sum(counts) else '-'
+        print(f"{'sin lotes' if window is None else window:>10}{rps:>9.0f}{p50:>9.2f}{p99:>9.2f}"
+              f"{mean_batch:>12}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Compara la carga del modelo en el formato pickle anterior (dicts de mapeos y
+sets de vistos) contra el formato versionado mapeado en memoria: tiempo de
+carga y memoria residente (RSS) del proceso tras cargar y recomendar.
+
+Uso:
+    python benchmarks/bench_model_load.py [--users 200000] [--items 20000] [--seen 20]
+"""
+import argparse
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+# Se ejecuta en un proceso nuevo para medir RSS sin ruido del proceso padre
+CHILD = r'''
+import os, sys, time, pickle
+import numpy as np
+sys.path.insert(0, {app_dir!r})
+import app
+
+def rss_mib():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+before = rss_mib()
+start = time.perf_counter()
+if {fmt!r} == 'pickle':
+    with open({path!r}, 'rb') as f:
+        model = pickle.load(f)
+    load_s = time.perf_counter() - start
+    scores = model['W'][0] @ model['H']
+else:
+    model = app.open_model({path!r})
+    load_s = time.perf_counter() - start
+    app.rank_items(model, 0, 5)
+print(load_s, rss_mib() - before)
+'''
+
+def build_model(n_users, n_items, seen_per_user, rng):
+    W = rng.random((n_users, 10), dtype=np.float32)
+    H = rng.random((10, n_items), dtype=np.float32)
+    lengths = np.full(n_users, seen_per_user)
+    indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    indices = rng.integers(0, n_items, indptr[-1]).astype(np.int32)
+    user_ids = np.arange(1, n_users + 1, dtype=np.int64)
+    item_ids = np.arange(1, n_items + 1, dtype=np.int64)
+    return {
+        'W': W, 'H': H, 'predictions': None,
+        'user_ids': user_ids, 'user_order': np.arange(n_users, dtype=np.int64),
+        'item_ids': item_ids, 'seen_indptr': indptr, 'seen_indices': indices,
+        'metadata': {'n_users': n_users, 'n_items': n_items},
+    }
+
+def legacy_model(model):
+    """Mismo modelo con la estructura que se serializaba con pickle"""
+    user_ids = model['user_ids'].tolist()
+    item_ids = model['item_ids'].tolist()
+    indptr, indices = model['seen_indptr'], model['seen_indices']
+    return {
+        'W': model['W'], 'H': model['H'], 'predictions': None,
+        'user_to_idx': {u: i for i, u in enumerate(user_ids)},
+        'item_to_idx': {it: i for i, it in enumerate(item_ids)},
+        'idx_to_user': dict(enumerate(user_ids)),
+        'idx_to_item': dict(enumerate(item_ids)),
+        'user_ids': user_ids, 'item_ids': item_ids,
+        'user_seen_items': {
+            u: set((indices[indptr[i]:indptr[i + 1]] + 1).tolist())
+            for i, u in enumerate(user_ids)
+        },
+        'metadata': model['metadata'],
+    }
+
+def measure(fmt, path, runs=3):
+    code = CHILD.format(app_dir=os.path.join(HERE, '..'), fmt=fmt, path=path)
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                             text=True, check=True, cwd=tempfile.gettempdir())
+        results.append([float(v) for v in out.stdout.split()[-2:]])
+    return np.median(np.array(results), axis=0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--items', type=int, default=20_000)
+    parser.add_argument('--seen', type=int, default=20)
+    args = parser.parse_args()
+    
+    import app
+    
+    rng = np.random.default_rng(42)
+    model = build_model(args.users, args.items, args.seen, rng)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = os.path.join(tmp, 'model.pkl')
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(legacy_model(model), f, protocol=pickle.HIGHEST_PROTOCOL)
+        mmap_path = os.path.join(tmp, 'model-v1')
+        app.write_model_files(model, mmap_path, 'bench')
+        
+        mmap_size = sum(os.path.getsize(os.path.join(mmap_path, f)) for f in os.listdir(mmap_path))
+        print(f"{args.users} usuarios x {args.items} items, {args.seen} vistos por usuario")
+        print(f"{'formato':>8} | {'disco MiB':>9} | {'carga ms':>9} | {'RSS MiB':>8}")
+        for fmt, path, size in (('pickle', pickle_path, os.path.getsize(pickle_path)),
+                                ('mmap', mmap_path, mmap_size)):
+            load_s, rss = measure(fmt, path)
+            print(f"{fmt:>8} | {size / 2**20:>9.1f} | {load_s * 1e3:>9.1f} | {rss:>8.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Entrenamiento en memoria (read_interactions_file + train_model) contra
+fuera de memoria (train_model_out_of_core) sobre la misma exportación CSV.
+
+Cada corrida va en un proceso nuevo para medir su memoria pico. Reporta
+tiempo, memoria pico por encima de la base del proceso y error de
+reconstrucción; con --resume además corta el entrenamiento fuera de memoria
+a la mitad y verifica que la segunda llamada reanude desde el checkpoint.
+
+Uso:
+    python benchmarks/bench_out_of_core.py [--sizes 500k,2m] [--block-nnz 1000000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..'))
+
+def memory_mib(field):
+    """VmRSS / VmHWM del proceso (ru_maxrss hereda el pico del padre a través de exec)"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def train(mode, csv_path, args, max_iter=None):
+    """Entrena en un proceso del pool; devuelve segundos, MiB pico y métricas del modelo"""
+    import app
+
+    max_iter = max_iter or args.max_iter
+    baseline = memory_mib('VmRSS:')
+    start = time.perf_counter()
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        if mode == 'memoria':
+            model = app.train_model(app.read_interactions_file(csv_path), max_iter=max_iter,
+                                    alpha=args.alpha, tol=args.tol)
+        else:
+            model = app.train_model_out_of_core(
+                csv_path, max_iter=max_iter, alpha=args.alpha, tol=args.tol,
+                chunk_rows=args.chunk_rows, block_nnz=args.block_nnz,
+                checkpoint_dir=args.checkpoint_dir
+            )
+    seconds = time.perf_counter() - start
+    peak_mib = memory_mib('VmHWM:') - baseline
+    metadata = model['metadata']
+    return {
+        'seconds': seconds,
+        'peak_mib': peak_mib,
+        'n_iter': metadata['n_iter'],
+        'reconstruction_err': metadata['reconstruction_err'],
+        'resumed_from_epoch': metadata.get('resumed_from_epoch'),
+    }
+
+def run(mode, csv_path, args, max_iter=None):
+    # Un proceso nuevo por corrida para que la memoria pico sea la suya
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+        return pool.submit(train, mode, csv_path, args, max_iter).result()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='500k,2m')
+    parser.add_argument('--max-iter', type=int, default=30)
+    parser.add_argument('--alpha', type=float, default=0.0001)
+    parser.add_argument('--tol', type=float, default=1e-4)
+    parser.add_argument('--chunk-rows', type=int, default=250_000)
+    parser.add_argument('--block-nnz', type=int, default=1_000_000)
+    parser.add_argument('--resume', action='store_true',
+                        help='Cortar a la mitad y reanudar desde el checkpoint')
+    args = parser.parse_args()
+
+    from bench_ingestion import write_laravel_csv
+    from run import parse_size
+    from synthetic import generate_interactions
+
+    workdir = tempfile.mkdtemp(prefix='out-of-core-')
+    args.checkpoint_dir = os.path.join(workdir, 'checkpoint')
+    print(f"{'interacciones':>14} {'modo':<16}{'s':>8}{'pico MiB':>10}{'épocas':>8}{'error':>10}")
+    try:
+        for size in args.sizes.split(','):
+            n = parse_size(size)
+            csv_path = os.path.join(workdir, f'interactions_{n}.csv')
+            write_laravel_csv(generate_interactions(n), csv_path)
+
+            results = [('memoria', run('memoria', csv_path, args))]
+            shutil.rmtree(args.checkpoint_dir, ignore_errors=True)
+            if args.resume:
+                partial = run('bloques', csv_path, args, max_iter=max(1, args.max_iter // 2))
+                results.append(('bloques (1ª mitad)', partial))
+                results.append(('bloques (reanuda)', run('bloques', csv_path, args)))
+            else:
+                results.append(('bloques', run('bloques', csv_path, args)))
+            shutil.rmtree(args.checkpoint_dir, ignore_errors=True)
+
+            for mode, r in results:
+                print(f"{n:>14} {mode:<16}{r['seconds']:>8.2f}{r['peak_mib']:>10.1f}"
+                      f"{r['n_iter']:>8}{r['reconstruction_err']:>10.2f}")
+            os.remove(csv_path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
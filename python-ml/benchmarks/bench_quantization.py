@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Factores float32 contra cuantizados (MODEL_QUANTIZATION=float16 / uint8):
+bytes de W y H guardados, solapamiento del top N con float32 y latencia de
+rank_items (un usuario) y rank_items_batch (un bloque de usuarios) sobre el
+modelo mapeado desde disco, tal como lo usa un worker.
+
+Se fuerza el scoring al vuelo (sin matriz de predicciones) y alpha bajo, para
+que los scores no colapsen a un valor constante.
+
+Uso:
+    python benchmarks/bench_quantization.py [--interactions 1000000] [--items 50000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from synthetic import generate_interactions  # noqa: E402
+
+def median_ms(fn, repeats):
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+    return float(np.median(timings)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, help='Items del catálogo sintético')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--check-users', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=1024)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ['PREDICTIONS_MAX_CELLS'] = '0'
+    os.chdir(tempfile.mkdtemp(prefix='quantization-'))
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        model = app.train_model(generate_interactions(args.interactions, n_items=args.items),
+                                alpha=0.0001)
+    n_users, n_items = len(model['user_ids']), len(model['item_ids'])
+    print(f"{n_users} usuarios, {n_items} items, {model['metadata']['n_components']} componentes")
+
+    rng = np.random.default_rng(7)
+    sample = rng.choice(n_users, min(args.check_users, n_users), replace=False)
+    batch = rng.choice(n_users, min(args.batch, n_users), replace=False)
+    users = rng.integers(n_users, size=args.repeats)
+
+    print(f"{'factores':<10}{'W+H MB':>9}{'top ' + str(args.top_n):>9}{'1 usuario ms':>14}"
+          f"{'lote ' + str(len(batch)) + ' ms':>14}")
+    reference = None
+    for mode in ('', 'float16', 'uint8'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            saved = app.save_model(app.quantize_model(model, mode) if mode else model)
+        reference = reference or saved
+        size = sum(saved[name].nbytes for name in ('W', 'H', 'W_scale', 'H_scale')
+                   if saved.get(name) is not None)
+        overlap = app.top_n_overlap(reference, saved, sample, args.top_n)
+        calls = iter(users)
+        single = median_ms(lambda: app.rank_items(saved, int(next(calls)), args.top_n), args.repeats)
+        batched = median_ms(lambda: app.rank_items_batch(saved, batch, args.top_n), 20)
+        print(f"{mode or 'float32':<10}{size / 1e6:>9.1f}{overlap:>9.1%}{single:>14.3f}{batched:>14.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark del ranking de /recommend: implementación anterior (bucle en
+Python + set + sort completo) contra la vectorizada (máscara NumPy + argpartition).
+
+Uso:
+    python benchmarks/bench_recommend.py [--requests 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import app  # noqa: E402
+
+N_USERS = 1000
+N_COMPONENTS = 10
+SEEN_PER_USER = 50
+TOP_N = 5
+
+def build_model(n_items, rng):
+    """Modelo sintético con ambas representaciones de items vistos"""
+    W = rng.random((N_USERS, N_COMPONENTS), dtype=np.float32)
+    H = rng.random((N_COMPONENTS, n_items), dtype=np.float32) / N_COMPONENTS
+    item_ids = np.arange(1, n_items + 1, dtype=np.int64)
+    seen = [np.sort(rng.choice(n_items, size=min(SEEN_PER_USER, n_items), replace=False))
+            for _ in range(N_USERS)]
+    
+    return {
+        'W': W,
+        'H': H,
+        'predictions': np.clip(W @ H * 4.0 + 1, 1, 5).astype(np.float32),
+        'item_ids': item_ids,
+        'idx_to_item': {idx: int(item_id) for idx, item_id in enumerate(item_ids)},
+        'user_seen_items': {u: set(item_ids[s].tolist()) for u, s in enumerate(seen)},
+        'seen_indptr': np.concatenate([[0], np.cumsum([len(s) for s in seen])]).astype(np.int64),
+        'seen_indices': np.concatenate(seen).astype(np.int32),
+    }
+
+def rank_before(model_info, user_idx, top_n):
+    """Algoritmo original de /recommend"""
+    user_predictions = model_info['predictions'][user_idx]
+    seen_items = model_info['user_seen_items'].get(user_idx, set())
+    predictions = []
+    for item_idx, item_id in model_info['idx_to_item'].items():
+        if item_id not in seen_items:
+            predictions.append((int(item_id), float(user_predictions[item_idx])))
+    predictions.sort(key=lambda x: x[1], reverse=True)
+    return predictions[:top_n]
+
+def rank_after(model_info, user_idx, top_n):
+    top_idx, scores, _, _ = app.rank_items(model_info, user_idx, top_n)
+    return list(zip(model_info['item_ids'][top_idx].tolist(), scores[top_idx].tolist()))
+
+def measure(fn, model_info, n_requests, rng):
+    users = rng.integers(0, N_USERS, n_requests)
+    timings = np.empty(n_requests)
+    for i, user_idx in enumerate(users):
+        start = time.perf_counter()
+        fn(model_info, int(user_idx), TOP_N)
+        timings[i] = time.perf_counter() - start
+    return np.mean(timings) * 1e6, np.percentile(timings, 99) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    
+    print(f"{'items':>8} | {'antes media':>12} {'antes p99':>10} | {'ahora media':>12} {'ahora p99':>10}  (µs)")
+    for n_items in (1_000, 10_000, 100_000):
+        rng = np.random.default_rng(42)
+        model_info = build_model(n_items, rng)
+        
+        # Ambos caminos deben devolver los mismos items
+        assert [i for i, _ in rank_before(model_info, 0, TOP_N)] == \
+               [i for i, _ in rank_after(model_info, 0, TOP_N)]
+        
+        n_requests = max(50, args.requests * 1_000 // n_items)
+        before = measure(rank_before, model_info, n_requests, rng)
+        after = measure(rank_after, model_info, args.requests, rng)
+        print(f"{n_items:>8} | {before[0]:>12.1f} {before[1]:>10.1f} | {after[0]:>12.1f} {after[1]:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tamaño y CPU de serialización por respuesta según el formato: jsonify
+(listas de Python), orjson (arrays NumPy directos), MessagePack y binary
+(arrays little-endian), con y sin el mapa de scores.
+
+Se mide de punta a punta /recommend con la respuesta ya en caché (donde la
+serialización es casi todo el costo) y /recommend/batch, cuyo tiempo incluye
+el ranking de todos los usuarios. Modelo entrenado con datos sintéticos.
+
+Uso:
+    python benchmarks/bench_serialization.py [--interactions 200000] [--batch 100]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from synthetic import generate_interactions  # noqa: E402
+
+def measure(request, accept, repeats):
+    """Milisegundos por petición (mediana) y bytes de la respuesta"""
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        response = request(accept)
+        timings[i] = time.perf_counter() - start
+    assert response.status_code == 200, response.data
+    return float(np.median(timings)) * 1000, len(response.data)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interactions', type=int, default=200_000)
+    parser.add_argument('--batch', type=int, default=100, help='Usuarios por petición')
+    parser.add_argument('--top-n', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    # El servicio escribe en models/ relativo al directorio actual
+    os.chdir(tempfile.mkdtemp(prefix='serialization-'))
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        model = app.train_model(generate_interactions(args.interactions))
+        app.save_model(model)
+    client = app.app.test_client()
+    user_ids = np.random.default_rng(42).choice(model['user_ids'], args.batch).tolist()
+
+    formats = [('jsonify', 'application/json', None)]
+    if app.orjson is not None:
+        formats.append(('orjson', 'application/json', app.orjson))
+    else:
+        print("⚠ orjson no instalado: se omite")
+    if app.msgpack is not None:
+        formats.append(('msgpack', 'application/msgpack', app.orjson))
+    else:
+        print("⚠ msgpack no instalado: se omite")
+    formats.append(('binary', 'application/octet-stream', app.orjson))
+
+    print(f"\n/recommend top {args.top_n} (en caché) y /recommend/batch de {args.batch} usuarios")
+    print(f"{'formato':<10}{'scores':>8}{'ms':>9}{'bytes':>8}{'lote ms':>10}{'lote bytes':>12}")
+    for name, accept, encoder in formats:
+        app.orjson = encoder  # jsonify = camino sin orjson
+        for include_scores in (True, False):
+            scores = int(include_scores)
+            single = lambda accept: client.get(  # noqa: E731
+                f'/recommend?user_id={user_ids[0]}&top_n={args.top_n}&scores={scores}',
+                headers={'Accept': accept})
+            batch = lambda accept: client.post(  # noqa: E731
+                '/recommend/batch', headers={'Accept': accept},
+                json={'user_ids': user_ids, 'top_n': args.top_n, 'include_scores': include_scores})
+            ms, size = measure(single, accept, args.repeats * 10)
+            batch_ms, batch_size = measure(batch, accept, args.repeats)
+            print(f"{name:<10}{'sí' if include_scores else 'no':>8}{ms:>9.3f}{size:>8}"
+                  f"{batch_ms:>10.3f}{batch_size:>12}")
+
+if __name__ == '__main__':
+    main()
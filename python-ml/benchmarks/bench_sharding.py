@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Serving particionado por items en una sola máquina: levanta N shards
+(SHARD_INDEX/SHARD_COUNT) y un router (SHARD_URLS) con Gunicorn, verifica
+que /recommend devuelva lo mismo que un proceso único y compara throughput
+y latencias contra ese proceso único.
+
+Todos los servidores puntúan al vuelo (sin matriz de predicciones) y sin
+caché de respuestas, para medir el scoring.
+
+Uso:
+    python benchmarks/bench_sharding.py [--shards 2,4] [--interactions 2000000 --items 200000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import warnings
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+from load_test import measure, prepare_model, start_server, stop_server  # noqa: E402
+
+SERVER_ENV = {'PREDICTIONS_MAX_CELLS': '0', 'RESPONSE_CACHE_SIZE': '0'}
+
+def recommendations(url, user_ids, top_n=10):
+    """Listas de item_ids de /recommend para los usuarios de verificación"""
+    session = requests.Session()
+    return [
+        session.get(f'{url}/recommend', params={'user_id': user_id, 'top_n': top_n, 'scores': 0})
+        .json()['item_ids']
+        for user_id in user_ids
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shards', default='2,4', help='Cantidades de shards a probar')
+    parser.add_argument('--interactions', type=int, default=2_000_000)
+    parser.add_argument('--items', type=int, default=200_000)
+    parser.add_argument('--router-workers', type=int, default=1)
+    parser.add_argument('--clients', type=int, default=2 * os.cpu_count())
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--check-users', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.update(SERVER_ENV)
+    with tempfile.TemporaryDirectory() as workdir:
+        with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+            warnings.simplefilter('ignore')
+            # alpha bajo: con el valor por defecto los scores colapsan y el orden es arbitrario
+            user_ids = prepare_model(workdir, args.interactions, n_items=args.items, alpha=0.0001)
+        check_users = user_ids[:args.check_users]
+        print(f"{os.cpu_count()} núcleos, {len(user_ids)} usuarios, {args.items} items, "
+              f"{args.clients} clientes, {args.duration:.0f} s por prueba")
+        print(f"{'modo':<22} | {'req/s':>8} | {'p50 ms':>7} | {'p99 ms':>7} | {'iguales':>8}")
+
+        server, url = start_server(workdir, 1, SERVER_ENV)
+        try:
+            expected = recommendations(url, check_users)
+            rps, p50, p99 = measure(url, args.clients, args.duration, user_ids)
+        finally:
+            stop_server(server)
+        print(f"{'proceso único':<22} | {rps:>8.0f} | {p50 * 1e3:>7.2f} | {p99 * 1e3:>7.2f} | {'-':>8}")
+
+        for n_shards in sorted({int(n) for n in args.shards.split(',')}):
+            servers = []
+            try:
+                shard_urls = []
+                for index in range(n_shards):
+                    shard, shard_url = start_server(workdir, 1, {
+                        **SERVER_ENV, 'SHARD_INDEX': str(index), 'SHARD_COUNT': str(n_shards)
+                    })
+                    servers.append(shard)
+                    shard_urls.append(shard_url)
+                router, url = start_server(workdir, args.router_workers, {
+                    **SERVER_ENV, 'SHARD_URLS': ','.join(shard_urls)
+                })
+                servers.append(router)
+
+                got = recommendations(url, check_users)
+                same = sum(a == b for a, b in zip(got, expected))
+                rps, p50, p99 = measure(url, args.clients, args.duration, user_ids)
+            finally:
+                for server in reversed(servers):  # El router primero: mantiene conexiones abiertas a los shards
+                    stop_server(server)
+            label = f'router + {n_shards} shards'
+            print(f"{label:<22} | {rps:>8.0f} | {p50 * 1e3:>7.2f} | {p99 * 1e3:>7.2f} | "
+                  f"{same:>4}/{len(expected)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Recall vs latencia de /similar: búsqueda exacta por bloques contra el modo
+aproximado (listas IVF) con distintos valores de nprobe.
+
+Uso:
+    python benchmarks/bench_similar.py [--items 200000] [--queries 500]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import app  # noqa: E402
+
+N_COMPONENTS = 10
+TOP_N = 10
+
+def build_model(n_items, rng):
+    """H sintético no negativo con grupos de items (como los que produce NMF)"""
+    n_groups = max(1, n_items // 500)
+    centers = rng.random((n_groups, N_COMPONENTS), dtype=np.float32) ** 3
+    groups = rng.integers(0, n_groups, n_items)
+    noise = rng.random((n_items, N_COMPONENTS), dtype=np.float32) * 0.3
+    H = (centers[groups] + noise).T
+    
+    start = time.perf_counter()
+    model_info = {'H': H, **app.build_item_index(H)}
+    build_seconds = time.perf_counter() - start
+    return model_info, build_seconds
+
+def measure(fn, queries):
+    timings = np.empty(len(queries))
+    results = []
+    for i, item_idx in enumerate(queries):
+        start = time.perf_counter()
+        top_idx, _ = fn(int(item_idx))
+        timings[i] = time.perf_counter() - start
+        results.append(top_idx)
+    return results, timings * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(42)
+    model_info, build_seconds = build_model(args.items, rng)
+    n_lists = len(model_info['item_centroids'])
+    print(f"Items: {args.items}, listas IVF: {n_lists}, índice construido en {build_seconds:.2f} s")
+    
+    queries = rng.integers(0, args.items, args.queries)
+    exact, timings = measure(lambda i: app.similar_items_exact(model_info, i, TOP_N), queries)
+    print(f"{'modo':<16}{'recall@10':>10}{'media ms':>10}{'p95 ms':>10}")
+    print(f"{'exacto':<16}{1.0:>10.3f}{timings.mean():>10.3f}{np.percentile(timings, 95):>10.3f}")
+    
+    for nprobe in (1, 2, 4, 8, 16, 32):
+        approx, timings = measure(
+            lambda i: app.similar_items_approx(model_info, i, TOP_N, nprobe=nprobe), queries
+        )
+        recall = np.mean([len(np.intersect1d(a, e)) / max(len(e), 1) for a, e in zip(approx, exact)])
+        label = f'nprobe={nprobe}'
+        print(f"{label:<16}{recall:>10.3f}{timings.mean():>10.3f}{np.percentile(timings, 95):>10.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tabla materializada de top K por usuario: tiempo de cálculo según la
+cantidad de procesos, verificación contra el ranking al vuelo y latencia de
+build_recommendation cuando la respuesta sale de la tabla (hit) o se
+puntúa al vuelo (usuario fuera de la tabla o top_n > K).
+
+Se fuerza el scoring al vuelo (sin matriz de predicciones) y alpha bajo, para
+que los scores no colapsen a un valor constante.
+
+Uso:
+    python benchmarks/bench_top_k_table.py [--interactions 1000000] [--workers 1,2,4]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from synthetic import generate_interactions  # noqa: E402
+
+def latencies_ms(app, model, user_ids, top_n):
+    timings = np.empty(len(user_ids))
+    for i, user_id in enumerate(user_ids):
+        start = time.perf_counter()
+        app.build_recommendation(model, int(user_id), top_n, [])
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--interactions', type=int, default=1_000_000)
+    parser.add_argument('--items', type=int, help='Items del catálogo sintético')
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--table-users', type=int, default=20_000)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ['PREDICTIONS_MAX_CELLS'] = '0'
+    os.chdir(tempfile.mkdtemp(prefix='top-k-table-'))
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore')
+        model = app.train_model(generate_interactions(args.interactions, n_items=args.items),
+                                alpha=0.0001)
+    n_users, n_items = len(model['user_ids']), len(model['item_ids'])
+    print(f"{n_users} usuarios, {n_items} items; tabla top {args.k} de "
+          f"{min(args.table_users, n_users)} usuarios, {os.cpu_count()} núcleos")
+
+    print(f"\n{'procesos':>9}{'s':>8}")
+    table = None
+    for workers in [int(value) for value in args.workers.split(',')]:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            table = app.materialize_top_k(model, args.k, args.table_users, workers)
+        print(f"{workers:>9}{time.perf_counter() - start:>8.2f}")
+    model.update(table)
+
+    # La tabla debe dar exactamente el ranking al vuelo
+    in_table = np.flatnonzero(table['topk_rows'] >= 0)
+    rng = np.random.default_rng(42)
+    sample = rng.choice(in_table, min(500, len(in_table)), replace=False)
+    live = {key: value for key, value in model.items() if not key.startswith('topk_')}
+    same = sum(
+        np.array_equal(app.build_recommendation(model, int(model['user_ids'][u]), args.k, [])[0]['item_ids'],
+                       app.build_recommendation(live, int(model['user_ids'][u]), args.k, [])[0]['item_ids'])
+        for u in sample
+    )
+    print(f"\niguales al ranking al vuelo: {same}/{len(sample)}")
+
+    hits = model['user_ids'][rng.choice(in_table, args.requests)]
+    print(f"\n{'/recommend':<28}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, target, top_n in (('tabla (hit)', model, args.top_n),
+                                ('al vuelo, mismo usuario', live, args.top_n),
+                                (f'top_n={args.k + 5} > K (miss)', model, args.k + 5)):
+        p50, p99 = latencies_ms(app, target, hits, top_n)
+        print(f"{name:<28}{p50:>9.3f}{p99:>9.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de /recommend con Gunicorn para 1..N workers.
+
+Entrena un modelo sintético en un directorio temporal, levanta Gunicorn con
+gunicorn.conf.py para cada cantidad de workers y lo bombardea desde varios
+procesos cliente. Reporta throughput y latencias p50/p99.
+
+Con --microbatch cada cantidad de workers se prueba con y sin micro-batching
+(MICROBATCH_ENABLED); conviene --threads alto para que haya peticiones
+concurrentes que agrupar dentro de cada worker.
+
+Uso:
+    python benchmarks/load_test.py [--workers 1,2,4] [--clients 8] [--duration 10]
+    python benchmarks/load_test.py --workers 1 --threads 32 --clients 32 --microbatch --no-cache
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(HERE, '..'))
+
+def prepare_model(workdir, n_interactions, seed=42, n_items=None, **train_kwargs):
+    """Entrena y publica un modelo sintético en workdir/models"""
+    from synthetic import generate_interactions
+    
+    os.chdir(workdir)
+    sys.path.insert(0, APP_DIR)
+    import app
+    
+    df = generate_interactions(n_interactions, n_items=n_items, seed=seed)
+    model = app.train_model(df, **train_kwargs)
+    app.save_model(model)
+    return model['user_ids'].tolist()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{url}/health', timeout=1).json().get('model_loaded'):
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('Gunicorn no respondió a tiempo')
+
+def client(args):
+    """Proceso cliente: peticiones secuenciales durante `duration` segundos"""
+    url, user_ids, duration, seed = args
+    rng = np.random.default_rng(seed)
+    session = requests.Session()
+    latencies = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        user_id = int(user_ids[rng.integers(len(user_ids))])
+        start = time.perf_counter()
+        response = session.get(f'{url}/recommend', params={'user_id': user_id, 'top_n': 10})
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+def start_server(workdir, workers, extra_env=None):
+    """Levanta Gunicorn en un puerto libre y espera a que cargue el modelo"""
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    env = {**os.environ, 'WEB_WORKERS': str(workers), 'PORT': str(port),
+           'PYTHONPATH': APP_DIR, **(extra_env or {})}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(APP_DIR, 'gunicorn.conf.py'),
+         '--access-logfile', '/dev/null', 'app:app'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(url)
+    except Exception:
+        stop_server(server)
+        raise
+    return server, url
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    server.wait(timeout=30)
+
+def measure(url, clients, duration, user_ids):
+    """Throughput y latencias p50/p99 con `clients` procesos cliente"""
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client, [(url, user_ids, duration, seed) for seed in range(clients)])
+    latencies = np.concatenate(results)
+    return len(latencies) / duration, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+def run(workdir, workers, clients, duration, user_ids, extra_env=None):
+    server, url = start_server(workdir, workers, extra_env)
+    try:
+        return measure(url, clients, duration, user_ids)
+    finally:
+        stop_server(server)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default=f'1,{os.cpu_count()}')
+    parser.add_argument('--clients', type=int, default=2 * os.cpu_count())
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--interactions', type=int, default=500_000)
+    parser.add_argument('--threads', type=int, help='Hilos por worker (WEB_THREADS)')
+    parser.add_argument('--microbatch', action='store_true',
+                        help='Comparar sin y con micro-batching')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Desactivar la caché de respuestas (mide el scoring)')
+    args = parser.parse_args()
+    
+    base_env = {}
+    if args.threads:
+        base_env['WEB_THREADS'] = str(args.threads)
+    if args.no_cache:
+        base_env['RESPONSE_CACHE_SIZE'] = '0'
+    modes = [('no', '0'), ('sí', '1')] if args.microbatch else [(None, None)]
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        user_ids = prepare_model(workdir, args.interactions)
+        print(f"{os.cpu_count()} núcleos, {args.clients} clientes, {args.duration:.0f} s por prueba")
+        print(f"{'workers':>8} | {'lotes':>5} | {'req/s':>8} | {'p50 ms':>7} | {'p99 ms':>7}")
+        for workers in sorted({int(w) for w in args.workers.split(',')}):
+            for label, enabled in modes:
+                env = dict(base_env)
+                if enabled is not None:
+                    env['MICROBATCH_ENABLED'] = enabled
+                rps, p50, p99 = run(workdir, workers, args.clients, args.duration, user_ids, env)
+                print(f"{workers:>8} | {label or '-':>5} | {rps:>8.0f} | {p50 * 1e3:>7.2f} | "
+                      f"{p99 * 1e3:>7.2f}")
+
+if __name__ == '__main__':
+    main()
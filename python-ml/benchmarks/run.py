@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks reproducible, sin Laravel ni MySQL.
+
+Para cada tamaño genera interacciones sintéticas (ley de potencias) y mide:
+ingestión (parseo de páginas JSON de export-json a columnas), construcción
+de la matriz CSR, entrenamiento NMF, guardado/apertura del modelo y latencia
+de recomendación individual y por lote. El resultado se escribe en JSON para
+comparar entre commits.
+
+Uso:
+    python benchmarks/run.py [--sizes 10k,100k,1m] [--output results.json]
+    python benchmarks/run.py --sizes 1m --compare results-anterior.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(HERE, '..'))
+sys.path.insert(0, HERE)
+from synthetic import export_pages, generate_interactions  # noqa: E402
+
+SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1] in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1]])
+    return int(text)
+
+def percentiles(timings_ms):
+    return {
+        'p50_ms': round(float(np.percentile(timings_ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(timings_ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(timings_ms, 99)), 4),
+        'mean_ms': round(float(np.mean(timings_ms)), 4),
+    }
+
+def bench_ingestion(app, df, page_size):
+    """json.loads + InteractionColumns.append_rows por página (lo mismo que el fetch)"""
+    columns = app.InteractionColumns(capacity=page_size)
+    seconds = 0.0
+    for page in export_pages(df, page_size):
+        start = time.perf_counter()
+        columns.append_rows(json.loads(page))
+        seconds += time.perf_counter() - start
+    return {
+        'rows': columns.size,
+        'seconds': round(seconds, 4),
+        'rows_per_second': round(columns.size / seconds) if seconds else None,
+    }
+
+def bench_matrix(app, df):
+    start = time.perf_counter()
+    R, user_ids, item_ids = app.build_interaction_matrix(df)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': round(seconds, 4),
+        'users': len(user_ids),
+        'items': len(item_ids),
+        'nnz': int(R.nnz),
+        'bytes': int(R.data.nbytes + R.indices.nbytes + R.indptr.nbytes),
+    }
+
+def bench_training(app, df, max_components, max_iter):
+    start = time.perf_counter()
+    model = app.train_model(df, max_components=max_components, max_iter=max_iter)
+    seconds = time.perf_counter() - start
+    return model, {
+        'seconds': round(seconds, 4),
+        'phases': {name: round(value, 4) for name, value in model['metadata']['timings'].items()},
+        'scoring_mode': model['metadata']['scoring_mode'],
+    }
+
+def bench_save_load(app, model):
+    start = time.perf_counter()
+    saved = app.save_model(model)
+    save_seconds = time.perf_counter() - start
+
+    path = app.current_model_path()
+    start = time.perf_counter()
+    app.open_model(path)
+    open_seconds = time.perf_counter() - start
+
+    disk_bytes = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return saved, {
+        'save_seconds': round(save_seconds, 4),
+        'open_seconds': round(open_seconds, 6),
+        'disk_bytes': disk_bytes,
+    }
+
+def bench_latency(app, model, n_requests, batch_size, rng):
+    """Latencia del cálculo de /recommend (sin HTTP) y de /recommend/batch"""
+    user_ids = model['user_ids']
+
+    single = np.empty(n_requests)
+    for i, user_id in enumerate(rng.choice(user_ids, n_requests)):
+        start = time.perf_counter()
+        app.build_recommendation(model, int(user_id), 10, [])
+        single[i] = time.perf_counter() - start
+
+    n_batches = max(1, n_requests // batch_size)
+    batch = np.empty(n_batches)
+    for i in range(n_batches):
+        user_idx = app.user_indices(model, rng.choice(user_ids, batch_size))
+        start = time.perf_counter()
+        app.rank_items_batch(model, user_idx, 10)
+        batch[i] = time.perf_counter() - start
+
+    return {
+        'single': percentiles(single * 1000),
+        'batch': {
+            'batch_size': batch_size,
+            **percentiles(batch * 1000),
+            'per_user_ms': round(float(np.mean(batch)) * 1000 / batch_size, 4),
+        },
+    }
+
+def run_size(app, n_interactions, args):
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    df = generate_interactions(n_interactions, seed=args.seed)
+    generate_seconds = time.perf_counter() - start
+
+    result = {'n_interactions': n_interactions, 'generate_seconds': round(generate_seconds, 4)}
+    print(f"== {n_interactions} interacciones (generadas en {generate_seconds:.2f} s)")
+
+    result['ingestion'] = bench_ingestion(app, df.head(args.ingest_limit), args.page_size)
+    print(f"   ingestión: {result['ingestion']['rows_per_second']} filas/s")
+    result['matrix'] = bench_matrix(app, df)
+    print(f"   matriz CSR: {result['matrix']['seconds']} s")
+    model, result['training'] = bench_training(app, df, args.components, args.max_iter)
+    print(f"   entrenamiento: {result['training']['seconds']} s")
+    del df
+
+    model, result['save_load'] = bench_save_load(app, model)
+    print(f"   guardado: {result['save_load']['save_seconds']} s, "
+          f"apertura: {result['save_load']['open_seconds'] * 1000:.2f} ms")
+    result['latency'] = bench_latency(app, model, args.requests, args.batch_size, rng)
+    print(f"   /recommend p50: {result['latency']['single']['p50_ms']} ms, "
+          f"lote por usuario: {result['latency']['batch']['per_user_ms']} ms")
+
+    result['max_rss_mib'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+def flatten(data, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, solo valores numéricos"""
+    flat = {}
+    for key, value in data.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(results, baseline_path):
+    """Imprime la razón actual/anterior de las métricas de tiempo"""
+    with open(baseline_path) as f:
+        baseline = {r['n_interactions']: r for r in json.load(f)['results']}
+    print(f"\nComparación con {baseline_path} (actual / anterior, < 1 es mejor):")
+    for result in results:
+        previous = baseline.get(result['n_interactions'])
+        if previous is None:
+            continue
+        print(f"== {result['n_interactions']} interacciones")
+        current, previous = flatten(result), flatten(previous)
+        for name, value in current.items():
+            if not (name.endswith('seconds') or name.endswith('_ms')) or not previous.get(name):
+                continue
+            print(f"   {name:<40}{value / previous[name]:>8.2f}x")
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10k,100k,1m',
+                        help='Interacciones por corrida (10k..10m)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='JSON de una corrida anterior')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--components', type=int, default=10)
+    parser.add_argument('--max-iter', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--page-size', type=int, default=5000)
+    parser.add_argument('--ingest-limit', type=int, default=1_000_000,
+                        help='Filas máximas para el benchmark de ingestión')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    # El servicio escribe en models/ y data/ relativos al directorio actual
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.chdir(workdir)
+    sys.path.insert(0, APP_DIR)
+    import app
+    import scipy
+    import sklearn
+
+    results = [run_size(app, parse_size(size), args) for size in args.sizes.split(',')]
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'scikit-learn': sklearn.__version__,
+            'cpu_count': os.cpu_count(),
+            'machine': platform.machine(),
+        },
+        'params': vars(args),
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Resultados en {output}")
+
+    if baseline:
+        compare(results, baseline)
+
+if __name__ == '__main__':
+    main()
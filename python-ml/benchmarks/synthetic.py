@@ -0,0 +1,69 @@
+"""
+Generador de interacciones sintéticas para los benchmarks.
+
+La popularidad de usuarios e items sigue una ley de potencias (pocos
+usuarios muy activos, pocos items muy populares y una cola larga), que es
+lo que determina la densidad de la matriz y el costo de los vistos. Todo es
+determinista dada la semilla y no necesita Laravel ni MySQL.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+# Distribución de ratings 1..5 sesgada hacia valores altos, como en reseñas reales
+RATING_PROBABILITIES = (0.05, 0.10, 0.20, 0.35, 0.30)
+START_TIMESTAMP = 1_700_000_000
+
+def power_law_sample(rng, n_values, size, exponent):
+    """
+    `size` índices en [0, n_values) con P(rango r) ∝ 1 / r^exponent.
+
+    Los rangos se barajan para que los ids populares no sean los primeros.
+    """
+    weights = 1.0 / np.arange(1, n_values + 1, dtype=np.float64) ** exponent
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    ranks = np.searchsorted(cdf, rng.random(size), side='right')
+    return rng.permutation(n_values)[np.minimum(ranks, n_values - 1)]
+
+def generate_interactions(n_interactions, n_users=None, n_items=None,
+                          user_exponent=0.8, item_exponent=1.0, seed=42):
+    """
+    DataFrame con las columnas y tipos del almacén local (id, user_id,
+    item_id, rating, updated_at).
+
+    Por defecto hay ~20 interacciones por usuario y ~50 por item. Los pares
+    usuario-item pueden repetirse (el entrenamiento los promedia).
+    """
+    rng = np.random.default_rng(seed)
+    n_users = n_users or max(50, n_interactions // 20)
+    n_items = n_items or max(50, n_interactions // 50)
+
+    return pd.DataFrame({
+        'id': np.arange(1, n_interactions + 1, dtype=np.int64),
+        'user_id': power_law_sample(rng, n_users, n_interactions, user_exponent) + 1,
+        'item_id': power_law_sample(rng, n_items, n_interactions, item_exponent) + 1,
+        'rating': rng.choice(np.arange(1, 6, dtype=np.int8), n_interactions,
+                             p=RATING_PROBABILITIES),
+        'updated_at': START_TIMESTAMP + np.arange(n_interactions, dtype=np.int64),
+    })
+
+def export_pages(df, page_size):
+    """
+    Páginas JSON (bytes) con el formato de /api/interactions/export-json,
+    para medir el parseo sin red.
+    """
+    timestamps = pd.to_datetime(df['updated_at'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
+    columns = {
+        'id': df['id'].tolist(),
+        'user_id': df['user_id'].tolist(),
+        'item_id': df['item_id'].tolist(),
+        'rating': df['rating'].tolist(),
+        'updated_at': timestamps.tolist(),
+    }
+    for start in range(0, len(df), page_size):
+        stop = start + page_size
+        rows = [dict(zip(columns, values))
+                for values in zip(*(column[start:stop] for column in columns.values()))]
+        yield json.dumps(rows).encode()
@@ -0,0 +1,30 @@
+"""Fixtures compartidas por las pruebas del servicio"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+@pytest.fixture
+def model_workdir(tmp_path, monkeypatch):
+    """El servicio con models/ y data/ dentro de tmp_path y sin modelo cargado"""
+    monkeypatch.chdir(tmp_path)
+    for directory in (app.RETRAIN_JOBS_DIR, app.FOLD_IN_PENDING_DIR,
+                      app.FOLD_IN_PUBLISHED_DIR, app.DATA_DIR):
+        os.makedirs(directory)
+    monkeypatch.setattr(app, '_model_cache', None)
+    monkeypatch.setattr(app, '_model_pointer_signature', None)
+    app._response_cache.clear()
+    return tmp_path
+
+def random_interactions(n_users=300, n_items=80, per_user=12, seed=7):
+    """Interacciones sintéticas: per_user items distintos por usuario, rating 1..5"""
+    rng = np.random.default_rng(seed)
+    items = np.concatenate([rng.choice(n_items, per_user, replace=False) for _ in range(n_users)])
+    return pd.DataFrame({
+        'user_id': np.repeat(np.arange(1, n_users + 1), per_user),
+        'item_id': items + 1,
+        'rating': rng.integers(1, 6, size=len(items)),
+    })
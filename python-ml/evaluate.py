@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Evaluación offline del modelo con barrido de hiperparámetros en paralelo.
+
+Separa las interacciones en entrenamiento/prueba (por tiempo o dejando las
+últimas k de cada usuario), entrena train_model con cada combinación de
+max_components, max_iter y alpha en un pool de procesos y reporta precision@k,
+recall@k, NDCG@k, tiempo de entrenamiento y memoria pico. Un item de prueba
+es relevante si su rating es >= --relevant-rating.
+
+Uso:
+    python evaluate.py --components 5,10,20 --max-iter 30,50,100
+    python evaluate.py --synthetic 200000 --split leave-k-out --holdout 2
+    python evaluate.py --min-ndcg 0.05   # la configuración más barata que lo cumple
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_interactions(args):
+    """Interacciones del almacén local (data/interactions) o sintéticas"""
+    if args.synthetic:
+        sys.path.insert(0, os.path.join(HERE, 'benchmarks'))
+        from synthetic import generate_interactions
+        return generate_interactions(args.synthetic, seed=args.seed)
+
+    import app
+    df, state = app.load_interaction_store()
+    if df is None:
+        raise SystemExit('✗ No hay almacén local. Ejecute /retrain o use --synthetic N')
+    print(f"Almacén local: {state['count']} interacciones (sincronizado {state['synced_at']})")
+    return df
+
+def split_by_time(df, test_fraction):
+    """Las interacciones más recientes (por updated_at) forman la prueba"""
+    cutoff = np.quantile(df['updated_at'].to_numpy(), 1 - test_fraction)
+    is_test = df['updated_at'].to_numpy() > cutoff
+    return df[~is_test], df[is_test]
+
+def split_leave_k_out(df, k):
+    """Las últimas k interacciones de cada usuario con más de k forman la prueba"""
+    df = df.sort_values(['user_id', 'updated_at', 'id'], kind='stable')
+    grouped = df.groupby('user_id', sort=False)
+    from_end = grouped.cumcount(ascending=False).to_numpy()
+    counts = grouped['user_id'].transform('size').to_numpy()
+    is_test = (from_end < k) & (counts > k)
+    return df[~is_test], df[is_test]
+
+def save_split(train_df, test_df, relevant_rating, path):
+    """Guarda el split como .npz para que cada worker lo cargue sin pickle del DataFrame"""
+    relevant = test_df[test_df['rating'] >= relevant_rating]
+    np.savez(
+        path,
+        train_user_id=train_df['user_id'].to_numpy(),
+        train_item_id=train_df['item_id'].to_numpy(),
+        train_rating=train_df['rating'].to_numpy(),
+        test_user_id=relevant['user_id'].to_numpy(),
+        test_item_id=relevant['item_id'].to_numpy(),
+    )
+    return len(relevant)
+
+def ranking_metrics(top_idx, top_scores, relevant_keys, relevant_counts, n_items, k):
+    """
+    precision@k, recall@k y NDCG@k promediados sobre usuarios.
+
+    relevant_keys codifica (fila de usuario, item) como fila * n_items + item.
+    """
+    rows = np.arange(len(top_idx))[:, None]
+    hits = np.isin(rows * n_items + top_idx, relevant_keys) & (top_scores > -np.inf)
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = (hits * discounts).sum(axis=1)
+    ideal = np.cumsum(discounts)[np.minimum(relevant_counts, k) - 1]
+
+    n_hits = hits.sum(axis=1)
+    return {
+        'precision': float(np.mean(n_hits / k)),
+        'recall': float(np.mean(n_hits / relevant_counts)),
+        'ndcg': float(np.mean(dcg / ideal)),
+    }
+
+def evaluate_config(split_path, max_components, max_iter, alpha, k):
+    """Entrena y evalúa una configuración (se ejecuta en un proceso del pool)"""
+    import pandas as pd
+    from sklearn.exceptions import ConvergenceWarning
+    import app
+
+    split = np.load(split_path)
+    train_df = pd.DataFrame({
+        'user_id': split['train_user_id'],
+        'item_id': split['train_item_id'],
+        'rating': split['train_rating'],
+    })
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    with warnings.catch_warnings(), contextlib.redirect_stdout(io.StringIO()):
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        model = app.train_model(train_df, max_components=max_components,
+                                max_iter=max_iter, alpha=alpha)
+    train_seconds = time.perf_counter() - start
+    peak_mib = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+
+    # Solo pares con usuario e item del entrenamiento, y no vistos, se pueden recomendar
+    n_items = len(model['item_ids'])
+    user_idx = app.user_indices(model, split['test_user_id'])
+    known = (user_idx >= 0) & np.isin(split['test_item_id'], model['item_ids'])
+    item_idx = app.known_item_indices(model['item_ids'], split['test_item_id'][known])
+    pairs = np.unique(user_idx[known] * n_items + item_idx)
+
+    indptr = model['seen_indptr']
+    seen_rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    pairs = pairs[~np.isin(pairs, seen_rows * n_items + model['seen_indices'])]
+
+    eval_users, user_rows, relevant_counts = np.unique(
+        pairs // n_items, return_inverse=True, return_counts=True
+    )
+    relevant_keys = user_rows * n_items + pairs % n_items
+
+    start = time.perf_counter()
+    top_idx, top_scores, _, _ = app.rank_items_batch(model, eval_users, k)
+    score_seconds = time.perf_counter() - start
+
+    return {
+        'max_components': max_components,
+        'max_iter': max_iter,
+        'alpha': alpha,
+        'n_components': model['metadata']['n_components'],
+        **ranking_metrics(top_idx, top_scores, relevant_keys, relevant_counts, n_items, k),
+        'users_evaluated': int(len(eval_users)),
+        'train_seconds': round(train_seconds, 3),
+        'nmf_fit_seconds': round(model['metadata']['timings']['nmf_fit'], 3),
+        'score_seconds': round(score_seconds, 3),
+        'train_peak_mib': round(peak_mib, 1),
+    }
+
+def parse_list(text, cast=int):
+    return [cast(value) for value in text.split(',') if value.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--synthetic', type=int, help='Usar N interacciones sintéticas')
+    parser.add_argument('--split', choices=('time', 'leave-k-out'), default='time')
+    parser.add_argument('--test-fraction', type=float, default=0.2,
+                        help='Fracción más reciente para prueba (split por tiempo)')
+    parser.add_argument('--holdout', type=int, default=1,
+                        help='Interacciones por usuario para prueba (leave-k-out)')
+    parser.add_argument('--relevant-rating', type=int, default=4)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--components', default='5,10,20')
+    parser.add_argument('--max-iter', default='30,50,100')
+    parser.add_argument('--alpha', default='0.02', help='Regularización de W y H')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--min-ndcg', type=float,
+                        help='Elegir la configuración más rápida con NDCG@k >= este valor')
+    parser.add_argument('--output', help='Guardar resultados en JSON')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    df = load_interactions(args)
+    if args.split == 'time':
+        train_df, test_df = split_by_time(df, args.test_fraction)
+    else:
+        train_df, test_df = split_leave_k_out(df, args.holdout)
+    del df
+
+    workdir = tempfile.mkdtemp(prefix='evaluate-')
+    split_path = os.path.join(workdir, 'split.npz')
+    n_relevant = save_split(train_df, test_df, args.relevant_rating, split_path)
+    print(f"Split {args.split}: {len(train_df)} entrenamiento, {len(test_df)} prueba "
+          f"({n_relevant} relevantes)")
+    del train_df, test_df
+
+    grid = list(itertools.product(
+        parse_list(args.components), parse_list(args.max_iter), parse_list(args.alpha, float)
+    ))
+    workers = max(1, min(args.workers, len(grid)))
+    print(f"Evaluando {len(grid)} configuraciones con {workers} procesos...")
+
+    # Un hilo BLAS por proceso: el paralelismo lo da el pool
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ.setdefault(var, '1')
+
+    start = time.perf_counter()
+    try:
+        # Un proceso nuevo por configuración para que la memoria pico sea la suya
+        with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+            futures = [pool.submit(evaluate_config, split_path, *config, args.k) for config in grid]
+            results = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    wall_seconds = time.perf_counter() - start
+
+    k = args.k
+    print(f"\n{'comp':>5}{'iter':>6}{'alpha':>8}{f'P@{k}':>9}{f'R@{k}':>9}{f'NDCG@{k}':>9}"
+          f"{'train s':>9}{'pico MiB':>10}")
+    for r in sorted(results, key=lambda r: -r['ndcg']):
+        print(f"{r['max_components']:>5}{r['max_iter']:>6}{r['alpha']:>8g}{r['precision']:>9.4f}"
+              f"{r['recall']:>9.4f}{r['ndcg']:>9.4f}{r['train_seconds']:>9.2f}"
+              f"{r['train_peak_mib']:>10.1f}")
+    print(f"\nBarrido completo en {wall_seconds:.1f} s "
+          f"({sum(r['train_seconds'] for r in results):.1f} s de entrenamiento sumados)")
+
+    if args.min_ndcg is not None:
+        eligible = [r for r in results if r['ndcg'] >= args.min_ndcg]
+        if eligible:
+            best = min(eligible, key=lambda r: r['train_seconds'])
+            print(f"✓ Más barata con NDCG@{k} >= {args.min_ndcg}: max_components="
+                  f"{best['max_components']}, max_iter={best['max_iter']}, alpha={best['alpha']} "
+                  f"({best['train_seconds']} s)")
+        else:
+            print(f"⚠ Ninguna configuración alcanza NDCG@{k} >= {args.min_ndcg}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'params': vars(args), 'wall_seconds': wall_seconds,
+                       'results': results}, f, indent=2)
+        print(f"✓ Resultados en {args.output}")
+
+if __name__ == '__main__':
+    main()
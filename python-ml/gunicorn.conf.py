@@ -0,0 +1,42 @@
+"""
+Configuración de Gunicorn para producción (pre-fork, varios procesos).
+
+El scoring de /recommend es NumPy ligado a CPU, así que un solo proceso
+queda limitado por el GIL. Aquí el master importa la app una vez
+(preload_app) y cada worker comparte el modelo mapeado en memoria.
+
+Uso:
+    gunicorn -c gunicorn.conf.py app:app
+
+Recarga:
+    - Automática: cada worker vigila models/CURRENT y cambia de versión
+      cuando se publica un modelo nuevo (MODEL_WATCH_INTERVAL).
+    - Manual: `kill -HUP <pid del master>` reemplaza los workers de forma
+      ordenada; los nuevos abren la versión publicada al arrancar.
+"""
+import multiprocessing
+import os
+
+# Un hilo BLAS por worker: el paralelismo lo dan los procesos; evita
+# sobre-suscripción de núcleos. Debe fijarse antes de importar NumPy.
+for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(var, os.getenv('WORKER_BLAS_THREADS', '1'))
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 2))
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+accesslog = '-'
+
+def when_ready(server):
+    """Carga inicial del modelo en el master; los workers lo heredan al hacer fork"""
+    from app import check_model_update
+    check_model_update()
+
+def post_fork(server, worker):
+    """Los hilos no sobreviven al fork: cada worker inicia su propio vigilante"""
+    from app import start_model_watcher
+    start_model_watcher()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Prueba de los fold-in de /update_users frente a un reentrenamiento que leyó
+sus datos antes de que se publicaran.
+"""
+import app
+from conftest import random_interactions
+
+def test_fold_in_during_retrain_survives_publish(model_workdir, monkeypatch):
+    interactions = random_interactions()
+    app.save_model(app.train_model(interactions, max_components=5, max_iter=20))
+    export = model_workdir / 'interactions_2025-11-09_000000.csv'
+    interactions.to_csv(export, index=False)
+    
+    # El usuario nuevo llega después de que el reentrenamiento leyó la exportación
+    new_user = random_interactions(n_users=1, seed=11).assign(user_id=10_000)
+    read_interactions_file = app.read_interactions_file
+    
+    def read_then_fold_in(path):
+        data = read_interactions_file(path)
+        app.queue_fold_in(new_user)
+        assert app.publish_fold_ins(force=True)['new_users'] == 1
+        return data
+    
+    monkeypatch.setattr(app, 'read_interactions_file', read_then_fold_in)
+    job = {'job_id': 'fold-in-test', 'status': 'queued', 'phase': None, 'timings': {}}
+    app.run_retrain_job(job, None, 5, 20, False, source_path=str(export))
+    
+    assert job['status'] == 'completed', job.get('error')
+    payload, status = app.build_recommendation(app.load_model(), 10_000, 5, [])
+    assert status == 200
+    assert payload['seen_items_count'] == len(new_user)
+
+def test_fold_in_keeps_other_users_etag_and_cache(model_workdir):
+    app.save_model(app.train_model(random_interactions(), max_components=5, max_iter=20))
+    client = app.app.test_client()
+    before = {user_id: client.get(f'/recommend?user_id={user_id}') for user_id in (1, 2)}
+    cached = app._response_cache.stats()['size']
+    
+    # Fold-in del usuario 1: publica una versión nueva del modelo
+    app.queue_fold_in(random_interactions(n_users=1, seed=11))
+    assert app.publish_fold_ins(force=True)['updated_users'] == 1
+    assert app._response_cache.stats()['size'] == cached
+    
+    # El usuario 2 no cambió: mismo ETag y 304; el 1 recibe uno nuevo
+    etag = before[2].headers['ETag'].strip('"')
+    assert client.get('/recommend?user_id=2', headers={'If-None-Match': etag}).status_code == 304
+    changed = client.get('/recommend?user_id=1', headers={'If-None-Match': before[1].headers['ETag'].strip('"')})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != before[1].headers['ETag']
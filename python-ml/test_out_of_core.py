@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Prueba del entrenamiento fuera de memoria: reanudar desde un checkpoint da
+los mismos factores que un entrenamiento sin interrupciones.
+"""
+import numpy as np
+import pytest
+
+import app
+from conftest import random_interactions
+
+class Interrupted(Exception):
+    pass
+
+def test_resume_from_checkpoint_matches_uninterrupted_run(tmp_path, monkeypatch):
+    export = tmp_path / 'interactions_2025-11-09_000000.csv'
+    random_interactions().to_csv(export, index=False)
+    options = dict(max_components=5, max_iter=6, tol=0, block_nnz=500)
+    
+    expected = app.train_model_out_of_core(str(export), checkpoint_dir=str(tmp_path / 'full'),
+                                           **options)
+    
+    # El proceso "se cae" justo después de guardar el checkpoint de la época 2
+    write_json_atomic = app.write_json_atomic
+    
+    def write_then_crash(path, data):
+        write_json_atomic(path, data)
+        if data.get('epoch') == 2:
+            raise Interrupted()
+    
+    checkpoint_dir = str(tmp_path / 'resumed')
+    monkeypatch.setattr(app, 'write_json_atomic', write_then_crash)
+    with pytest.raises(Interrupted):
+        app.train_model_out_of_core(str(export), checkpoint_dir=checkpoint_dir, **options)
+    monkeypatch.setattr(app, 'write_json_atomic', write_json_atomic)
+    
+    resumed = app.train_model_out_of_core(str(export), checkpoint_dir=checkpoint_dir, **options)
+    
+    assert resumed['metadata']['resumed_from_epoch'] == 2
+    assert resumed['metadata']['n_iter'] == expected['metadata']['n_iter'] == 6
+    np.testing.assert_allclose(resumed['W'], expected['W'], rtol=1e-6)
+    np.testing.assert_allclose(resumed['H'], expected['H'], rtol=1e-6)
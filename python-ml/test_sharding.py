@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Prueba del particionado por items: un router con dos shards en el mismo
+proceso (servidos por el cliente de pruebas de Flask) devuelve el mismo top N
+que el ranking sin particionar, también con items excluidos.
+"""
+import threading
+
+import numpy as np
+import requests
+
+import app
+from conftest import random_interactions
+
+class InProcessShards:
+    """Sesión HTTP del router: http://shard<i> es el shard i de este proceso"""
+    
+    def __init__(self):
+        self.client = app.app.test_client()
+        self.lock = threading.Lock()  # Un shard a la vez: SHARD_INDEX es global
+        self.requests = 0
+    
+    def post(self, url, json, timeout):
+        shard_index = int(url.split('/shard/rank')[0].rsplit('shard', 1)[1])
+        with self.lock:
+            app.SHARD_INDEX, app._shard_view = shard_index, None
+            self.requests += 1
+            flask_response = self.client.post('/shard/rank', json=json)
+        response = requests.Response()
+        response.status_code = flask_response.status_code
+        response.headers.update(flask_response.headers)
+        response._content = flask_response.data
+        return response
+
+def test_router_merges_shards_into_unsharded_top_n(model_workdir, monkeypatch):
+    monkeypatch.setattr(app, 'PREDICTIONS_MAX_CELLS', 0)  # Mismo scoring al vuelo en ambos
+    model = app.save_model(app.train_model(random_interactions(), max_components=5,
+                                           max_iter=20, alpha=0.0001))
+    users = model['user_ids'][:25].tolist()
+    exclude = model['item_ids'][[0, 7, 40, 79]].tolist()
+    
+    expected = {(user_id, tuple(excluded)): app.build_recommendation(model, user_id, 10, excluded)[0]
+                for user_id in users for excluded in ([], exclude)}
+    
+    monkeypatch.setattr(app, 'SHARD_URLS', ['http://shard0', 'http://shard1'])
+    monkeypatch.setattr(app, 'SHARD_COUNT', 2)
+    monkeypatch.setattr(app, 'SHARD_INDEX', None)
+    monkeypatch.setattr(app, '_shard_view', None)
+    shards = InProcessShards()
+    monkeypatch.setattr(app, 'get_shard_session', lambda: shards)
+    
+    for (user_id, excluded), reference in expected.items():
+        payload, status = app.build_recommendation(model, user_id, 10, list(excluded))
+        assert status == 200
+        np.testing.assert_array_equal(payload['item_ids'], reference['item_ids'])
+        np.testing.assert_allclose(payload['scores'], reference['scores'], rtol=1e-5)
+        assert payload['total_available'] == reference['total_available']
+        assert payload['seen_items_count'] == reference['seen_items_count']
+    assert shards.requests == 2 * len(expected)
+    
+    # Lote: mismos índices y scores que rank_items_batch
+    user_idx = app.user_indices(model, users)
+    exclude_idx = app.known_item_indices(model['item_ids'], exclude)
+    sharded = app.rank_items_sharded(model, user_idx, 10, exclude_idx)
+    local = app.rank_items_batch(model, user_idx, 10, exclude_idx)
+    np.testing.assert_array_equal(sharded[0], local[0])
+    np.testing.assert_allclose(sharded[1], local[1], rtol=1e-5)
+    np.testing.assert_array_equal(sharded[2], local[2])
+    np.testing.assert_array_equal(sharded[3], local[3])
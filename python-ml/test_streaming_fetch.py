@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Prueba de la descarga paginada e incremental de interacciones contra un
+servidor HTTP local que imita /api/interactions/export-json y
+/api/interactions/ids (no requiere Laravel), y de la lectura de
+exportaciones CSV desde disco.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import app  # noqa: E402
+
+TOTAL_ROWS = 12_345
+
+def synthetic_rows(total):
+    rng = np.random.default_rng(7)
+    base = int(np.datetime64('2025-11-09T00:00:00', 's').astype(np.int64))
+    return [
+        {
+            'id': i + 1,
+            'user_id': int(rng.integers(1, 500)),
+            'item_id': int(rng.integers(1, 200)),
+            'rating': int(rng.integers(1, 6)),
+            'interaction_type': 'rating',
+            'created_at': '2025-11-09 10:30:00',
+            'updated_at': app.format_timestamp(base + i),
+        }
+        for i in range(total)
+    ]
+
+class FakeLaravel:
+    """Servidor local que sirve páginas sintéticas por keyset sobre el id"""
+    
+    def __init__(self, rows, paginate=True):
+        self.rows = rows
+        self.paginate = paginate
+        self.requests = []
+        self.id_requests = 0
+        
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/api/interactions/ids':
+                    server.id_requests += 1
+                    return self.send_json([r['id'] for r in server.rows])
+                
+                query = parse_qs(url.query)
+                after_id = int(query.get('after_id', ['0'])[0])
+                limit = int(query.get('limit', ['0'])[0])
+                updated_since = query.get('updated_since', [''])[0]
+                page = server.rows
+                headers = {}
+                if server.paginate and limit:
+                    page = [r for r in server.rows
+                            if r['id'] > after_id and r['updated_at'] >= updated_since][:limit]
+                    if after_id == 0:
+                        headers['X-Total-Count'] = str(len(server.rows))
+                server.requests.append((after_id, limit, len(page)))
+                self.send_json(page, headers)
+            
+            def send_json(self, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+    
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def fetch_from(server, **kwargs):
+    original_url = app.LARAVEL_API_URL
+    app.LARAVEL_API_URL = server.url
+    try:
+        return app.fetch_interactions_from_laravel(**kwargs)
+    finally:
+        app.LARAVEL_API_URL = original_url
+
+def test_fetch_pages_until_exhausted():
+    rows = synthetic_rows(TOTAL_ROWS)
+    with FakeLaravel(rows) as server:
+        df = fetch_from(server, batch_size=1000)
+    
+    assert len(df) == TOTAL_ROWS
+    assert df['id'].tolist() == [r['id'] for r in rows]
+    assert df['user_id'].tolist() == [r['user_id'] for r in rows]
+    assert df['rating'].dtype == np.int8
+    # 13 páginas (12 llenas + 1 parcial) y ninguna respuesta mayor que una página
+    assert len(server.requests) == 13
+    assert max(n for _, _, n in server.requests) <= 1000
+    assert [after for after, _, _ in server.requests][:3] == [0, 1000, 2000]
+
+def test_fetch_respects_max_batches():
+    with FakeLaravel(synthetic_rows(TOTAL_ROWS)) as server:
+        df = fetch_from(server, batch_size=1000, max_batches=3)
+    
+    assert len(df) == 3000
+    assert len(server.requests) == 3
+
+def test_fetch_from_server_without_pagination():
+    rows = synthetic_rows(2500)
+    with FakeLaravel(rows, paginate=False) as server:
+        df = fetch_from(server, batch_size=1000)
+    
+    assert len(df) == 2500
+    assert len(server.requests) == 1
+
+def sync_from(server, store_dir, **kwargs):
+    original = app.LARAVEL_API_URL, app.INTERACTIONS_STORE_DIR, app.EXPORT_PAGE_SIZE
+    app.LARAVEL_API_URL = server.url
+    app.INTERACTIONS_STORE_DIR = str(store_dir)
+    app.EXPORT_PAGE_SIZE = 1000
+    try:
+        return app.sync_interactions(**kwargs)
+    finally:
+        app.LARAVEL_API_URL, app.INTERACTIONS_STORE_DIR, app.EXPORT_PAGE_SIZE = original
+
+def test_sync_fetches_only_delta_after_watermark(tmp_path):
+    rows = synthetic_rows(5000)
+    store_dir = tmp_path / 'interactions'
+    with FakeLaravel(rows) as server:
+        assert len(sync_from(server, store_dir)) == 5000
+        
+        # Una actualización y dos filas nuevas, con updated_at posterior
+        rows[10] = {**rows[10], 'rating': 5, 'updated_at': '2025-11-10 08:00:00'}
+        rows.append({**rows[0], 'id': 5001, 'item_id': 999, 'updated_at': '2025-11-10 08:00:00'})
+        rows.append({**rows[0], 'id': 5002, 'item_id': 998, 'updated_at': '2025-11-10 08:00:01'})
+        server.requests.clear()
+        df = sync_from(server, store_dir)
+    
+    assert len(df) == 5002
+    assert df['id'].tolist() == list(range(1, 5003))
+    assert df.loc[df['id'] == 11, 'rating'].item() == 5
+    # Solo se descargó el delta (más la fila del segundo de la marca de agua,
+    # que se pide de nuevo por ser >=) y no hizo falta revisar eliminaciones
+    assert sum(n for _, _, n in server.requests) == 4
+    assert server.id_requests == 0
+    
+    with open(store_dir / 'state.json') as f:
+        state = json.load(f)
+    assert app.format_timestamp(state['watermark_updated_at']) == '2025-11-10 08:00:01'
+    assert state['max_id'] == 5002
+
+def test_sync_drops_deleted_rows(tmp_path):
+    rows = synthetic_rows(3000)
+    store_dir = tmp_path / 'interactions'
+    with FakeLaravel(rows) as server:
+        sync_from(server, store_dir)
+        del rows[100:110]
+        df = sync_from(server, store_dir)
+    
+    assert len(df) == 2990
+    assert server.id_requests == 1
+    assert not df['id'].isin(range(101, 111)).any()
+
+def write_export_csv(path, rows):
+    """CSV con el mismo encabezado que interactions:export de Laravel"""
+    with open(path, 'w') as f:
+        f.write('user_id,item_id,rating,interaction_type,created_at\n')
+        for r in rows:
+            f.write(f"{r['user_id']},{r['item_id']},{r['rating']},{r['interaction_type']},"
+                    f"{r['created_at']}\n")
+
+def test_read_export_file_in_chunks_with_compact_dtypes(tmp_path):
+    rows = synthetic_rows(2500)
+    path = tmp_path / 'interactions_2025-11-09_103000.csv'
+    write_export_csv(path, rows)
+    
+    df = app.read_interactions_file(str(path), chunk_rows=1000)
+    
+    assert list(df.columns) == ['user_id', 'item_id', 'rating']
+    assert df['user_id'].dtype == np.int32
+    assert df['rating'].dtype == np.int8
+    assert df['item_id'].tolist() == [r['item_id'] for r in rows]
+
+def test_latest_export_file_skips_partial_writes(tmp_path):
+    older = tmp_path / 'interactions_2025-11-08_000000.csv'
+    write_export_csv(older, synthetic_rows(10))
+    (tmp_path / 'interactions_2025-11-09_000000.csv.partial').write_text('user_id')
+    
+    assert app.latest_export_file(str(tmp_path)) == str(older)
+    assert app.latest_export_file(str(tmp_path / 'missing')) is None
+
+def test_fetch_returns_none_when_unreachable():
+    original_url = app.LARAVEL_API_URL
+    app.LARAVEL_API_URL = 'http://127.0.0.1:9'
+    try:
+        assert app.fetch_interactions_from_laravel(batch_size=10) is None
+    finally:
+        app.LARAVEL_API_URL = original_url
+
+if __name__ == '__main__':
+    import inspect
+    import pathlib
+    import tempfile
+    
+    # Sin pytest: las pruebas que piden tmp_path reciben un directorio temporal
+    for name, fn in list(globals().items()):
+        if name.startswith('test_'):
+            if 'tmp_path' in inspect.signature(fn).parameters:
+                with tempfile.TemporaryDirectory() as tmp:
+                    fn(pathlib.Path(tmp))
+            else:
+                fn()
+            print(f"✓ {name}")
@@ -27,7 +27,6 @@ class ExportInteractions extends Command
     public function handle()
     {
         $format = $this->option('format');
-        $interactions = Interaction::all();
 
         if (!file_exists(storage_path('app/exports'))) {
             mkdir(storage_path('app/exports'), 0755, true);
@@ -36,6 +35,7 @@ public function handle()
         $timestamp = date('Y-m-d_His');
         
         if ($format === 'json') {
+            $interactions = Interaction::all();
             $filename = storage_path("app/exports/interactions_{$timestamp}.json");
             $data = $interactions->map(function ($interaction) {
                 return [
@@ -48,16 +48,21 @@ public function handle()
             });
             
             file_put_contents($filename, json_encode($data, JSON_PRETTY_PRINT));
+            $count = $interactions->count();
             $this->info("Interacciones exportadas a JSON: {$filename}");
         } else {
             $filename = storage_path("app/exports/interactions_{$timestamp}.csv");
-            $file = fopen($filename, 'w');
+            // Se escribe con otro nombre y se renombra al final: el servicio ML
+            // (que lee este directorio) nunca ve un archivo a medio escribir
+            $partial = "{$filename}.partial";
+            $file = fopen($partial, 'w');
             
             // Headers
             fputcsv($file, ['user_id', 'item_id', 'rating', 'interaction_type', 'created_at']);
             
-            // Data
-            foreach ($interactions as $interaction) {
+            // Data, por bloques de ids para no cargar toda la tabla en memoria
+            $count = 0;
+            foreach (Interaction::lazyById(5000) as $interaction) {
                 fputcsv($file, [
                     $interaction->user_id,
                     $interaction->item_id,
@@ -65,13 +70,15 @@ public function handle()
                     $interaction->interaction_type,
                     $interaction->created_at->toDateTimeString(),
                 ]);
+                $count++;
             }
             
             fclose($file);
+            rename($partial, $filename);
             $this->info("Interacciones exportadas a CSV: {$filename}");
         }
 
-        $this->info("Total de interacciones exportadas: " . $interactions->count());
+        $this->info("Total de interacciones exportadas: " . $count);
         
         return Command::SUCCESS;
     }
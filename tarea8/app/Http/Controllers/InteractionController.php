@@ -2,6 +2,7 @@
 
 namespace App\Http\Controllers;
 
+use App\Jobs\UpdateUserRecommendationsJob;
 use App\Models\Interaction;
 use App\Models\Item;
 use Illuminate\Http\Request;
@@ -40,6 +41,10 @@ public function store(Request $request)
             ]
         );
 
+        // Actualizar el vector latente del usuario sin esperar al reentrenamiento
+        // (los cambios de varios usuarios se envían juntos, con unos segundos de espera)
+        UpdateUserRecommendationsJob::queueUser(Auth::id());
+
         // Si es una petición de Inertia, devolver back() (redirección sin recargar)
         // Con preserveState: true en el frontend, esto no recargará la página
         if ($request->header('X-Inertia')) {
@@ -81,11 +86,13 @@ public function export()
             mkdir(storage_path('app/exports'), 0755, true);
         }
 
-        $file = fopen($filename, 'w');
+        // Nombre temporal + rename: el servicio ML no ve archivos a medio escribir
+        $file = fopen("{$filename}.partial", 'w');
         foreach ($csvData as $row) {
             fputcsv($file, $row);
         }
         fclose($file);
+        rename("{$filename}.partial", $filename);
 
         return response()->json([
             'message' => 'Datos exportados exitosamente',
@@ -94,20 +101,61 @@ public function export()
         ]);
     }
 
-    public function exportJson()
+    /**
+     * Exporta interacciones en JSON.
+     * Con `limit` pagina por keyset sobre el id: devuelve hasta `limit` filas
+     * con id mayor que `after_id`, ordenadas por id. Con `updated_since` solo
+     * incluye filas creadas o modificadas desde ese instante (exportación
+     * incremental). La primera página informa el total en `X-Total-Count`.
+     */
+    public function exportJson(Request $request)
     {
-        $interactions = Interaction::with(['user', 'item'])->get();
+        $validated = $request->validate([
+            'after_id' => 'nullable|integer|min:0',
+            'limit' => 'nullable|integer|min:1|max:50000',
+            'updated_since' => 'nullable|date_format:Y-m-d H:i:s',
+        ]);
+
+        $query = Interaction::query()
+            ->select(['id', 'user_id', 'item_id', 'rating', 'interaction_type', 'created_at', 'updated_at'])
+            ->orderBy('id');
+
+        if (isset($validated['updated_since'])) {
+            $query->where('updated_at', '>=', $validated['updated_since']);
+        }
 
-        $data = $interactions->map(function ($interaction) {
+        $headers = [];
+        if (isset($validated['limit'])) {
+            $afterId = (int) ($validated['after_id'] ?? 0);
+            if ($afterId === 0) {
+                $headers['X-Total-Count'] = Interaction::count();
+            }
+
+            $query->where('id', '>', $afterId)
+                ->limit($validated['limit']);
+        }
+
+        $data = $query->get()->map(function ($interaction) {
             return [
+                'id' => $interaction->id,
                 'user_id' => $interaction->user_id,
                 'item_id' => $interaction->item_id,
                 'rating' => $interaction->rating,
                 'interaction_type' => $interaction->interaction_type,
                 'created_at' => $interaction->created_at->toDateTimeString(),
+                'updated_at' => $interaction->updated_at->toDateTimeString(),
             ];
         });
 
-        return response()->json($data);
+        return response()->json($data, 200, $headers);
+    }
+
+    /**
+     * Devuelve todos los ids de interacciones vigentes, para que el servicio
+     * de ML detecte filas eliminadas sin descargar la tabla completa.
+     */
+    public function exportIds()
+    {
+        return response()->json(Interaction::orderBy('id')->pluck('id'));
     }
 }
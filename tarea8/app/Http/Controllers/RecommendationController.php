@@ -6,6 +6,7 @@
 use App\Models\Item;
 use Illuminate\Http\Request;
 use Illuminate\Support\Facades\Auth;
+use Illuminate\Support\Facades\Cache;
 use Illuminate\Support\Facades\Http;
 use Inertia\Inertia;
 
@@ -25,15 +26,30 @@ public function index(Request $request)
         // Llamar a la API de Python para obtener recomendaciones
         $pythonApiUrl = env('PYTHON_ML_API_URL', 'http://localhost:5000');
         
+        // Última respuesta y su ETag (versión del modelo) para peticiones condicionales
+        $cacheKey = "recommendations:{$userId}:{$topN}";
+        $cached = Cache::get($cacheKey);
+
         try {
             // Timeout aumentado a 30s para mejor compatibilidad
-            $response = Http::timeout(30)->get("{$pythonApiUrl}/recommend", [
-                'user_id' => $userId,
-                'top_n' => $topN,
-            ]);
+            $response = Http::timeout(30)
+                ->withHeaders($cached ? ['If-None-Match' => $cached['etag']] : [])
+                ->get("{$pythonApiUrl}/recommend", [
+                    'user_id' => $userId,
+                    'top_n' => $topN,
+                ]);
 
-            if ($response->successful()) {
+            if ($response->status() === 304 && $cached) {
+                // El modelo no cambió: se reutiliza la respuesta anterior
+                $data = $cached['data'];
+            } elseif ($response->successful()) {
                 $data = $response->json();
+                if ($response->header('ETag')) {
+                    Cache::put($cacheKey, ['etag' => $response->header('ETag'), 'data' => $data], now()->addDay());
+                }
+            }
+
+            if (isset($data)) {
                 $recommendedItemIds = $data['item_ids'] ?? [];
                 
                 $recommendedItems = Item::whereIn('id', $recommendedItemIds)
@@ -11,6 +11,13 @@ class RetrainModelJob implements ShouldQueue
 {
     use Queueable;
 
+    /**
+     * Consulta del estado del reentrenamiento en el servicio de ML
+     */
+    private const POLL_INTERVAL_SECONDS = 5;
+
+    private const POLL_TIMEOUT_SECONDS = 280;
+
     /**
      * Parámetros opcionales para el reentrenamiento
      */
@@ -42,15 +49,11 @@ public function handle(): void
                 'python_api_url' => $pythonApiUrl,
             ]);
 
-            // Timeout aumentado a 300s (5 minutos) para reentrenamiento
-            $response = Http::timeout(300)->post("{$pythonApiUrl}/retrain", $payload);
+            // El servicio entrena en segundo plano: se obtiene un job_id y se consulta su estado
+            $response = Http::timeout(30)->post("{$pythonApiUrl}/retrain", $payload);
 
-            if ($response->successful()) {
-                $responseData = $response->json();
-                Log::info('Reentrenamiento completado exitosamente', [
-                    'model_metadata' => $responseData['model_metadata'] ?? null,
-                ]);
-            } else {
+            // 409: ya hay un reentrenamiento en curso, se sigue ese mismo
+            if (! $response->successful() && $response->status() !== 409) {
                 $errorData = $response->json();
                 Log::error('Error en el reentrenamiento del modelo', [
                     'status' => $response->status(),
@@ -58,6 +61,34 @@ public function handle(): void
                 ]);
                 throw new \Exception('Error al reentrenar el modelo: ' . ($errorData['error'] ?? 'Error desconocido'));
             }
+
+            $jobId = $response->json()['job_id'];
+            $deadline = time() + self::POLL_TIMEOUT_SECONDS;
+
+            do {
+                sleep(self::POLL_INTERVAL_SECONDS);
+                $status = Http::timeout(10)->get("{$pythonApiUrl}/retrain/{$jobId}")->json();
+            } while (in_array($status['status'] ?? null, ['queued', 'running']) && time() < $deadline);
+
+            if (($status['status'] ?? null) === 'completed') {
+                Log::info('Reentrenamiento completado exitosamente', [
+                    'job_id' => $jobId,
+                    'timings' => $status['timings'] ?? null,
+                    'model_metadata' => $status['result']['model_metadata'] ?? null,
+                ]);
+            } elseif (($status['status'] ?? null) === 'failed') {
+                Log::error('Error en el reentrenamiento del modelo', [
+                    'job_id' => $jobId,
+                    'error' => $status['error'] ?? null,
+                ]);
+                throw new \Exception('Error al reentrenar el modelo: ' . ($status['error'] ?? 'Error desconocido'));
+            } else {
+                // Sigue en curso en el servicio de ML; no es un error del job
+                Log::warning('El reentrenamiento sigue en curso', [
+                    'job_id' => $jobId,
+                    'phase' => $status['phase'] ?? null,
+                ]);
+            }
         } catch (\Illuminate\Http\Client\ConnectionException $e) {
             Log::error('Error de conexión al reentrenar el modelo', [
                 'error' => $e->getMessage(),
@@ -0,0 +1,103 @@
+<?php
+
+namespace App\Jobs;
+
+use App\Models\Interaction;
+use Illuminate\Contracts\Queue\ShouldBeUniqueUntilProcessing;
+use Illuminate\Contracts\Queue\ShouldQueue;
+use Illuminate\Foundation\Queue\Queueable;
+use Illuminate\Support\Facades\Cache;
+use Illuminate\Support\Facades\Http;
+use Illuminate\Support\Facades\Log;
+
+class UpdateUserRecommendationsJob implements ShouldQueue, ShouldBeUniqueUntilProcessing
+{
+    use Queueable;
+
+    /**
+     * Usuarios pendientes de enviar al servicio de ML (en caché, compartidos
+     * entre procesos) y bloqueo que protege esa lista
+     */
+    private const PENDING_KEY = 'ml:update-users:pending';
+
+    private const PENDING_LOCK = 'ml:update-users:lock';
+
+    /**
+     * Espera antes de enviar, para juntar en una llamada las interacciones de
+     * varios usuarios, y máximo de usuarios por llamada a /update_users
+     */
+    private const DEBOUNCE_SECONDS = 10;
+
+    private const MAX_USERS_PER_CALL = 1000;
+
+    /**
+     * Segundos que se mantiene el bloqueo de unicidad si el trabajo no llega a ejecutarse
+     */
+    public int $uniqueFor = 300;
+
+    /**
+     * Registra al usuario como pendiente y encola (una sola vez) el envío
+     * diferido de todos los usuarios pendientes.
+     */
+    public static function queueUser(int $userId): void
+    {
+        Cache::lock(self::PENDING_LOCK, 10)->block(5, function () use ($userId) {
+            $pending = Cache::get(self::PENDING_KEY, []);
+            $pending[$userId] = true;
+            Cache::forever(self::PENDING_KEY, $pending);
+        });
+
+        // Mientras haya uno encolado, ShouldBeUnique descarta los siguientes
+        self::dispatch()->delay(now()->addSeconds(self::DEBOUNCE_SECONDS));
+    }
+
+    /**
+     * Un solo trabajo encolado a la vez para todos los usuarios
+     */
+    public function uniqueId(): string
+    {
+        return 'update-users';
+    }
+
+    /**
+     * Envía el historial de los usuarios pendientes al servicio de ML para que
+     * calcule sus vectores latentes sin esperar al próximo reentrenamiento.
+     */
+    public function handle(): void
+    {
+        $pythonApiUrl = env('PYTHON_ML_API_URL', 'http://localhost:5000');
+
+        $userIds = Cache::lock(self::PENDING_LOCK, 10)->block(5, function () {
+            return array_keys(Cache::pull(self::PENDING_KEY, []));
+        });
+
+        foreach (array_chunk($userIds, self::MAX_USERS_PER_CALL) as $chunk) {
+            $interactions = Interaction::whereIn('user_id', $chunk)
+                ->get(['user_id', 'item_id', 'rating']);
+
+            if ($interactions->isEmpty()) {
+                continue;
+            }
+
+            try {
+                $response = Http::timeout(10)->post("{$pythonApiUrl}/update_users", [
+                    'interactions' => $interactions->toArray(),
+                ]);
+
+                if (! $response->successful()) {
+                    // No es crítico: el próximo reentrenamiento incluirá a los usuarios
+                    Log::warning('No se pudo actualizar los usuarios en el modelo de ML', [
+                        'users' => count($chunk),
+                        'status' => $response->status(),
+                        'error' => $response->json()['error'] ?? $response->body(),
+                    ]);
+                }
+            } catch (\Illuminate\Http\Client\ConnectionException $e) {
+                Log::warning('Error de conexión al actualizar los usuarios en el modelo de ML', [
+                    'users' => count($chunk),
+                    'error' => $e->getMessage(),
+                ]);
+            }
+        }
+    }
+}
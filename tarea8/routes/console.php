@@ -17,8 +17,9 @@
     try {
         $response = \Illuminate\Support\Facades\Http::timeout(60)->post("{$pythonApiUrl}/retrain");
         
-        if ($response->successful()) {
-            \Illuminate\Support\Facades\Log::info('Modelo reentrenado exitosamente', [
+        // El servicio entrena en segundo plano (202) o ya tiene uno en curso (409)
+        if ($response->successful() || $response->status() === 409) {
+            \Illuminate\Support\Facades\Log::info('Reentrenamiento del modelo iniciado', [
                 'data' => $response->json(),
             ]);
         } else {
@@ -29,6 +29,7 @@
 // Rutas de API para exportación (pueden ser públicas o protegidas según necesidad)
 Route::get('api/interactions/export', [InteractionController::class, 'export'])->name('api.interactions.export');
 Route::get('api/interactions/export-json', [InteractionController::class, 'exportJson'])->name('api.interactions.export-json');
+Route::get('api/interactions/ids', [InteractionController::class, 'exportIds'])->name('api.interactions.ids');
 
 // Rutas de API para estadísticas y salud del servicio ML (accesibles públicamente para monitoreo)
 Route::get('api/recommendations/stats', [RecommendationController::class, 'getStats'])->name('api.recommendations.stats');
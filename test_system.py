@@ -6,6 +6,7 @@ Verifica todas las funcionalidades del sistema
 import requests
 import json
 import sys
+import time
 from datetime import datetime
 
 # Colores para output
@@ -97,20 +98,34 @@ def test_retrain():
         print_info("Iniciando reentrenamiento...")
         response = requests.post(
             "http://localhost:5000/retrain",
-            timeout=120  # 2 minutos para el entrenamiento
+            timeout=10
         )
         
-        if response.status_code == 200:
-            data = response.json()
-            print_success("Reentrenamiento completado exitosamente")
-            print_info(f"Interacciones procesadas: {data.get('interactions_count', 'N/A')}")
-            print_info(f"Modelo guardado en: {data.get('model_path', 'N/A')}")
-            return True
-        else:
-            error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+        # /retrain responde 202 con un job_id (o 409 con el que ya está en curso)
+        data = response.json() if response.headers.get('content-type', '').startswith('application/json') else {}
+        job_id = data.get('job_id')
+        if response.status_code not in (202, 409) or job_id is None:
             print_error(f"Error en reentrenamiento: {response.status_code}")
-            print_error(f"Detalles: {error_data.get('error', response.text[:200])}")
+            print_error(f"Detalles: {data.get('error', response.text[:200])}")
             return False
+        
+        print_info(f"Trabajo {job_id} en curso, esperando a que termine...")
+        deadline = time.time() + 120  # 2 minutos para el entrenamiento
+        while time.time() < deadline:
+            job = requests.get(f"http://localhost:5000/retrain/{job_id}", timeout=10).json()
+            if job.get('status') == 'completed':
+                result = job.get('result', {})
+                print_success("Reentrenamiento completado exitosamente")
+                print_info(f"Interacciones procesadas: {result.get('interactions_count', 'N/A')}")
+                print_info(f"Tiempos por fase: {job.get('timings', {})}")
+                return True
+            if job.get('status') == 'failed':
+                print_error(f"Error en reentrenamiento: {job.get('error', 'N/A')}")
+                return False
+            time.sleep(2)
+        
+        print_error("Timeout: El reentrenamiento tardó más de 2 minutos")
+        return False
             
     except requests.exceptions.Timeout:
         print_error("Timeout: El reentrenamiento tardó más de 2 minutos")